@@ -0,0 +1,231 @@
+# coding=utf-8
+#
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Compare the all-stats parser of StatHelper with the one it replaced.
+
+Parses each all-stats sample in sample_data/all_stats with both parsers,
+checks that they agree on the capacity metrics and prints the time per
+parse:
+
+    PYTHONPATH=. python devtools/benchmark_stat_helper.py [iterations]
+"""
+import glob
+import os
+import re
+import sys
+import timeit
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.stat_helper import \
+    parse_global_statistics
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'sample_data', 'all_stats')
+
+
+def legacy_parse_global_statistics(stats_display):
+    # The parser of StatHelper.get_global_statistics before it was
+    # replaced by parse_global_statistics.
+    sr = {
+        'Sys::Performance System': {
+            'System CPU Usage': {
+                'Utilization': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                }
+            },
+            'Memory Used': {
+                'TMM Memory Used': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                },
+                'Other Memory Used': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                },
+                'Swap Memory Used': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                }
+            }
+        },
+        'Sys::Performance Connections': {
+            'Active Connections': {
+                'Connections': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                }
+            },
+            'Total New Connections': {
+                'Client Connections': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                },
+                'Server Connections': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                }
+            },
+            'HTTP Requests': {
+                'HTTP Requests': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                }
+            }
+        },
+        'Sys::Performance Throughput': {
+            'Throughput(bits)': {
+                'In': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                },
+                'Out': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                }
+            },
+            'SSL Transactions': {
+                'SSL TPS': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                }
+            },
+            'Throughput(packets)': {
+                'In': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                },
+                'Out': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                }
+            }
+        },
+        'Sys::Performance Ramcache': {
+            'RAM Cache Utilization': {
+                'Hit Rate': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                },
+                'Byte Rate': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                },
+                'Eviction Rate': {
+                    'current': 0,
+                    'average': 0,
+                    'max': 0
+                }
+            }
+        }
+    }
+    lines = str(stats_display).split('\n')
+    sec = None
+    div = None
+    since = None
+    for line in lines:
+        if len(line) > 2:
+            for this_section in sr.keys():
+                if str(line).startswith(this_section):
+                    if sec:
+                        if not (sec == this_section):
+                            sec = this_section
+                            div = None
+                    else:
+                        sec = this_section
+            if sec:
+                for division in sr[sec].keys():
+                    if str(line).startswith(division):
+                        try:
+                            since_idx = line.index('since')
+                            end_since_idx = line.index(')',
+                                                       since_idx)
+                            since = line[since_idx + 6:end_since_idx]
+                        except ValueError:
+                            pass
+                        div = division
+            if div:
+                for fields in sr[sec][div].keys():
+                    for field in fields:
+                        if str(line).startswith(field):
+                            values = re.split(r'\s{2,}', line)
+                            if len(values) == 4:
+                                if values[0] in fields:
+                                    value = values[0]
+                                    vdict = sr[sec][div][value]
+                                    value_set = (
+                                        (1, 'current'),
+                                        (2, 'average'),
+                                        (3, 'max'),
+                                    )
+                                    for i, k in value_set:
+                                        try:
+                                            vdict[k] = int(values[i])
+                                        except ValueError:
+                                            vdict[k] = 0
+                                            pass
+                                    sr[sec][div][values[0]] = vdict
+    sr['since'] = since
+    return sr
+
+
+def legacy_capacity_metrics(stats):
+    connections = stats['Sys::Performance Connections']
+    throughput = stats['Sys::Performance Throughput']
+    return (connections['Active Connections']['Connections']['current'],
+            throughput['SSL Transactions']['SSL TPS']['current'],
+            throughput['Throughput(bits)']['In']['current'],
+            throughput['Throughput(bits)']['Out']['current'],
+            stats['since'])
+
+
+def main(iterations=1000):
+    for path in sorted(glob.glob(os.path.join(SAMPLE_DIR, '*.txt'))):
+        with open(path) as sample:
+            raw_values = sample.read()
+        legacy = legacy_capacity_metrics(
+            legacy_parse_global_statistics(raw_values))
+        if tuple(parse_global_statistics(raw_values)) != legacy:
+            print('%s: parsers disagree: %s != %s' % (
+                path, tuple(parse_global_statistics(raw_values)), legacy))
+            return 1
+        legacy_time = timeit.timeit(
+            lambda: legacy_parse_global_statistics(raw_values),
+            number=iterations)
+        table_time = timeit.timeit(
+            lambda: parse_global_statistics(raw_values), number=iterations)
+        print('%s: legacy %.1f us, table %.1f us per parse (%.1fx)' % (
+            os.path.basename(path), legacy_time * 1e6 / iterations,
+            table_time * 1e6 / iterations, legacy_time / table_time))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:]]))
@@ -0,0 +1,62 @@
+# coding=utf-8
+"""Sorted index of the addresses in use in a BIG-IP® partition."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import bisect
+import collections
+
+import netaddr
+from oslo_log import log as logging
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.utils import \
+    strip_domain_address
+
+LOG = logging.getLogger(__name__)
+
+
+class AddressIndex(object):
+    """Addresses, e.g. of virtual servers and nodes, per route domain.
+
+    Addresses are kept as sorted integers per route domain and IP
+    version, so whether a subnet holds any of them is a binary search.
+    """
+
+    def __init__(self, addresses=None):
+        # (route domain id, ip version) -> sorted addresses as integers
+        self._addresses = collections.defaultdict(list)
+        for address in addresses or []:
+            self.add(address)
+
+    def add(self, address):
+        """Add an address, with its route domain as in 10.1.1.1%2."""
+        parts = address.split('%')
+        route_domain = parts[1] if len(parts) > 1 else '0'
+        try:
+            ip_address = netaddr.IPAddress(strip_domain_address(address))
+        except (netaddr.AddrFormatError, ValueError):
+            LOG.debug("Ignoring address %s" % address)
+            return
+        bisect.insort(self._addresses[(route_domain, ip_address.version)],
+                      int(ip_address))
+
+    def in_subnet(self, cidr, route_domain=0):
+        """Return whether any address of route_domain is in cidr."""
+        subnet = netaddr.IPNetwork(cidr)
+        addresses = self._addresses.get((str(route_domain), subnet.version))
+        if not addresses:
+            return False
+        index = bisect.bisect_left(addresses, subnet.first)
+        return index < len(addresses) and addresses[index] <= subnet.last
@@ -34,6 +34,7 @@ from neutron.plugins.ml2.drivers.l2pop import rpc as l2pop_rpc
 from neutron_lbaas.services.loadbalancer import constants as lb_const
 
 from f5_openstack_agent.lbaasv2.drivers.bigip import constants_v2
+from f5_openstack_agent.lbaasv2.drivers.bigip import metrics
 from f5_openstack_agent.lbaasv2.drivers.bigip import plugin_rpc
 
 
@@ -52,6 +53,13 @@ OPTS = [
         default=False,
         help=('Use L2 Populate service for fdb entries on the BIG-IP')
     ),
+    cfg.FloatOpt(
+        'l2_population_flush_window',
+        default=0.5,
+        help=('Number of seconds L2 Populate fdb changes are collected '
+              'before they are applied to the BIG-IP, 0 to apply each '
+              'change as it arrives')
+    ),
     cfg.BoolOpt(
         'f5_global_routed_mode',
         default=True,
@@ -102,6 +110,21 @@ OPTS = [
         default={},
         help=('Metrics to measure capacity and their limits')
     ),
+    cfg.IntOpt(
+        'metrics_port',
+        default=0,
+        help=('Port to serve agent metrics on for Prometheus, 0 to disable')
+    ),
+    cfg.StrOpt(
+        'metrics_bind_host',
+        default='127.0.0.1',
+        help=('Address to serve agent metrics on')
+    ),
+    cfg.StrOpt(
+        'statsd_address',
+        default=None,
+        help=('host:port of a statsd server to send agent metrics to')
+    ),
 ]
 
 
@@ -111,11 +134,15 @@ class LogicalServiceCache(object):
     class Service(object):  # XXX maybe promote/use this class elsewhere?
         """Inner classes used to hold values for weakref lookups."""
 
-        def __init__(self, port_id, loadbalancer_id, tenant_id, agent_host):
+        def __init__(self, port_id, loadbalancer_id, tenant_id, agent_host,
+                     paths=None):
             self.port_id = port_id
             self.loadbalancer_id = loadbalancer_id
             self.tenant_id = tenant_id
             self.agent_host = agent_host
+            # Paths of the device objects of the service when it was
+            # last provisioned.
+            self.paths = paths
 
         def __eq__(self, other):
             return self.__dict__ == other.__dict__
@@ -132,13 +159,50 @@ class LogicalServiceCache(object):
         """Initialize Service cache object."""
         LOG.debug("Initializing LogicalServiceCache")
         self.services = {}
+        self.state_store = None
+        # Whether the services changed since they were last saved
+        self.dirty = False
+        # Driver function which returns the device object paths of a
+        # service
+        self.get_service_paths = None
+
+    def restore(self, state_store):
+        """Keep the cache in state_store, starting with the services there."""
+        self.state_store = state_store
+        for loadbalancer_id, service in \
+                state_store.get('services', {}).items():
+            self.services[loadbalancer_id] = self.Service(**service)
+        LOG.debug("Restored %d services" % self.size)
+
+    def save(self):
+        """Write the services to the state store, if they changed.
+
+        put() and remove_by_loadbalancer_id() save right away unless
+        called with save=False, e.g. by a sync changing many services,
+        which saves once at its end.
+        """
+        if not self.dirty:
+            return
+        self.dirty = False
+        if self.state_store:
+            self.state_store.put('services', dict(
+                (loadbalancer_id, dict(service.__dict__))
+                for loadbalancer_id, service in self.services.items()))
+            if self.state_store.dirty:
+                self.state_store.save()
+
+    def clear(self):
+        """Remove all services from the cache."""
+        self.services = {}
+        self.dirty = True
+        self.save()
 
     @property
     def size(self):
         """Return the number of services cached."""
         return len(self.services)
 
-    def put(self, service, agent_host):
+    def put(self, service, agent_host, save=True):
         """Add a service to the cache."""
         if 'port_id' in service['loadbalancer']:
             port_id = service['loadbalancer']['port_id']
@@ -154,6 +218,11 @@ class LogicalServiceCache(object):
             s.tenant_id = tenant_id
             s.port_id = port_id
             s.agent_host = agent_host
+        if self.get_service_paths:
+            s.paths = self.get_service_paths(service)
+        self.dirty = True
+        if save:
+            self.save()
 
     def remove(self, service):
         """Remove a service from the cache."""
@@ -161,13 +230,15 @@ class LogicalServiceCache(object):
             loadbalancer_id = service['loadbalancer']['id']
         else:
             loadbalancer_id = service.loadbalancer_id
-        if loadbalancer_id in self.services:
-            del(self.services[loadbalancer_id])
+        self.remove_by_loadbalancer_id(loadbalancer_id)
 
-    def remove_by_loadbalancer_id(self, loadbalancer_id):
+    def remove_by_loadbalancer_id(self, loadbalancer_id, save=True):
         """Remove service by providing the loadbalancer id."""
         if loadbalancer_id in self.services:
             del(self.services[loadbalancer_id])
+            self.dirty = True
+            if save:
+                self.save()
 
     def get_by_loadbalancer_id(self, loadbalancer_id):
         """Retreive service by providing the loadbalancer id."""
@@ -225,6 +296,14 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):  # b --> B
         self.agent_host = conf.host
         self._load_driver(conf)
 
+        # Start from the services known before a restart.
+        if self.lbdriver.state_store:
+            self.cache.restore(self.lbdriver.state_store)
+        self.cache.get_service_paths = self.lbdriver.get_service_paths
+        self.needs_service_check = True
+
+        self._setup_metrics()
+
         # Initialize agent configurations
         agent_configurations = (
             {'environment_prefix': self.conf.environment_prefix,
@@ -334,6 +413,18 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):  # b --> B
                 consumers
             )
 
+    def _setup_metrics(self):
+        # Queue depths are reported as gauges, read when the metrics are.
+        metrics.REGISTRY.add_gauges(lambda: {'services': self.cache.size})
+        for source in ('service_queue', 'status_sender'):
+            if hasattr(self.lbdriver, source):
+                metrics.REGISTRY.add_gauges(
+                    getattr(self.lbdriver, source).get_stats)
+        if self.conf.metrics_port:
+            metrics.serve(self.conf.metrics_bind_host, self.conf.metrics_port)
+        if self.conf.statsd_address:
+            metrics.StatsdSink(self.conf.statsd_address).start()
+
     def _setup_state_rpc(self, topic):
         # Agent state API
         self.state_rpc = agent_rpc.PluginReportStateAPI(topic)
@@ -354,8 +445,12 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):  # b --> B
             service_count = self.cache.size
             self.agent_state['configurations']['services'] = service_count
             if hasattr(self.lbdriver, 'service_queue'):
-                self.agent_state['configurations']['request_queue_depth'] = (
-                    len(self.lbdriver.service_queue)
+                self.agent_state['configurations'].update(
+                    self.lbdriver.service_queue.get_stats()
+                )
+            if hasattr(self.lbdriver, 'status_sender'):
+                self.agent_state['configurations'].update(
+                    self.lbdriver.status_sender.get_stats()
                 )
 
             # Add configuration from icontrol_driver.
@@ -406,7 +501,9 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):  # b --> B
                 LOG.debug(
                     'Forcing resync of services on resync timer (%d seconds).'
                     % self.service_resync_interval)
-                self.cache.services = {}
+                # Rather than validating every service again, check that
+                # the device objects of the cached services still exist.
+                self.needs_service_check = True
                 self.last_resync = now
                 self.lbdriver.flush_cache()
             LOG.debug("tunnel_sync: periodic_resync need_resync: %s"
@@ -465,6 +562,8 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):  # b --> B
             # by this agent.
             for deleted_lb in owned_services - all_loadbalancer_ids:
                 LOG.error("Cached service not found in neutron database")
+                self.cache.remove_by_loadbalancer_id(deleted_lb,
+                                                     save=False)
                 # TODO(Rich Browne) -- This can't be implemented with the
                 # normal tear down b/c the RPC destroy methods walk all
                 # over one another.  Although this case suggests that the
@@ -475,9 +574,24 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):  # b --> B
 
             # Validate each service we own, i.e. loadbalancers to which this
             # agent is bound, that does not exist in our service cache.
-            for lb_id in active_loadbalancer_ids:
-                if not self.cache.get_by_loadbalancer_id(lb_id):
-                    self.validate_service(lb_id)
+            # Their definitions are fetched in bulk.
+            unknown_lb_ids = [lb_id for lb_id in active_loadbalancer_ids
+                              if not self.cache.get_by_loadbalancer_id(lb_id)]
+            services = self.plugin_rpc.get_services_by_loadbalancer_ids(
+                unknown_lb_ids)
+            for lb_id in unknown_lb_ids:
+                self.validate_service(lb_id, services.get(lb_id))
+
+            # Refresh each cached service we own whose objects are
+            # missing from the devices.
+            changed_lb_ids = []
+            if self.needs_service_check:
+                self.needs_service_check = False
+                changed_lb_ids = self.get_changed_services(
+                    active_loadbalancer_ids)
+                for lb_id in changed_lb_ids:
+                    LOG.error('active loadbalancer %s is not on BIG-IP...'
+                              'syncing' % lb_id)
 
             # This produces a list of loadbalancers with pending tasks to
             # be performed.
@@ -491,8 +605,19 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):  # b --> B
                 "plugin produced the list of pending loadbalancer ids: %s"
                 % list(pending_lb_ids))
 
-            for lb_id in pending_lb_ids:
-                self.refresh_service(lb_id)
+            refresh_lb_ids = pending_lb_ids.union(changed_lb_ids)
+            if hasattr(self.lbdriver, 'resync_loadbalancer_ids'):
+                # Loadbalancers the driver left different across the
+                # devices.
+                refresh_lb_ids.update(
+                    self.lbdriver.resync_loadbalancer_ids &
+                    active_loadbalancer_ids)
+                self.lbdriver.resync_loadbalancer_ids.clear()
+            refresh_lb_ids = list(refresh_lb_ids)
+            services = self.plugin_rpc.get_services_by_loadbalancer_ids(
+                refresh_lb_ids)
+            for lb_id in refresh_lb_ids:
+                self.refresh_service(lb_id, services.get(lb_id))
 
             # Get a list of any cached service we now know after
             # refreshing services
@@ -507,16 +632,38 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):  # b --> B
             LOG.error("Unable to retrieve ready service: %s" % e.message)
             resync = True
 
+        # Store the services validated and refreshed above at once.
+        self.cache.save()
         return resync
 
+    def get_changed_services(self, loadbalancer_ids):
+        """Return the ids of loadbalancers whose objects are missing."""
+        deployed_paths = self.lbdriver.get_deployed_paths()
+        if deployed_paths is None:
+            return []
+        changed = []
+        for lb_id in loadbalancer_ids:
+            service = self.cache.get_by_loadbalancer_id(lb_id)
+            if service is None or service.paths is None:
+                continue
+            # A loadbalancer missing from any device is changed.
+            if not all(paths.issuperset(service.paths)
+                       for paths in deployed_paths.values()):
+                changed.append(lb_id)
+        LOG.debug("%d of %d loadbalancers changed on the devices" %
+                  (len(changed), len(loadbalancer_ids)))
+        return changed
+
     @log_helpers.log_method_call
-    def validate_service(self, lb_id):
+    def validate_service(self, lb_id, service=None):
 
         try:
-            service = self.plugin_rpc.get_service_by_loadbalancer_id(
-                lb_id
-            )
-            self.cache.put(service, self.agent_host)
+            if service is None:
+                service = self.plugin_rpc.get_service_by_loadbalancer_id(
+                    lb_id
+                )
+            # Saved by sync_state, with the other services it validates.
+            self.cache.put(service, self.agent_host, save=False)
             if not self.lbdriver.exists(service):
                 LOG.error('active loadbalancer %s is not on BIG-IP...syncing'
                           % lb_id)
@@ -528,13 +675,15 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):  # b --> B
                       " service for loadbalancer: %s" % lb_id)
 
     @log_helpers.log_method_call
-    def refresh_service(self, lb_id):
+    def refresh_service(self, lb_id, service=None):
 
         try:
-            service = self.plugin_rpc.get_service_by_loadbalancer_id(
-                lb_id
-            )
-            self.cache.put(service, self.agent_host)
+            if service is None:
+                service = self.plugin_rpc.get_service_by_loadbalancer_id(
+                    lb_id
+                )
+            # Saved by sync_state, with the other services it refreshes.
+            self.cache.put(service, self.agent_host, save=False)
             self.lbdriver.sync(service)
         except q_exception.NeutronException as exc:
             LOG.error("NeutronException: %s" % exc.msg)
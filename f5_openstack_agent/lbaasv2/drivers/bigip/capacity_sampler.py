@@ -0,0 +1,57 @@
+# coding=utf-8
+"""Sample the capacity metrics of BIG-IP® devices."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import time
+
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class CapacitySampler(object):
+    """Capacity metrics of each device, read at most once per ttl seconds.
+
+    A sample holds the metrics of one device read since the sample was
+    started, including one snapshot of the global statistics which all
+    metrics based on them are computed from. Once the sample is ttl
+    seconds old, metrics are read again.
+    """
+
+    def __init__(self, stat_helper, ttl=120):
+        self.stat_helper = stat_helper
+        self.ttl = ttl
+        # hostname -> {'time': time started, 'values': {metric: value}}
+        self._samples = {}
+
+    def get_metric(self, bigip, metric, read_metric):
+        """Return metric of bigip, calling read_metric(bigip) if needed."""
+        now = time.time()
+        sample = self._samples.get(bigip.hostname)
+        if sample is None or now - sample['time'] >= self.ttl:
+            sample = {'time': now, 'values': {}}
+            self._samples[bigip.hostname] = sample
+        values = sample['values']
+        if metric not in values:
+            values[metric] = read_metric(bigip)
+            LOG.debug('sampled capacity %s on %s: %s'
+                      % (metric, bigip.hostname, values[metric]))
+        return values[metric]
+
+    def get_global_statistics(self, bigip):
+        """Return the global statistics snapshot of the current sample."""
+        return self.get_metric(bigip, 'global_statistics',
+                               self.stat_helper.get_global_statistics)
@@ -0,0 +1,118 @@
+# coding=utf-8
+"""Per-tenant snapshot of BIG-IP® configuration for one service pass."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# (bigip hostname, partition) -> TenantSnapshot
+_snapshots = {}
+
+
+class TenantSnapshot(object):
+    """Objects of one tenant partition on one BIG-IP®.
+
+    Each resource type is fetched with a single collection GET the first
+    time it is needed and kept until the end of the pass. Writes done
+    through BigIPResourceHelper keep the snapshot up to date. An object
+    which was loaded from the device (and so may have been changed
+    outside of the helper) is marked stale and looked up on the device
+    again the next time.
+    """
+
+    def __init__(self, partition):
+        self.partition = partition
+        # resource type -> {name: resource object}
+        self._resources = {}
+        # (resource type, name) -> set of subcollection item names
+        self._children = {}
+        self._stale = set()
+
+    def clear(self):
+        """Forget everything, e.g. after a transaction was committed."""
+        self._resources.clear()
+        self._children.clear()
+        self._stale.clear()
+
+    def resources(self, resource_type):
+        """Return {name: object} for resource_type, None if not fetched."""
+        return self._resources.get(resource_type)
+
+    def set_resources(self, resource_type, resources):
+        self._resources[resource_type] = resources
+
+    def is_stale(self, resource_type, name):
+        return (resource_type, name) in self._stale
+
+    def add(self, resource_type, name, obj):
+        """Record an object that was created, updated or loaded."""
+        resources = self._resources.get(resource_type)
+        if resources is not None:
+            resources[name] = obj
+            self._stale.discard((resource_type, name))
+
+    def discard(self, resource_type, name):
+        """Record that an object no longer exists."""
+        resources = self._resources.get(resource_type)
+        if resources is not None:
+            resources.pop(name, None)
+            self._stale.discard((resource_type, name))
+        self._children.pop((resource_type, name), None)
+
+    def invalidate(self, resource_type, name):
+        """Forget what is known about an object."""
+        self._stale.add((resource_type, name))
+        self._children.pop((resource_type, name), None)
+
+    def children(self, resource_type, name):
+        """Return the subcollection item names of an object, or None."""
+        return self._children.get((resource_type, name))
+
+    def set_children(self, resource_type, name, children):
+        self._children[(resource_type, name)] = set(children)
+
+
+def get_snapshot(bigip, partition):
+    """Return the active snapshot for partition on bigip, or None."""
+    if not partition:
+        return None
+    return _snapshots.get((bigip.hostname, partition))
+
+
+def begin(bigips, partition):
+    """Start snapshots of partition on bigips for a service pass.
+
+    Nothing is fetched until a resource helper needs it, so a pass which
+    never looks at a resource type costs no extra requests.
+
+    :returns: token to pass to end() when the pass is over.
+    """
+    if not partition or partition == 'Common':
+        # Common is shared by all tenants, it may change under our feet.
+        return []
+    keys = [(bigip.hostname, partition) for bigip in bigips]
+    # A nested pass for the same partition shares the outer snapshot.
+    started = [key for key in keys if key not in _snapshots]
+    for key in started:
+        _snapshots[key] = TenantSnapshot(partition)
+    return started
+
+
+def end(token):
+    """Drop the snapshots started by begin()."""
+    for key in token:
+        _snapshots.pop(key, None)
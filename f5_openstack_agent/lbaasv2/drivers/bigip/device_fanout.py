@@ -0,0 +1,100 @@
+# coding=utf-8
+"""Run the same operation on several BIG-IP® devices at once."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from eventlet import greenpool
+from eventlet import semaphore
+from oslo_log import log as logging
+
+from f5_openstack_agent.lbaasv2.drivers.bigip import rest_accounting
+from f5_openstack_agent.lbaasv2.drivers.bigip import transaction
+
+LOG = logging.getLogger(__name__)
+
+
+class DeviceFanout(object):
+    """Send an operation to all devices of a cluster in parallel.
+
+    Each device runs the operation in its own greenthread, so the time
+    taken is that of the slowest device rather than the sum over all of
+    them. At most max_per_device operations run against the same device
+    at any time, whichever request they belong to.
+
+    Errors keep the semantics of a sequential loop over the devices: all
+    devices run to completion, then the exception raised for the first
+    device (in the order given) is re-raised. Errors from the other
+    devices are logged.
+
+    Operations for the different devices must not modify shared
+    arguments, e.g. the same service model dict; copy them first.
+    """
+
+    def __init__(self, max_per_device=4):
+        self.max_per_device = max_per_device
+        # device hostname -> semaphore
+        self._device_locks = {}
+
+    def run(self, bigips, func, *args, **kwargs):
+        """Call func(bigip, *args, **kwargs) for every bigip.
+
+        :returns: list of the results, in the order of bigips.
+        """
+        bigips = list(bigips)
+        if len(bigips) < 2:
+            # Nothing to overlap with, stay in the calling greenthread.
+            return [self._call(bigip, func, args, kwargs)
+                    for bigip in bigips]
+
+        # Writes of the device greenthreads belong to the caller's
+        # transaction, if any, and their requests to its REST account.
+        parent = (transaction.current(), rest_accounting.current())
+        pool = greenpool.GreenPool(len(bigips))
+        threads = [pool.spawn(self._call_safe, parent, bigip, func, args,
+                              kwargs)
+                   for bigip in bigips]
+        outcomes = [thread.wait() for thread in threads]
+
+        errors = [(bigip, error) for bigip, (result, error) in
+                  zip(bigips, outcomes) if error is not None]
+        if errors:
+            for bigip, error in errors[1:]:
+                LOG.error("%s failed on %s: %s" %
+                          (getattr(func, '__name__', func), bigip.hostname,
+                           error))
+            raise errors[0][1]
+        return [result for (result, error) in outcomes]
+
+    def _device_lock(self, bigip):
+        lock = self._device_locks.get(bigip.hostname)
+        if lock is None:
+            lock = semaphore.Semaphore(max(1, self.max_per_device))
+            self._device_locks[bigip.hostname] = lock
+        return lock
+
+    def _call(self, bigip, func, args, kwargs):
+        with self._device_lock(bigip):
+            return func(bigip, *args, **kwargs)
+
+    def _call_safe(self, parent, bigip, func, args, kwargs):
+        previous = (transaction.join(parent[0]),
+                    rest_accounting.join(parent[1]))
+        try:
+            return self._call(bigip, func, args, kwargs), None
+        except Exception as err:
+            return None, err
+        finally:
+            transaction.leave(previous[0])
+            rest_accounting.leave(previous[1])
@@ -75,12 +75,15 @@ class DisconnectedServicePolling(object):
         d = self.driver
         if d.plugin_rpc:
             loadbalancer_ids = d.plugin_rpc.get_all_loadbalancers()
-            for lb in loadbalancer_ids:
-                id = lb['lb_id']
-                if (id in self.timer and self.timer[id]['expired']):
-                    # LB is in error state, no need to check further
+            # LBs in error state need no further checks.
+            ids = [lb['lb_id'] for lb in loadbalancer_ids
+                   if not (lb['lb_id'] in self.timer and
+                           self.timer[lb['lb_id']]['expired'])]
+            services = d.plugin_rpc.get_services_by_loadbalancer_ids(ids)
+            for id in ids:
+                service = services.get(id)
+                if not service:
                     continue
-                service = d.plugin_rpc.get_service_by_loadbalancer_id(id)
 
                 if (service['loadbalancer']['provisioning_status'].upper() !=
                         plugin_const.ACTIVE):
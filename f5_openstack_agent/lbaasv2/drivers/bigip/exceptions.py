@@ -306,6 +306,10 @@ class SystemDeleteException(F5AgentException):
     pass
 
 
+class TransactionCommitException(F5AgentException):
+    pass
+
+
 class VirtualServerCreationException(F5AgentException):
     pass
 
@@ -0,0 +1,123 @@
+# coding=utf-8
+"""Merge L2 population FDB events before they are sent to the BIG-IP®."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import collections
+
+import eventlet
+from eventlet import semaphore
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+ADD = 'add'
+REMOVE = 'remove'
+
+# Flooding entries exist once per VTEP rather than once per network.
+FLOODING_MAC = '00:00:00:00:00:00'
+
+
+class FdbBuffer(object):
+    """Collect FDB adds and removes and apply them once per window.
+
+    Events use the L2 population fdb format:
+
+        {'<network_id>': {'segment_id': <int>,
+                          'network_type': 'vxlan',
+                          'ports': {'<vtep>': [['<mac>', '<ip>'], ...]}}}
+
+    Pending changes are kept per network and MAC address, and only the
+    last change of a MAC address is applied: a remove cancels a pending
+    add of the same address and the other way around. flush_window
+    seconds after the first buffered event, all pending changes are
+    passed to flush(add_fdb, remove_fdb) at once, so each tunnel is
+    written once per window rather than once per event.
+
+    With a flush_window of 0, events are applied as they arrive.
+    """
+
+    def __init__(self, flush_window, flush):
+        self.flush_window = flush_window
+        self._flush = flush
+        # network id -> network attributes
+        self._networks = {}
+        # (network id, mac, vtep of flooding entries) ->
+        # (ADD or REMOVE, vtep, ip address)
+        self._pending = collections.OrderedDict()
+        self._timer = None
+        # Changes must reach the devices in the order they were buffered.
+        self._flush_lock = semaphore.Semaphore()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, fdb):
+        self._buffer(ADD, fdb)
+
+    def remove(self, fdb):
+        self._buffer(REMOVE, fdb)
+
+    def flush(self):
+        """Apply the pending changes now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, networks = self._pending, self._networks
+        self._pending = collections.OrderedDict()
+        self._networks = {}
+        if not pending:
+            return
+
+        fdbs = {ADD: {}, REMOVE: {}}
+        for (network_id, mac, _), (operation, vtep, ip_address) in \
+                pending.items():
+            network = fdbs[operation].get(network_id)
+            if network is None:
+                network = dict(networks[network_id], ports={})
+                fdbs[operation][network_id] = network
+            network['ports'].setdefault(vtep, []).append([mac, ip_address])
+
+        LOG.debug("Applying %d fdb changes" % len(pending))
+        with self._flush_lock:
+            self._flush(fdbs[ADD], fdbs[REMOVE])
+
+    def _buffer(self, operation, fdb):
+        for network_id, network in fdb.items():
+            self._networks[network_id] = dict(
+                (key, value) for key, value in network.items()
+                if key != 'ports')
+            for vtep, entries in network.get('ports', {}).items():
+                for entry in entries:
+                    mac = entry[0]
+                    key = (network_id, mac,
+                           vtep if mac == FLOODING_MAC else None)
+                    # Keep the latest change at the end, so changes are
+                    # applied in the order they were last made.
+                    self._pending.pop(key, None)
+                    self._pending[key] = (operation, vtep, entry[1])
+
+        if self.flush_window <= 0:
+            self.flush()
+        elif self._timer is None:
+            self._timer = eventlet.spawn_after(
+                self.flush_window, self._flush_safe)
+
+    def _flush_safe(self):
+        self._timer = None
+        try:
+            self.flush()
+        except Exception as exc:
+            LOG.error("Failed to apply fdb changes: %s" % exc.message)
@@ -0,0 +1,112 @@
+# coding=utf-8
+"""Local index of the FDB records of BIG-IP® tunnels."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import collections
+
+from eventlet import semaphore
+
+# (bigip hostname, partition, tunnel name) -> TunnelRecords
+_tunnels = {}
+# (bigip hostname, partition, tunnel name) -> Semaphore held while the
+# records of the tunnel are read from the device
+_loading = collections.defaultdict(semaphore.Semaphore)
+
+
+class TunnelRecords(object):
+    """FDB records of one tunnel on one BIG-IP®, keyed by MAC address.
+
+    The records are read from the device once and then kept up to date
+    by applying the changes the agent makes, so an L2 population event
+    costs one lookup per MAC address instead of a walk over the records.
+
+    Hold lock while changing the records and writing them to the device,
+    so that concurrent writers do not overwrite each other's changes.
+    """
+
+    def __init__(self, tunnel, records=None):
+        # Loaded fdb tunnel object, used to write the records.
+        self.tunnel = tunnel
+        self.records = collections.OrderedDict(
+            (record['name'], record) for record in records or [])
+        self.lock = semaphore.Semaphore()
+
+    def __contains__(self, mac):
+        return mac in self.records
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, mac, endpoint):
+        """Add or update the record of mac.
+
+        :returns: True if the records changed.
+        """
+        record = self.records.get(mac)
+        if record is not None and record.get('endpoint') == endpoint:
+            return False
+        self.records[mac] = {'name': mac, 'endpoint': endpoint}
+        return True
+
+    def remove(self, mac):
+        """Remove the record of mac.
+
+        :returns: True if the records changed.
+        """
+        return self.records.pop(mac, None) is not None
+
+    def to_list(self):
+        """Return the records as expected by tunnel.modify()."""
+        if not self.records:
+            return None
+        return list(self.records.values())
+
+
+def get(bigip, tunnel_name, partition):
+    """Return the indexed records of a tunnel, None if not indexed."""
+    return _tunnels.get((bigip.hostname, partition, tunnel_name))
+
+
+def loading(bigip, tunnel_name, partition):
+    """Return the lock to hold while reading the records of a tunnel.
+
+    Holding it, check get() again before reading, so that the tunnel is
+    read once when it is first used by concurrent callers.
+    """
+    return _loading[(bigip.hostname, partition, tunnel_name)]
+
+
+def put(bigip, tunnel_name, partition, tunnel):
+    """Index the records of a tunnel object loaded from bigip.
+
+    Records already indexed are kept and returned, so that changes made
+    to them meanwhile are not lost.
+    """
+    return _tunnels.setdefault(
+        (bigip.hostname, partition, tunnel_name),
+        TunnelRecords(tunnel, getattr(tunnel, 'records', None)))
+
+
+def forget(bigip, tunnel_name=None, partition=None):
+    """Drop indexed tunnels of bigip, so they are read again on next use.
+
+    Without tunnel_name, all tunnels of bigip are dropped.
+    """
+    if tunnel_name is None:
+        for key in [key for key in _tunnels if key[0] == bigip.hostname]:
+            del _tunnels[key]
+    else:
+        _tunnels.pop((bigip.hostname, partition, tunnel_name), None)
@@ -15,6 +15,7 @@
 # limitations under the License.
 #
 
+import copy
 import datetime
 import hashlib
 import logging as std_logging
@@ -22,7 +23,6 @@ import urllib2
 import uuid
 
 from eventlet import greenthread
-from time import time
 
 from neutron.common.exceptions import InvalidConfigurationOption
 from neutron.common.exceptions import NeutronException
@@ -35,32 +35,50 @@ from oslo_log import log as logging
 from oslo_utils import importutils
 
 from f5.bigip import ManagementRoot
+from f5_openstack_agent.lbaasv2.drivers.bigip.capacity_sampler import \
+    CapacitySampler
 from f5_openstack_agent.lbaasv2.drivers.bigip.cluster_manager import \
     ClusterManager
+from f5_openstack_agent.lbaasv2.drivers.bigip import config_snapshot
 from f5_openstack_agent.lbaasv2.drivers.bigip import constants_v2 as f5const
+from f5_openstack_agent.lbaasv2.drivers.bigip.device_fanout import \
+    DeviceFanout
 from f5_openstack_agent.lbaasv2.drivers.bigip.disconnected_service import \
     DisconnectedService
 from f5_openstack_agent.lbaasv2.drivers.bigip.disconnected_service import \
     DisconnectedServicePolling
 from f5_openstack_agent.lbaasv2.drivers.bigip import exceptions as f5ex
+from f5_openstack_agent.lbaasv2.drivers.bigip.fdb_buffer import FdbBuffer
+from f5_openstack_agent.lbaasv2.drivers.bigip import fdb_index
 from f5_openstack_agent.lbaasv2.drivers.bigip.lbaas_builder import \
     LBaaSBuilder
 from f5_openstack_agent.lbaasv2.drivers.bigip.lbaas_driver import \
     LBaaSBaseDriver
+from f5_openstack_agent.lbaasv2.drivers.bigip import metrics
 from f5_openstack_agent.lbaasv2.drivers.bigip import network_helper
 from f5_openstack_agent.lbaasv2.drivers.bigip.network_service import \
     NetworkServiceBuilder
+from f5_openstack_agent.lbaasv2.drivers.bigip import rest_accounting
 from f5_openstack_agent.lbaasv2.drivers.bigip.service_adapter import \
     ServiceModelAdapter
 from f5_openstack_agent.lbaasv2.drivers.bigip import ssl_profile
 from f5_openstack_agent.lbaasv2.drivers.bigip import stat_helper
+from f5_openstack_agent.lbaasv2.drivers.bigip.state_store import \
+    get_config_marker
+from f5_openstack_agent.lbaasv2.drivers.bigip.state_store import \
+    get_deployed_paths
+from f5_openstack_agent.lbaasv2.drivers.bigip.state_store import StateStore
+from f5_openstack_agent.lbaasv2.drivers.bigip.stats_collector import \
+    StatsCollector
+from f5_openstack_agent.lbaasv2.drivers.bigip.status_sender import \
+    StatusSender
 from f5_openstack_agent.lbaasv2.drivers.bigip.system_helper import \
     SystemHelper
 from f5_openstack_agent.lbaasv2.drivers.bigip.tenants import \
     BigipTenantManager
-from f5_openstack_agent.lbaasv2.drivers.bigip.utils import OBJ_PREFIX
+from f5_openstack_agent.lbaasv2.drivers.bigip.utils import \
+    index_member_states
 from f5_openstack_agent.lbaasv2.drivers.bigip.utils import serialized
-from f5_openstack_agent.lbaasv2.drivers.bigip.utils import strip_domain_address
 
 LOG = logging.getLogger(__name__)
 
@@ -282,6 +300,60 @@ OPTS = [  # XXX maybe we should make this a dictionary
         'os_tenant_name',
         default=None,
         help='OpenStack tenant name for Keystone authentication (v2 only).'
+    ),
+    cfg.IntOpt(
+        'max_concurrent_loadbalancers', default=1,
+        help='How many loadbalancers of different tenants may be '
+             'provisioned on the BIG-IPs at the same time'
+    ),
+    cfg.IntOpt(
+        'max_concurrent_device_operations', default=4,
+        help='How many iControl REST operations the agent may send to '
+             'the same BIG-IP at the same time'
+    ),
+    cfg.BoolOpt(
+        'f5_use_transactions', default=False,
+        help='Apply the health monitor and member changes of a '
+             'loadbalancer in one iControl REST transaction per BIG-IP'
+    ),
+    cfg.StrOpt(
+        'route_domain_cache_file', default=None,
+        help='File in which to keep the subnets of the tenant route '
+             'domains, so that a restarted agent does not read them '
+             'from the BIG-IPs again'
+    ),
+    cfg.StrOpt(
+        'agent_state_file', default=None,
+        help='File in which to keep the networks and subnets assured on '
+             'each BIG-IP, the route domain subnets and the known '
+             'loadbalancers, e.g. $state_path/f5-agent-state.json. Kept '
+             'state of a BIG-IP is used again as long as its networking '
+             'configuration did not change. Replaces '
+             'route_domain_cache_file when set'
+    ),
+    cfg.IntOpt(
+        'status_queue_size', default=10000,
+        help='How many object status updates may wait to be sent to '
+             'Neutron before the oldest ones are dropped'
+    ),
+    cfg.IntOpt(
+        'stats_collection_interval', default=60,
+        help='Seconds between collections of the statistics of the '
+             'tenant partitions stats are requested for'
+    ),
+    cfg.IntOpt(
+        'capacity_sample_ttl', default=120,
+        help='Seconds for which the capacity metrics read from a device '
+             'are used to compute the capacity score'
+    ),
+    cfg.FloatOpt(
+        'rest_slow_call_threshold', default=1.0,
+        help='Seconds from which iControl REST requests are logged as '
+             'slow, 0 to disable'
+    ),
+    cfg.FloatOpt(
+        'rest_slow_call_sample_rate', default=1.0,
+        help='Fraction of the slow iControl REST requests which is logged'
     )
 ]
 
@@ -315,6 +387,23 @@ class iControlDriver(LBaaSBaseDriver):
         self.conf = conf
         if registerOpts:
             self.conf.register_opts(OPTS)
+        self.service_queue.max_concurrent = \
+            self.conf.max_concurrent_loadbalancers
+        self.device_fanout = DeviceFanout(
+            self.conf.max_concurrent_device_operations)
+        self.fdb_buffer = FdbBuffer(
+            self.conf.l2_population_flush_window, self._apply_fdb)
+        self.status_sender = StatusSender(
+            max_statuses=self.conf.status_queue_size)
+        # Loadbalancers to provision again on the next resync, e.g. when
+        # their changes were committed on only some of the bigips.
+        self.resync_loadbalancer_ids = set()
+        self.stats_collector = StatsCollector(
+            self.get_all_bigips, device_fanout=self.device_fanout,
+            interval=self.conf.stats_collection_interval)
+        if self.conf.agent_state_file:
+            self.state_store = StateStore(self.conf.agent_state_file)
+            self.state_store.load()
         self.hostnames = None
         self.device_type = conf.f5_device_type
         self.plugin_rpc = None  # overrides base, same value
@@ -335,6 +424,11 @@ class iControlDriver(LBaaSBaseDriver):
         self.l3_binding = None
         self.cert_manager = None  # overrides register_OPTS
         self.stat_helper = stat_helper.StatHelper()
+        self.capacity_sampler = CapacitySampler(
+            self.stat_helper, ttl=self.conf.capacity_sample_ttl)
+        self.slow_calls = rest_accounting.SlowCallLog(
+            self.conf.rest_slow_call_threshold,
+            self.conf.rest_slow_call_sample_rate)
         self.network_helper = network_helper.NetworkHelper()
         self.disconnected_service = None
         self.disconnected_service_polling = None
@@ -550,9 +644,11 @@ class iControlDriver(LBaaSBaseDriver):
         LOG.info('Opening iControl connection to %s @ %s' %
                  (self.conf.icontrol_username, hostname))
 
-        return ManagementRoot(hostname,
-                              self.conf.icontrol_username,
-                              self.conf.icontrol_password)
+        bigip = ManagementRoot(hostname,
+                               self.conf.icontrol_username,
+                               self.conf.icontrol_password)
+        rest_accounting.instrument(bigip, self.slow_calls)
+        return bigip
 
     def _init_bigip(self, bigip, hostname, check_group_name=None):
         # Prepare a bigip for usage
@@ -607,9 +703,10 @@ class iControlDriver(LBaaSBaseDriver):
                   (bigip.device_name, ', '.join(bigip.mac_addresses)))
         bigip.device_interfaces = \
             self.system_helper.get_interface_macaddresses_dict(bigip)
-        bigip.assured_networks = {}
-        bigip.assured_tenant_snat_subnets = {}
-        bigip.assured_gateway_subnets = []
+        self._reset_bigip_state(bigip)
+        bigip.state_restored = bool(
+            self.state_store and self._restore_bigip_state(bigip))
+        fdb_index.forget(bigip)
 
         if self.conf.f5_ha_type != 'standalone':
             self.cluster_manager.disable_auto_sync(device_group_name, bigip)
@@ -696,12 +793,13 @@ class iControlDriver(LBaaSBaseDriver):
                     metric_func = getattr(self, func_name)
                     metric_value = 0
                     for bigip in bigips:
-                        global_stats = \
-                            self.stat_helper.get_global_statistics(bigip)
-                        value = int(
-                            metric_func(bigip=bigip,
-                                        global_statistics=global_stats)
-                        )
+                        # All metrics of a device are computed from one
+                        # sample, which is read again once it expires.
+                        value = int(self.capacity_sampler.get_metric(
+                            bigip, metric, lambda bigip: metric_func(
+                                bigip=bigip,
+                                global_statistics=self.capacity_sampler.
+                                get_global_statistics(bigip))))
                         LOG.debug('calling capacity %s on %s returned: %s'
                                   % (func_name, bigip.hostname, value))
                         if value > metric_value:
@@ -727,6 +825,7 @@ class iControlDriver(LBaaSBaseDriver):
     def set_plugin_rpc(self, plugin_rpc):
         # Provide Plugin RPC access
         self.plugin_rpc = plugin_rpc
+        self.status_sender.plugin_rpc = plugin_rpc
 
     def set_tunnel_rpc(self, tunnel_rpc):
         # Provide FDB Connector with ML2 RPC access
@@ -743,19 +842,83 @@ class iControlDriver(LBaaSBaseDriver):
         return True
 
     def flush_cache(self):
-        # Remove cached objects so they can be created if necessary
+        # Remove cached objects so they can be created if necessary.
+        # With a state store, the objects of a bigip whose networking
+        # configuration did not change since they were stored are kept.
         for bigip in self.get_all_bigips():
-            bigip.assured_networks = {}
-            bigip.assured_tenant_snat_subnets = {}
-            bigip.assured_gateway_subnets = []
+            if not (self.state_store and self._restore_bigip_state(bigip)):
+                self._reset_bigip_state(bigip)
+            fdb_index.forget(bigip)
+        if self.state_store and self.state_store.dirty:
+            self.state_store.save()
+
+    def _reset_bigip_state(self, bigip):
+        bigip.assured_networks = {}
+        bigip.assured_tenant_snat_subnets = {}
+        bigip.assured_gateway_subnets = []
+
+    def _get_bigip_state(self, bigip):
+        # Copy of the assured objects of bigip, as kept in the state store
+        return {
+            'assured_networks': dict(bigip.assured_networks),
+            'assured_tenant_snat_subnets': dict(
+                (tenant_id, list(subnet_ids)) for tenant_id, subnet_ids in
+                bigip.assured_tenant_snat_subnets.items()),
+            'assured_gateway_subnets': list(bigip.assured_gateway_subnets)
+        }
+
+    def _restore_bigip_state(self, bigip):
+        # Take the assured objects of bigip from the state store if the
+        # networking configuration of bigip is still the stored one.
+        marker, state = self.state_store.get_device(bigip.hostname)
+        if state is None:
+            return False
+        try:
+            current_marker = get_config_marker(bigip)
+        except Exception as exc:
+            LOG.error("Failed to read config marker of %s: %s" %
+                      (bigip.hostname, exc.message))
+            return False
+        if current_marker != marker:
+            LOG.info("Configuration of %s changed, assured objects will "
+                     "be verified again" % bigip.hostname)
+            self.state_store.forget_device(bigip.hostname)
+            return False
+        state = copy.deepcopy(state)
+        bigip.assured_networks = state['assured_networks']
+        bigip.assured_tenant_snat_subnets = \
+            state['assured_tenant_snat_subnets']
+        bigip.assured_gateway_subnets = state['assured_gateway_subnets']
+        return True
 
-    @serialized('create_loadbalancer')
+    def _save_state(self):
+        # Store the assured objects of the bigips which changed, together
+        # with the config marker of the bigip they belong to.
+        for bigip in self.get_all_bigips():
+            state = self._get_bigip_state(bigip)
+            if not self.state_store.dirty and \
+                    state == self.state_store.get_device(bigip.hostname)[1]:
+                continue
+            try:
+                marker = get_config_marker(bigip)
+            except Exception as exc:
+                LOG.error("Failed to read config marker of %s: %s" %
+                          (bigip.hostname, exc.message))
+                continue
+            # Another service may have changed the objects while the
+            # marker was read, in which case this pair is not consistent.
+            if self._get_bigip_state(bigip) == state:
+                self.state_store.put_device(bigip.hostname, marker, state)
+        if self.state_store.dirty:
+            self.state_store.save()
+
+    @serialized('create_loadbalancer', coalesce=True)
     @is_connected
     def create_loadbalancer(self, loadbalancer, service):
         """Create virtual server"""
         self._common_service_handler(service)
 
-    @serialized('update_loadbalancer')
+    @serialized('update_loadbalancer', coalesce=True)
     @is_connected
     def update_loadbalancer(self, old_loadbalancer, loadbalancer, service):
         """Update virtual server"""
@@ -769,7 +932,7 @@ class iControlDriver(LBaaSBaseDriver):
         LOG.debug("Deleting loadbalancer")
         self._common_service_handler(service, True)
 
-    @serialized('create_listener')
+    @serialized('create_listener', coalesce=True)
     @is_connected
     def create_listener(self, listener, service):
         """Create virtual server"""
@@ -784,63 +947,63 @@ class iControlDriver(LBaaSBaseDriver):
         service['old_listener'] = old_listener
         self._common_service_handler(service)
 
-    @serialized('delete_listener')
+    @serialized('delete_listener', coalesce=True)
     @is_connected
     def delete_listener(self, listener, service):
         """Delete virtual server"""
         LOG.debug("Deleting listener")
         self._common_service_handler(service)
 
-    @serialized('create_pool')
+    @serialized('create_pool', coalesce=True)
     @is_connected
     def create_pool(self, pool, service):
         """Create lb pool"""
         LOG.debug("Creating pool")
         self._common_service_handler(service)
 
-    @serialized('update_pool')
+    @serialized('update_pool', coalesce=True)
     @is_connected
     def update_pool(self, old_pool, pool, service):
         """Update lb pool"""
         LOG.debug("Updating pool")
         self._common_service_handler(service)
 
-    @serialized('delete_pool')
+    @serialized('delete_pool', coalesce=True)
     @is_connected
     def delete_pool(self, pool, service):
         """Delete lb pool"""
         LOG.debug("Deleting pool")
         self._common_service_handler(service)
 
-    @serialized('create_member')
+    @serialized('create_member', coalesce=True)
     @is_connected
     def create_member(self, member, service):
         """Create pool member"""
         LOG.debug("Creating member")
         self._common_service_handler(service)
 
-    @serialized('update_member')
+    @serialized('update_member', coalesce=True)
     @is_connected
     def update_member(self, old_member, member, service):
         """Update pool member"""
         LOG.debug("Updating member")
         self._common_service_handler(service)
 
-    @serialized('delete_member')
+    @serialized('delete_member', coalesce=True)
     @is_connected
     def delete_member(self, member, service):
         """Delete pool member"""
         LOG.debug("Deleting member")
         self._common_service_handler(service)
 
-    @serialized('create_health_monitor')
+    @serialized('create_health_monitor', coalesce=True)
     @is_connected
     def create_health_monitor(self, health_monitor, service):
         """Create pool health monitor"""
         LOG.debug("Creating health monitor")
         self._common_service_handler(service)
 
-    @serialized('update_health_monitor')
+    @serialized('update_health_monitor', coalesce=True)
     @is_connected
     def update_health_monitor(self, old_health_monitor,
                               health_monitor, service):
@@ -848,7 +1011,7 @@ class iControlDriver(LBaaSBaseDriver):
         LOG.debug("Updating health monitor")
         self._common_service_handler(service)
 
-    @serialized('delete_health_monitor')
+    @serialized('delete_health_monitor', coalesce=True)
     @is_connected
     def delete_health_monitor(self, health_monitor, service):
         """Delete pool health monitor"""
@@ -858,105 +1021,97 @@ class iControlDriver(LBaaSBaseDriver):
     @is_connected
     def get_stats(self, service):
         """Get service stats"""
-        # use pool stats because the pool_id is the
-        # the service definition...
+        # Statistics are answered from the stats collector, which reads
+        # those of the whole tenant partition from all BIG-IPs® at once.
+        loadbalancer = service.get('loadbalancer')
+        if not loadbalancer:
+            return None
+        partition = self.service_adapter.get_folder_name(
+            loadbalancer['tenant_id'])
+        device_stats = self.stats_collector.get_partition_stats(partition)
+        # It appears that stats are collected for loadbalancers in a
+        # pending delete state which means that if those messages are
+        # queued (or delayed) it can result in the process of a stats
+        # request after the tenant is long gone.
+        if not device_stats or not all(
+                stats['virtuals'] or stats['pools']
+                for stats in device_stats):
+            return None
+
         stats = {}
         stats[lb_const.STATS_IN_BYTES] = 0
         stats[lb_const.STATS_OUT_BYTES] = 0
         stats[lb_const.STATS_ACTIVE_CONNECTIONS] = 0
         stats[lb_const.STATS_TOTAL_CONNECTIONS] = 0
-        # add a members stats return dictionary
+        counters = ((lb_const.STATS_IN_BYTES, 'bytes_in'),
+                    (lb_const.STATS_OUT_BYTES, 'bytes_out'),
+                    (lb_const.STATS_ACTIVE_CONNECTIONS, 'active_connections'),
+                    (lb_const.STATS_TOTAL_CONNECTIONS, 'total_connections'))
+        for listener in service.get('listeners', []):
+            name = self.service_adapter.get_virtual_name(
+                {'loadbalancer': loadbalancer, 'listener': listener})
+            path = '/%s/%s' % (name['partition'], name['name'])
+            for hoststats in device_stats:
+                virtual_stats = hoststats['virtuals'].get(path)
+                if virtual_stats:
+                    for stat, counter in counters:
+                        stats[stat] += virtual_stats[counter]
+
+        # only report the status of BIG-IP® pool members if they
+        # not in a state indicating provisioning or error
+        # provisioning the pool member
+        update_if_status = [plugin_const.ACTIVE,
+                            plugin_const.DOWN,
+                            plugin_const.INACTIVE]
+        pool_paths = {}
+        for pool in service.get('pools', []):
+            name = self.service_adapter.init_pool_name(loadbalancer, pool)
+            pool_paths[pool['id']] = '/%s/%s' % (name['partition'],
+                                                 name['name'])
+        # pool member monitor states of each pool on each BIG-IP®,
+        # by address and port
+        pool_states = {}
         members = {}
-        for hostbigip in self.get_all_bigips():
-            # It appears that stats are collected for pools in a pending delete
-            # state which means that if those messages are queued (or delayed)
-            # it can result in the process of a stats request after the pool
-            # and tenant are long gone. Check if the tenant exists.
-            if not service['pool'] or not hostbigip.system.folder_exists(
-                    OBJ_PREFIX + service['pool']['tenant_id']):
-                return None
-            pool = service['pool']
-            pool_stats = hostbigip.pool.get_statistics(
-                name=pool['id'],
-                folder=pool['tenant_id'],
-                config_mode=self.conf.icontrol_config_mode)
-            if 'STATISTIC_SERVER_SIDE_BYTES_IN' in pool_stats:
-                stats[lb_const.STATS_IN_BYTES] += \
-                    pool_stats['STATISTIC_SERVER_SIDE_BYTES_IN']
-                stats[lb_const.STATS_OUT_BYTES] += \
-                    pool_stats['STATISTIC_SERVER_SIDE_BYTES_OUT']
-                stats[lb_const.STATS_ACTIVE_CONNECTIONS] += \
-                    pool_stats['STATISTIC_SERVER_SIDE_CURRENT_CONNECTIONS']
-                stats[lb_const.STATS_TOTAL_CONNECTIONS] += \
-                    pool_stats['STATISTIC_SERVER_SIDE_TOTAL_CONNECTIONS']
-                # are there members to update status
-                if 'members' in service:
-                    # only query BIG-IP® pool members if they
-                    # not in a state indicating provisioning or error
-                    # provisioning the pool member
-                    some_members_require_status_update = False
-                    update_if_status = [plugin_const.ACTIVE,
-                                        plugin_const.DOWN,
-                                        plugin_const.INACTIVE]
-                    if plugin_const.ACTIVE not in update_if_status:
-                        update_if_status.append(plugin_const.ACTIVE)
-
-                    for member in service['members']:
-                        if member['status'] in update_if_status:
-                            some_members_require_status_update = True
-                    # are we have members who are in a
-                    # state to update there status
-                    if some_members_require_status_update:
-                        # query pool members on each BIG-IP
-                        monitor_states = \
-                            hostbigip.pool.get_members_monitor_status(
-                                name=pool['id'],
-                                folder=pool['tenant_id'],
-                                config_mode=self.conf.icontrol_config_mode
-                            )
-                        for member in service['members']:
-                            if member['status'] in update_if_status:
-                                # create the entry for this
-                                # member in the return status
-                                # dictionary set to ACTIVE
-                                if not member['id'] in members:
-                                    members[member['id']] = \
-                                        {'status': plugin_const.INACTIVE}
-                                # check if it down or up by monitor
-                                # and update the status
-                                for state in monitor_states:
-                                    # matched the pool member
-                                    # by address and port number
-                                    if member['address'] == \
-                                            strip_domain_address(
-                                            state['addr']) and \
-                                            int(member['protocol_port']) == \
-                                            int(state['port']):
-                                        # if the monitor says member is up
-                                        if state['state'] == \
-                                                'MONITOR_STATUS_UP' or \
-                                           state['state'] == \
-                                                'MONITOR_STATUS_UNCHECKED':
-                                            # set ACTIVE as long as the
-                                            # status was not set to 'DOWN'
-                                            # on another BIG-IP
-                                            if members[
-                                                member['id']]['status'] != \
-                                                    'DOWN':
-                                                if member['admin_state_up']:
-                                                    members[member['id']][
-                                                        'status'] = \
-                                                        plugin_const.ACTIVE
-                                                else:
-                                                    members[member['id']][
-                                                        'status'] = \
-                                                        plugin_const.INACTIVE
-                                        else:
-                                            members[member['id']]['status'] = \
-                                                plugin_const.DOWN
+        for member in service.get('members', []):
+            if member.get('provisioning_status') not in update_if_status:
+                continue
+            path = pool_paths.get(member.get('pool_id'))
+            if path not in pool_states:
+                pool_states[path] = [
+                    index_member_states(
+                        hoststats['pools'].get(path, {}).get('members', []))
+                    for hoststats in device_stats]
+                # Large pools take a while to index, let other
+                # greenthreads run.
+                greenthread.sleep(0)
+            key = (member['address'], int(member['protocol_port']))
+            states = []
+            for index in pool_states[path]:
+                states.extend(index.get(key, []))
+            members[member['id']] = {
+                'status': self._get_member_status(member, states)}
         stats['members'] = members
         return stats
 
+    def _get_member_status(self, member, monitor_states):
+        # Status of a member given the monitor states matching its
+        # address and port on all BIG-IPs
+        status = plugin_const.INACTIVE
+        for state in monitor_states:
+            # if the monitor says member is up
+            if state['state'] == 'MONITOR_STATUS_UP' or \
+               state['state'] == 'MONITOR_STATUS_UNCHECKED':
+                # set ACTIVE as long as the status was not
+                # set to 'DOWN' on another BIG-IP
+                if status != plugin_const.DOWN:
+                    if member['admin_state_up']:
+                        status = plugin_const.ACTIVE
+                    else:
+                        status = plugin_const.INACTIVE
+            else:
+                status = plugin_const.DOWN
+        return status
+
     @serialized('remove_orphans')
     def remove_orphans(self, all_loadbalancers):
         """Remove out-of-date configuration on big-ips """
@@ -966,31 +1121,39 @@ class iControlDriver(LBaaSBaseDriver):
             existing_tenants.append(loadbalancer['tenant_id'])
             existing_lbs.append(loadbalancer['lb_id'])
 
-        for bigip in self.get_all_bigips():
-            bigip.pool.purge_orphaned_pools(existing_lbs)
-        for bigip in self.get_all_bigips():
-            bigip.system.purge_orphaned_folders_contents(existing_tenants)
+        self.device_fanout.run(self.get_all_bigips(),
+                               self._remove_bigip_orphans,
+                               existing_tenants, existing_lbs)
 
-        for bigip in self.get_all_bigips():
-            bigip.system.purge_orphaned_folders(existing_tenants)
+    def _remove_bigip_orphans(self, bigip, existing_tenants, existing_lbs):
+        bigip.pool.purge_orphaned_pools(existing_lbs)
+        bigip.system.purge_orphaned_folders_contents(existing_tenants)
+        bigip.system.purge_orphaned_folders(existing_tenants)
 
     def fdb_add(self, fdb):
         # Add (L2toL3) forwarding database entries
         self.remove_ips_from_fdb_update(fdb)
-        for bigip in self.get_all_bigips():
-            self.network_builder.add_bigip_fdb(bigip, fdb)
+        self.fdb_buffer.add(fdb)
 
     def fdb_remove(self, fdb):
         # Remove (L2toL3) forwarding database entries
         self.remove_ips_from_fdb_update(fdb)
-        for bigip in self.get_all_bigips():
-            self.network_builder.remove_bigip_fdb(bigip, fdb)
+        self.fdb_buffer.remove(fdb)
 
     def fdb_update(self, fdb):
         # Update (L2toL3) forwarding database entries
         self.remove_ips_from_fdb_update(fdb)
-        for bigip in self.get_all_bigips():
-            self.network_builder.update_bigip_fdb(bigip, fdb)
+        self.fdb_buffer.add(fdb)
+
+    def _apply_fdb(self, add_fdb, remove_fdb):
+        # Apply the fdb changes merged by the fdb buffer
+        bigips = self.get_all_bigips()
+        if remove_fdb:
+            self.device_fanout.run(
+                bigips, self.network_builder.remove_bigip_fdb, remove_fdb)
+        if add_fdb:
+            self.device_fanout.run(
+                bigips, self.network_builder.update_bigip_fdb, add_fdb)
 
     # remove ips from fdb update so we do not try to
     # add static arps for them because we do not have
@@ -1024,7 +1187,7 @@ class iControlDriver(LBaaSBaseDriver):
         # Tunnel sync sent.
         return False
 
-    @serialized('sync')
+    @serialized('sync', coalesce=True)
     @is_connected
     def sync(self, service):
         """Sync service defintion to device"""
@@ -1048,6 +1211,42 @@ class iControlDriver(LBaaSBaseDriver):
                       % bigip.hostname)
             self.cluster_manager.save_config(bigip)
 
+    def get_service_paths(self, service):
+        # Paths of the tenant folder, virtual servers and pools of the
+        # service, leaving out those being deleted. The folder makes a
+        # loadbalancer without listeners and pools missing from a bigip
+        # without its tenant.
+        loadbalancer = service['loadbalancer']
+        names = [self.service_adapter.get_virtual_name(
+                 {'loadbalancer': loadbalancer, 'listener': listener})
+                 for listener in service.get('listeners', [])
+                 if listener.get('provisioning_status') !=
+                 plugin_const.PENDING_DELETE]
+        names += [self.service_adapter.init_pool_name(loadbalancer, pool)
+                  for pool in service.get('pools', [])
+                  if pool.get('provisioning_status') !=
+                  plugin_const.PENDING_DELETE]
+        folder = '/' + self.service_adapter.get_folder_name(
+            loadbalancer['tenant_id'])
+        return sorted(['/%s/%s' % (name['partition'], name['name'])
+                       for name in names] + [folder])
+
+    @is_connected
+    def get_deployed_paths(self):
+        # Paths of the folders, virtual servers and pools on each bigip, by
+        # hostname, read with one request per collection and bigip.
+        # Returns None when a bigip can not be read, so that no service
+        # is taken as changed.
+        deployed = {}
+        for bigip in self.get_all_bigips():
+            try:
+                deployed[bigip.hostname] = get_deployed_paths(bigip)
+            except Exception as exc:
+                LOG.error("Unable to read deployed paths from %s: %s" %
+                          (bigip.hostname, exc))
+                return None
+        return deployed
+
     def _service_exists(self, service):
         # Returns whether the bigip has a pool for the service
         if not service['loadbalancer']:
@@ -1076,16 +1275,22 @@ class iControlDriver(LBaaSBaseDriver):
 
     def _common_service_handler(self, service, delete_partition=False):
         # Assure that the service is configured on bigip(s)
-        start_time = time()
-
         if not service['loadbalancer']:
             LOG.error("_common_service_handler: Service loadbalancer is None")
             return
 
+        # Answer existence checks in the tenant partition from one
+        # fetch per resource type rather than one request per object.
+        snapshot = config_snapshot.begin(
+            self.get_all_bigips(),
+            self.service_adapter.get_folder_name(
+                service['loadbalancer']['tenant_id']))
+        # Sum up the REST requests of the pass in one log line.
+        account = rest_accounting.begin(
+            'loadbalancer %s' % service['loadbalancer']['id'])
         try:
-            self.tenant_manager.assure_tenant_created(service)
-            LOG.debug("    _assure_tenant_created took %.5f secs" %
-                      (time() - start_time))
+            with metrics.stage('tenant'):
+                self.tenant_manager.assure_tenant_created(service)
 
             traffic_group = self.service_to_traffic_group(service)
             service['loadbalancer']['traffic_group'] = traffic_group
@@ -1112,19 +1317,15 @@ class iControlDriver(LBaaSBaseDriver):
                             plugin_const.ERROR
                         raise f5ex.MissingNetwork("Missing segmentation id")
 
-                start_time = time()
                 try:
-                    self.network_builder.prep_service_networking(
-                        service, traffic_group)
+                    with metrics.stage('networking'):
+                        self.network_builder.prep_service_networking(
+                            service, traffic_group)
                 except Exception as exc:
                     LOG.error("Exception: icontrol_driver: %s", exc.message)
                     service['loadbalancer']['provisioning_status'] = \
                         plugin_const.ERROR
                     raise
-
-                if time() - start_time > .001:
-                    LOG.debug("    _prep_service_networking "
-                              "took %.5f secs" % (time() - start_time))
                 break
 
             all_subnet_hints = {}
@@ -1146,11 +1347,9 @@ class iControlDriver(LBaaSBaseDriver):
             LOG.debug("XXXXXXXXX: Post assure service")
 
             if self.network_builder:
-                start_time = time()
-                self.network_builder.post_service_networking(
-                    service, all_subnet_hints)
-                LOG.debug("    _post_service_networking took %.5f secs" %
-                          (time() - start_time))
+                with metrics.stage('post_networking'):
+                    self.network_builder.post_service_networking(
+                        service, all_subnet_hints)
 
             # only delete partition if loadbalancer is being deleted
             if delete_partition:
@@ -1160,7 +1359,12 @@ class iControlDriver(LBaaSBaseDriver):
             LOG.exception(err)
 
         finally:
-            self._update_service_status(service)
+            config_snapshot.end(snapshot)
+            rest_accounting.end(account)
+            if self.state_store:
+                self._save_state()
+            with metrics.stage('status'):
+                self._update_service_status(service)
 
     def _update_service_status(self, service):
         """Update status of objects in OpenStack """
@@ -1169,82 +1373,83 @@ class iControlDriver(LBaaSBaseDriver):
                       "RPC handler.")
             return
 
+        # The updates of all objects are sent in one message, by the
+        # status sender so that the next service does not wait for it.
+        status = self.plugin_rpc.status_batch(service['loadbalancer']['id'])
         if 'members' in service:
             # Call update_members_status
-            self._update_member_status(service['members'])
+            self._update_member_status(service['members'], status)
         if 'healthmonitors' in service:
             # Call update_monitor_status
             self._update_health_monitor_status(
-                service['healthmonitors']
+                service['healthmonitors'], status
             )
         if 'pools' in service:
             # Call update_pool_status
             self._update_pool_status(
-                service['pools']
+                service['pools'], status
             )
         if 'listeners' in service:
             # Call update_listener_status
-            self._update_listener_status(service)
-        self._update_loadbalancer_status(service)
+            self._update_listener_status(service, status)
+        self._update_loadbalancer_status(service, status)
+        self.status_sender.send(status)
 
-    def _update_member_status(self, members):
+    def _update_member_status(self, members, status):
         """Update member status in OpenStack """
         for member in members:
             if 'provisioning_status' in member:
                 provisioning_status = member['provisioning_status']
                 if (provisioning_status == plugin_const.PENDING_CREATE or
                         provisioning_status == plugin_const.PENDING_UPDATE):
-                        self.plugin_rpc.update_member_status(
-                            member['id'],
+                        status.update_status(
+                            'member', member['id'],
                             plugin_const.ACTIVE,
                             lb_const.ONLINE
                         )
                 elif provisioning_status == plugin_const.PENDING_DELETE:
-                    self.plugin_rpc.member_destroyed(
-                        member['id'])
+                    status.destroyed('member', member['id'])
                 elif provisioning_status == plugin_const.ERROR:
-                    self.plugin_rpc.update_member_status(member['id'])
+                    status.update_status('member', member['id'])
 
-    def _update_health_monitor_status(self, health_monitors):
+    def _update_health_monitor_status(self, health_monitors, status):
         """Update pool monitor status in OpenStack """
         for health_monitor in health_monitors:
             if 'provisioning_status' in health_monitor:
                 provisioning_status = health_monitor['provisioning_status']
                 if (provisioning_status == plugin_const.PENDING_CREATE or
                         provisioning_status == plugin_const.PENDING_UPDATE):
-                        self.plugin_rpc.update_health_monitor_status(
-                            health_monitor['id'],
+                        status.update_status(
+                            'health_monitor', health_monitor['id'],
                             plugin_const.ACTIVE,
                             lb_const.ONLINE
                         )
                 elif provisioning_status == plugin_const.PENDING_DELETE:
-                    self.plugin_rpc.health_monitor_destroyed(
-                        health_monitor['id'])
+                    status.destroyed('health_monitor', health_monitor['id'])
                 elif provisioning_status == plugin_const.ERROR:
-                    self.plugin_rpc.update_health_monitor_status(
-                        health_monitor['id'])
+                    status.update_status(
+                        'health_monitor', health_monitor['id'])
 
     @log_helpers.log_method_call
-    def _update_pool_status(self, pools):
+    def _update_pool_status(self, pools, status):
         """Update pool status in OpenStack """
         for pool in pools:
             if 'provisioning_status' in pool:
                 provisioning_status = pool['provisioning_status']
                 if (provisioning_status == plugin_const.PENDING_CREATE or
                         provisioning_status == plugin_const.PENDING_UPDATE):
-                        self.plugin_rpc.update_pool_status(
-                            pool['id'],
+                        status.update_status(
+                            'pool', pool['id'],
                             plugin_const.ACTIVE,
                             lb_const.ONLINE
                         )
                 elif provisioning_status == plugin_const.PENDING_DELETE:
-                    self.plugin_rpc.pool_destroyed(
-                        pool['id'])
+                    status.destroyed('pool', pool['id'])
                 elif provisioning_status == plugin_const.ERROR:
-                    self.plugin_rpc.update_pool_status(pool['id'])
+                    status.update_status('pool', pool['id'])
 
     @log_helpers.log_method_call
-    def _update_listener_status(self, service):
+    def _update_listener_status(self, service, status):
         """Update listener status in OpenStack """
         listeners = service['listeners']
         for listener in listeners:
@@ -1252,22 +1457,21 @@ class iControlDriver(LBaaSBaseDriver):
                 provisioning_status = listener['provisioning_status']
                 if (provisioning_status == plugin_const.PENDING_CREATE or
                         provisioning_status == plugin_const.PENDING_UPDATE):
-                        self.plugin_rpc.update_listener_status(
-                            listener['id'],
+                        status.update_status(
+                            'listener', listener['id'],
                             plugin_const.ACTIVE,
                             listener['operating_status']
                         )
                 elif provisioning_status == plugin_const.PENDING_DELETE:
-                    self.plugin_rpc.listener_destroyed(
-                        listener['id'])
+                    status.destroyed('listener', listener['id'])
                 elif provisioning_status == plugin_const.ERROR:
-                    self.plugin_rpc.update_listener_status(
-                        listener['id'],
+                    status.update_status(
+                        'listener', listener['id'],
                         provisioning_status,
                         lb_const.OFFLINE)
 
     @log_helpers.log_method_call
-    def _update_loadbalancer_status(self, service):
+    def _update_loadbalancer_status(self, service, status):
         """Update loadbalancer status in OpenStack """
         loadbalancer = service['loadbalancer']
         provisioning_status = loadbalancer['provisioning_status']
@@ -1281,16 +1485,15 @@ class iControlDriver(LBaaSBaseDriver):
                 # operational status will be set by the disconnected
                 # service polling thread if that mode is enabled
                 operating_status = lb_const.OFFLINE
-            self.plugin_rpc.update_loadbalancer_status(
-                loadbalancer['id'],
+            status.update_status(
+                'loadbalancer', loadbalancer['id'],
                 plugin_const.ACTIVE,
                 operating_status)
         elif provisioning_status == plugin_const.PENDING_DELETE:
-            self.plugin_rpc.loadbalancer_destroyed(
-                loadbalancer['id'])
+            status.destroyed('loadbalancer', loadbalancer['id'])
         elif provisioning_status == plugin_const.ERROR:
-            self.plugin_rpc.update_loadbalancer_status(
-                loadbalancer['id'],
+            status.update_status(
+                'loadbalancer', loadbalancer['id'],
                 provisioning_status,
                 lb_const.OFFLINE)
         else:
@@ -1354,7 +1557,8 @@ class iControlDriver(LBaaSBaseDriver):
             bigip, global_stats=global_statistics)
 
     def get_node_count(self, bigip=None, global_statistics=None):
-        return len(bigip.tm.ltm.nodes.get_collection())
+        return len(bigip.tm.ltm.nodes.get_collection(
+            requests_params={'params': '$select=name'}))
 
     def get_clientssl_profile_count(self, bigip=None, global_statistics=None):
         return ssl_profile.SSLProfileHelper.get_client_ssl_profile_count(bigip)
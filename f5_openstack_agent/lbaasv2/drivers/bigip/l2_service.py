@@ -23,6 +23,7 @@ from oslo_utils import importutils
 from f5_openstack_agent.lbaasv2.drivers.bigip import exceptions as f5_ex
 from f5_openstack_agent.lbaasv2.drivers.bigip.fdb_connector_ml2 \
     import FDBConnectorML2
+from f5_openstack_agent.lbaasv2.drivers.bigip import metrics
 from f5_openstack_agent.lbaasv2.drivers.bigip.network_helper import \
     NetworkHelper
 from f5_openstack_agent.lbaasv2.drivers.bigip.service_adapter import \
@@ -209,9 +210,11 @@ class L2ServiceBuilder(object):
             raise f5_ex.InvalidNetworkType(error_message)
         bigip.assured_networks[network['id']] = network_name
 
-        if time() - start_time > .001:
+        elapsed = time() - start_time
+        metrics.SERVICE_STAGE_SECONDS.observe(elapsed, stage='bigip_network')
+        if elapsed > .001:
             LOG.debug("        assure bigip network took %.5f secs" %
-                      (time() - start_time))
+                      elapsed)
 
     def _assure_device_network_flat(self, network, bigip, network_folder):
         # Ensure bigip has configured flat vlan (untagged)
@@ -554,105 +557,26 @@ class L2ServiceBuilder(object):
             return
         self.vcmp_manager.disassoc_vlan_with_vcmp_guest(bigip, vlan_name)
 
-    def add_bigip_fdbs(self, bigip, net_folder, fdb_info, vteps_by_type):
-        # Add fdb records for a mac/ip with specified vteps
+    def merge_bigip_fdbs(self, fdbs, net_folder, fdb_info, vteps_by_type):
+        # Add fdb records for a mac/ip with specified vteps to fdbs, in
+        # the format of NetworkHelper.add_fdb_entries
         network = fdb_info['network']
         net_type = network['provider:network_type']
         vteps_key = net_type + '_vteps'
-        if vteps_key in vteps_by_type:
-            vteps = vteps_by_type[vteps_key]
-            if net_type == 'gre':
-                self.add_gre_fdbs(bigip, net_folder, fdb_info, vteps)
-            elif net_type == 'vxlan':
-                self.add_vxlan_fdbs(bigip, net_folder, fdb_info, vteps)
-
-    def add_gre_fdbs(self, bigip, net_folder, fdb_info, vteps):
-        # Add gre fdb records
-        network = fdb_info['network']
-        ip_address = fdb_info['ip_address']
-        mac_address = fdb_info['mac_address']
-        tunnel_name = _get_tunnel_name(network)
-        for vtep in vteps:
-            if mac_address:
-                mac_addr = mac_address
-            else:
-                mac_addr = _get_tunnel_fake_mac(network, vtep)
-            self.network_helper.add_fdb_entry(
-                bigip,
-                tunnel_name=tunnel_name,
-                partition=net_folder,
-                mac_address=mac_addr,
-                vtep_ip_address=vtep,
-                arp_ip_address=ip_address)
-
-    def add_vxlan_fdbs(self, bigip, net_folder, fdb_info, vteps):
-        # Add vxlan fdb records
-        network = fdb_info['network']
-        ip_address = fdb_info['ip_address']
-        mac_address = fdb_info['mac_address']
-        tunnel_name = _get_tunnel_name(network)
-        for vtep in vteps:
-            if mac_address:
-                mac_addr = mac_address
-            else:
-                mac_addr = _get_tunnel_fake_mac(network, vtep)
-
-            self.network_helper.add_fdb_entry(
-                bigip,
-                tunnel_name=tunnel_name,
-                partition=net_folder,
-                mac_address=mac_addr,
-                vtep_ip_address=vtep,
-                arp_ip_address=ip_address)
-
-    def delete_bigip_fdbs(self, bigip, net_folder, fdb_info, vteps_by_type):
-        # Delete fdb records for a mac/ip with specified vteps
-        network = fdb_info['network']
-        net_type = network['provider:network_type']
-        vteps_key = net_type + '_vteps'
-        if vteps_key in vteps_by_type:
-            vteps = vteps_by_type[vteps_key]
-            if net_type == 'gre':
-                self.delete_gre_fdbs(bigip, net_folder, fdb_info, vteps)
-            elif net_type == 'vxlan':
-                self.delete_vxlan_fdbs(bigip, net_folder, fdb_info, vteps)
-
-    def delete_gre_fdbs(self, bigip, net_folder, fdb_info, vteps):
-        # delete gre fdb records
-        network = fdb_info['network']
-        ip_address = fdb_info['ip_address']
-        mac_address = fdb_info['mac_address']
-        tunnel_name = _get_tunnel_name(network)
-        for vtep in vteps:
-            if mac_address:
-                mac_addr = mac_address
-            else:
-                mac_addr = _get_tunnel_fake_mac(network, vtep)
-
-            self.network_helper.delete_fdb_entry(
-                bigip,
-                tunnel_name=tunnel_name,
-                mac_address=mac_addr,
-                arp_ip_address=ip_address,
-                partition=net_folder)
-
-    def delete_vxlan_fdbs(self, bigip, net_folder, fdb_info, vteps):
-        # delete vxlan fdb records
-        network = fdb_info['network']
-        ip_address = fdb_info['ip_address']
-        mac_address = fdb_info['mac_address']
+        if net_type not in ['gre', 'vxlan'] or \
+                vteps_key not in vteps_by_type:
+            return
         tunnel_name = _get_tunnel_name(network)
-        for vtep in vteps:
-            if mac_address:
-                mac_addr = mac_address
+        if tunnel_name not in fdbs:
+            fdbs[tunnel_name] = {'folder': net_folder, 'records': {}}
+        records = fdbs[tunnel_name]['records']
+        for vtep in vteps_by_type[vteps_key]:
+            if fdb_info['mac_address']:
+                mac_addr = fdb_info['mac_address']
             else:
                 mac_addr = _get_tunnel_fake_mac(network, vtep)
-            self.network_helper.delete_fdb_entry(
-                bigip,
-                tunnel_name=tunnel_name,
-                mac_address=mac_addr,
-                arp_ip_address=ip_address,
-                partition=net_folder)
+            records[mac_addr] = {'endpoint': vtep,
+                                 'ip_address': fdb_info['ip_address']}
 
     def add_bigip_fdb(self, bigip, fdb):
         # Add entries from the fdb relevant to the bigip
@@ -703,7 +627,7 @@ class L2ServiceBuilder(object):
                             'net_fdb': net_fdb}
                 fdbs = self._get_bigip_network_fdbs(bigip, net_info)
                 if len(fdbs) > 0:
-                    fdb_method(fdb_entries=fdbs)
+                    fdb_method(bigip, fdb_entries=fdbs)
 
     def _get_bigip_network_fdbs(self, bigip, net_info):
         # Get network fdb entries to add to a bigip
@@ -14,15 +14,16 @@
 # limitations under the License.
 #
 
-from time import time
-
 from oslo_log import log as logging
 
 from neutron.plugins.common import constants as plugin_const
 
+from f5_openstack_agent.lbaasv2.drivers.bigip import config_snapshot
 from f5_openstack_agent.lbaasv2.drivers.bigip import exceptions as f5_ex
 from f5_openstack_agent.lbaasv2.drivers.bigip import listener_service
+from f5_openstack_agent.lbaasv2.drivers.bigip import metrics
 from f5_openstack_agent.lbaasv2.drivers.bigip import pool_service
+from f5_openstack_agent.lbaasv2.drivers.bigip import transaction
 from requests import HTTPError
 
 LOG = logging.getLogger(__name__)
@@ -40,34 +41,38 @@ class LBaaSBuilder(object):
         self.listener_builder = listener_service.ListenerServiceBuilder(
             self.service_adapter,
             driver.cert_manager,
-            conf.f5_parent_ssl_profile)
+            conf.f5_parent_ssl_profile,
+            driver.device_fanout)
         self.pool_builder = pool_service.PoolServiceBuilder(
-            self.service_adapter
+            self.service_adapter,
+            driver.device_fanout
         )
 
     def assure_service(self, service, traffic_group, all_subnet_hints):
         """Assure that a service is configured on the BIGIP."""
-        start_time = time()
         LOG.debug("Starting assure_service")
 
-        self._assure_loadbalancer_created(service, all_subnet_hints)
-
-        self._assure_listeners_created(service)
+        with metrics.stage('loadbalancer'):
+            self._assure_loadbalancer_created(service, all_subnet_hints)
 
-        self._assure_pools_created(service)
+        with metrics.stage('listeners'):
+            self._assure_listeners_created(service)
 
-        self._assure_monitors(service)
+        with metrics.stage('pools'):
+            self._assure_pools_created(service)
 
-        self._assure_members(service, all_subnet_hints)
+        with metrics.stage('members'):
+            self._assure_monitors_and_members(service, all_subnet_hints)
 
-        self._assure_pools_deleted(service)
+        with metrics.stage('pool_deletes'):
+            self._assure_pools_deleted(service)
 
-        self._assure_listeners_deleted(service)
+        with metrics.stage('listener_deletes'):
+            self._assure_listeners_deleted(service)
 
-        self._assure_loadbalancer_deleted(service)
+        with metrics.stage('loadbalancer_delete'):
+            self._assure_loadbalancer_deleted(service)
 
-        LOG.debug("    _assure_service took %.5f secs" %
-                  (time() - start_time))
         return all_subnet_hints
 
     def _assure_loadbalancer_created(self, service, all_subnet_hints):
@@ -180,6 +185,51 @@ class LBaaSBuilder(object):
                 listener['provisioning_status'] = plugin_const.ERROR
                 raise f5_ex.VirtualServerUpdateException(err.message)
 
+    def _assure_monitors_and_members(self, service, all_subnet_hints):
+        if not self.conf.f5_use_transactions:
+            self._assure_monitors(service)
+            self._assure_members(service, all_subnet_hints)
+            return
+
+        # Monitors and members only write objects which already exist or
+        # which nothing reads back during the pass, so their changes can
+        # be committed at once.
+        bigips = self.driver.get_config_bigips()
+        changes = transaction.BigipTransaction(bigips)
+        try:
+            with changes:
+                self._assure_monitors(service)
+                self._assure_members(service, all_subnet_hints)
+        except Exception:
+            # The changes are missing from the bigip whose commit failed
+            # and from those after it, but bigips before it committed
+            # them. Provision the loadbalancer again on the next resync,
+            # so that the bigips agree again.
+            if changes.committed:
+                LOG.error("Changes of loadbalancer %s committed on %s "
+                          "only, resyncing it" %
+                          (service['loadbalancer']['id'],
+                           ', '.join(changes.committed)))
+                self.driver.resync_loadbalancer_ids.add(
+                    service['loadbalancer']['id'])
+            for key in ("healthmonitors", "members"):
+                for obj in service.get(key, []):
+                    if obj.get('provisioning_status') in (
+                            plugin_const.PENDING_CREATE,
+                            plugin_const.PENDING_UPDATE,
+                            plugin_const.PENDING_DELETE):
+                        obj['provisioning_status'] = plugin_const.ERROR
+            raise
+        finally:
+            # Objects written in a transaction only point at the queued
+            # command, fetch them again if needed.
+            partition = self.service_adapter.get_folder_name(
+                service['loadbalancer']['tenant_id'])
+            for bigip in bigips:
+                snapshot = config_snapshot.get_snapshot(bigip, partition)
+                if snapshot:
+                    snapshot.clear()
+
     def _assure_monitors(self, service):
         if not (("pools" in service) and ("healthmonitors" in service)):
             return
@@ -213,6 +263,8 @@ class LBaaSBuilder(object):
         loadbalancer = service["loadbalancer"]
         bigips = self.driver.get_config_bigips()
 
+        self._assure_members_bulk(service, bigips)
+
         for member in members:
             svc = {"loadbalancer": loadbalancer,
                    "member": member,
@@ -236,6 +288,29 @@ class LBaaSBuilder(object):
                                       all_subnet_hints,
                                       True)
 
+    def _assure_members_bulk(self, service, bigips):
+        # Create the members of each pool in one request where possible.
+        # Whatever is left, or fails, is done member by member.
+        pool_members = {}
+        for member in service["members"]:
+            if member['provisioning_status'] != plugin_const.PENDING_DELETE:
+                pool_members.setdefault(member["pool_id"], []).append(member)
+
+        for pool_id, members in pool_members.items():
+            pool = self.get_pool_by_id(service, pool_id)
+            if pool is None or \
+                    pool['provisioning_status'] == plugin_const.PENDING_DELETE:
+                continue
+            svc = {"loadbalancer": service["loadbalancer"],
+                   "pool": pool,
+                   "members": members}
+            try:
+                self.pool_builder.create_members(svc, bigips)
+            except Exception as err:
+                LOG.warning("Bulk create of pool %s members failed, "
+                            "creating them one by one: %s" %
+                            (pool_id, err.message))
+
     def _assure_loadbalancer_deleted(self, service):
         if (service['loadbalancer']['provisioning_status'] !=
                 plugin_const.PENDING_DELETE):
@@ -13,6 +13,9 @@
 # limitations under the License.
 #
 
+from f5_openstack_agent.lbaasv2.drivers.bigip.service_queue import \
+    ServiceQueue
+
 
 class LBaaSBaseDriver(object):
     """Abstract base LBaaS Driver class for interfacing with Agent Manager """
@@ -25,8 +28,9 @@ class LBaaSBaseDriver(object):
         self.agent_id = None
         self.plugin_rpc = None  # XXX overridden in the only known subclass
         self.connected = False  # XXX overridden in the only known subclass
-        self.service_queue = []
+        self.service_queue = ServiceQueue()
         self.agent_configurations = {}  # XXX overridden in subclass
+        self.state_store = None
 
     def set_context(self, context):
         """Set the global context object for the lbaas driver """
@@ -68,6 +72,14 @@ class LBaaSBaseDriver(object):
         """Force Sync a Service on Driver Target """
         raise NotImplementedError()
 
+    def get_service_paths(self, service):
+        """Return the Paths of the Objects which make up a Service """
+        raise NotImplementedError()
+
+    def get_deployed_paths(self):
+        """Return the Paths of the Objects on each Driver Target or None """
+        raise NotImplementedError()
+
     def remove_orphans(self, known_services):
         """Remove Unknown Service from Driver Target """
         raise NotImplementedError()
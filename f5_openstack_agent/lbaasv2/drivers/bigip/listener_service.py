@@ -14,8 +14,12 @@
 # limitations under the License.
 #
 
+import copy
+
 from oslo_log import log as logging
 
+from f5_openstack_agent.lbaasv2.drivers.bigip.device_fanout import \
+    DeviceFanout
 from f5_openstack_agent.lbaasv2.drivers.bigip.disconnected_service import \
     DisconnectedService
 from f5_openstack_agent.lbaasv2.drivers.bigip import resource_helper
@@ -33,8 +37,10 @@ class ListenerServiceBuilder(object):
     defined in service object to a BIG-IP® virtual server.
     """
 
-    def __init__(self, service_adapter, cert_manager, parent_ssl_profile=None):
+    def __init__(self, service_adapter, cert_manager, parent_ssl_profile=None,
+                 device_fanout=None):
         self.cert_manager = cert_manager
+        self.device_fanout = device_fanout or DeviceFanout()
         self.disconnected_service = DisconnectedService()
         self.parent_ssl_profile = parent_ssl_profile
         self.vs_helper = resource_helper.BigIPResourceHelper(
@@ -76,27 +82,33 @@ class ListenerServiceBuilder(object):
             service['listener']['operating_status'] = lb_const.OFFLINE
 
         network_id = service['loadbalancer']['network_id']
-        for bigip in bigips:
-            self.service_adapter.get_vlan(vip, bigip, network_id)
-            self.vs_helper.create(bigip, vip)
-
-            if tls:
-                self.add_ssl_profile(tls, bigip)
-
         # Traffic group is added after create in order to take adavantage
         # of BIG-IP® defaults.
         traffic_group = self.service_adapter.get_traffic_group(service)
-        if traffic_group:
-            ip_address = service['loadbalancer']['vip_address']
-            if str(ip_address).endswith('%0'):
-                ip_address = ip_address[:-2]
+        ip_address = service['loadbalancer']['vip_address']
+        if str(ip_address).endswith('%0'):
+            ip_address = ip_address[:-2]
+
+        self.device_fanout.run(bigips, self._create_bigip_listener,
+                               vip, tls, network_id, traffic_group,
+                               ip_address)
+
+    def _create_bigip_listener(self, bigip, vip, tls, network_id,
+                               traffic_group, ip_address):
+        # get_vlan() adds the device's VLAN to the virtual, so every
+        # device gets its own copy.
+        vip = copy.deepcopy(vip)
+        self.service_adapter.get_vlan(vip, bigip, network_id)
+        self.vs_helper.create(bigip, vip)
 
-            for bigip in bigips:
-                virtual_address = \
-                    bigip.tm.ltm.virtual_address_s.virtual_address
-                obj = virtual_address.load(name=ip_address,
-                                           partition=vip['partition'])
-                obj.modify(trafficGroup=traffic_group)
+        if tls:
+            self.add_ssl_profile(tls, bigip)
+
+        if traffic_group:
+            virtual_address = bigip.tm.ltm.virtual_address_s.virtual_address
+            obj = virtual_address.load(name=ip_address,
+                                       partition=vip['partition'])
+            obj.modify(trafficGroup=traffic_group)
 
     def get_listener(self, service, bigip):
         """Retrieve BIG-IP® virtual from a single BIG-IP® system.
@@ -200,10 +212,9 @@ class ListenerServiceBuilder(object):
         vip = self.service_adapter.get_virtual_name(service)
         vip["pool"] = name
         for bigip in bigips:
-            v = bigip.tm.ltm.virtuals.virtual
-            if v.exists(name=vip["name"], partition=vip["partition"]):
-                obj = v.load(name=vip["name"], partition=vip["partition"])
-                obj.modify(**vip)
+            if self.vs_helper.exists(bigip, name=vip["name"],
+                                     partition=vip["partition"]):
+                self.vs_helper.update(bigip, vip)
 
     def update_session_persistence(self, service, bigips):
         """Update session persistence for virtual server.
@@ -243,8 +254,8 @@ class ListenerServiceBuilder(object):
         :param profile_name: Name of profile to add.
         :param bigip: Single BigIP instances to update.
         """
-        v = bigip.tm.ltm.virtuals.virtual
-        obj = v.load(name=vip["name"], partition=vip["partition"])
+        obj = self.vs_helper.load(bigip, name=vip["name"],
+                                  partition=vip["partition"])
         p = obj.profiles_s
         profiles = p.get_collection()
 
@@ -381,8 +392,8 @@ class ListenerServiceBuilder(object):
         :param bigip: Single BigIP instances to update.
         """
         try:
-            v = bigip.tm.ltm.virtuals.virtual
-            obj = v.load(name=vip["name"], partition=vip["partition"])
+            obj = self.vs_helper.load(bigip, name=vip["name"],
+                                      partition=vip["partition"])
             p = obj.profiles_s
             profiles = p.get_collection()
 
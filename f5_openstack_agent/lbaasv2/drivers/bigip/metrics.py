@@ -0,0 +1,320 @@
+# coding=utf-8
+"""Counters, gauges and latency histograms of the agent."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import bisect
+import contextlib
+import numbers
+import re
+import socket
+import time
+import urlparse
+
+import eventlet
+from eventlet import wsgi
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Prefix of the names of all metrics.
+PREFIX = 'f5_agent_'
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+
+# Observations held for the statsd sink between two flushes.
+MAX_PENDING_OBSERVATIONS = 1000
+
+# Path segments of a REST URI counted as its resource type.
+MAX_RESOURCE_SEGMENTS = 4
+
+STATSD_INVALID = re.compile(r'[^A-Za-z0-9_-]')
+
+
+class _Metric(object):
+    def __init__(self, name, help, labelnames=()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        super(Counter, self).__init__(name, help, labelnames)
+        # label values -> count
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS,
+                 registry=None):
+        super(Histogram, self).__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self.registry = registry
+        # label values -> [observations per bucket, sum, count], where
+        # the last bucket holds those above all bounds
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            self.series[key] = series
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+        if self.registry:
+            for observer in self.registry.observers:
+                observer(self, key, value)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the seconds taken by the body of a with statement."""
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start_time, **labels)
+
+
+class Registry(object):
+    """Metrics of the agent, rendered in the Prometheus text format.
+
+    Updating a metric is a dict update, so metrics can be kept on the
+    paths of every request. Gauges are read from the get_stats methods
+    of the agent's queues when the metrics are rendered.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        # callables returning {name: value} of gauges
+        self.gauge_sources = []
+        # callables given (histogram, label values, value) of each
+        # observation
+        self.observers = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets, registry=self)
+        self.metrics.append(metric)
+        return metric
+
+    def add_gauges(self, get_stats):
+        """Report the numbers returned by get_stats() as gauges."""
+        self.gauge_sources.append(get_stats)
+
+    def get_gauges(self):
+        gauges = {}
+        for get_stats in self.gauge_sources:
+            try:
+                stats = get_stats()
+            except Exception as exc:
+                LOG.error("Failed to read gauges: %s" % exc)
+                continue
+            for name, value in stats.items():
+                if isinstance(value, numbers.Number) and \
+                        not isinstance(value, bool):
+                    gauges[PREFIX + name] = value
+        return gauges
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+            if metric.kind == 'counter':
+                for key, value in sorted(metric.values.items()):
+                    lines.append('%s%s %s' % (
+                        metric.name, _labels(metric.labelnames, key), value))
+                continue
+            for key, (buckets, total, count) in sorted(
+                    metric.series.items()):
+                cumulative = 0
+                for bound, observations in zip(
+                        metric.buckets + ('+Inf',), buckets):
+                    cumulative += observations
+                    lines.append('%s_bucket%s %d' % (
+                        metric.name, _labels(metric.labelnames + ('le',),
+                                             key + (str(bound),)),
+                        cumulative))
+                labels = _labels(metric.labelnames, key)
+                lines.append('%s_sum%s %s' % (metric.name, labels, total))
+                lines.append('%s_count%s %d' % (metric.name, labels, count))
+        for name, value in sorted(self.get_gauges().items()):
+            lines.append('# TYPE %s gauge' % name)
+            lines.append('%s %s' % (name, value))
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, value.replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in zip(names, values))
+
+
+REGISTRY = Registry()
+
+SERVICE_STAGE_SECONDS = REGISTRY.histogram(
+    'service_stage_seconds', 'Seconds taken by the stages of service passes',
+    ('stage',))
+REQUEST_SECONDS = REGISTRY.histogram(
+    'request_seconds', 'Seconds taken by serialized agent requests',
+    ('method',))
+RPC_SECONDS = REGISTRY.histogram(
+    'rpc_seconds', 'Seconds taken by RPC messages to the plugin',
+    ('method',))
+REST_REQUESTS = REGISTRY.counter(
+    'rest_requests_total', 'iControl REST requests sent',
+    ('device', 'resource', 'method'))
+REST_REQUEST_SECONDS = REGISTRY.histogram(
+    'rest_request_seconds', 'Seconds taken by iControl REST requests',
+    ('resource', 'method'))
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time a stage of a service pass."""
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        elapsed = time.time() - start_time
+        SERVICE_STAGE_SECONDS.observe(elapsed, stage=name)
+        if elapsed > .001:
+            LOG.debug("    %s took %.5f secs" % (name, elapsed))
+
+
+def resource_type(url):
+    """Return the resource type of a REST URI, without object names.
+
+    Example:
+        https://host/mgmt/tm/ltm/pool/~Project_1~pool1/members/~Common~m1
+        ==> tm/ltm/pool/members
+    """
+    segments = []
+    for segment in urlparse.urlsplit(url).path.split('/')[2:]:
+        if not segment or segment.startswith('~') or segment.isdigit():
+            continue
+        segments.append(segment)
+        if len(segments) == MAX_RESOURCE_SEGMENTS:
+            break
+    return '/'.join(segments)
+
+
+def serve(host, port, registry=REGISTRY):
+    """Serve the metrics over HTTP from a greenthread of their own."""
+    def application(environ, start_response):
+        body = registry.render()
+        start_response('200 OK', [
+            ('Content-Type', 'text/plain; version=0.0.4'),
+            ('Content-Length', str(len(body)))])
+        return [body]
+
+    sock = eventlet.listen((host, port))
+    LOG.info("Serving metrics on %s:%d" % (host, port))
+    return eventlet.spawn(wsgi.server, sock, application, log_output=False)
+
+
+class StatsdSink(object):
+    """Send the metrics to statsd over UDP every interval seconds.
+
+    Counters are sent as the increase since the last flush, gauges as
+    their current value and histogram observations as timers.
+    """
+
+    def __init__(self, address, interval=10, registry=REGISTRY):
+        host, port = address.rsplit(':', 1)
+        self.address = (host, int(port))
+        self.interval = interval
+        self.registry = registry
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # (counter name, label values) -> value last sent
+        self._sent = {}
+        self._observations = []
+        self._sender = None
+
+    def start(self):
+        self.registry.observers.append(self._observe)
+        self._sender = eventlet.spawn(self._run)
+
+    def flush(self):
+        lines = self._observations
+        self._observations = []
+        for metric in self.registry.metrics:
+            if metric.kind != 'counter':
+                continue
+            for key, value in metric.values.items():
+                delta = value - self._sent.get((metric.name, key), 0)
+                if delta:
+                    lines.append('%s:%d|c' % (_statsd_name(metric.name, key),
+                                              delta))
+                    self._sent[(metric.name, key)] = value
+        for name, value in self.registry.get_gauges().items():
+            lines.append('%s:%s|g' % (_statsd_name(name, ()), value))
+        # Keep datagrams small enough not to be fragmented.
+        batch, size = [], 0
+        for line in lines:
+            if batch and size + len(line) > 1400:
+                self._send(batch)
+                batch, size = [], 0
+            batch.append(line)
+            size += len(line) + 1
+        if batch:
+            self._send(batch)
+
+    def _send(self, lines):
+        try:
+            self._socket.sendto('\n'.join(lines), self.address)
+        except socket.error as err:
+            LOG.debug("Failed to send metrics to statsd: %s" % err)
+
+    def _observe(self, histogram, key, value):
+        if len(self._observations) < MAX_PENDING_OBSERVATIONS:
+            self._observations.append('%s:%.3f|ms' % (
+                _statsd_name(histogram.name, key), value * 1000))
+
+    def _run(self):
+        while True:
+            eventlet.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as exc:
+                LOG.error("Failed to flush metrics to statsd: %s" % exc)
+
+
+def _statsd_name(name, key):
+    return '.'.join([name] + [STATSD_INVALID.sub('_', value)
+                              for value in key])
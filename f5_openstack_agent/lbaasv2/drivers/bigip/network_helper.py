@@ -19,7 +19,10 @@ import netaddr
 import os
 import urllib
 
+from f5_openstack_agent.lbaasv2.drivers.bigip import fdb_index
 from f5_openstack_agent.lbaasv2.drivers.bigip.utils import get_filter
+from f5_openstack_agent.lbaasv2.drivers.bigip.utils import \
+    strip_domain_address
 from oslo_log import helpers as log_helpers
 from oslo_log import log as logging
 from requests.exceptions import HTTPError
@@ -381,19 +384,6 @@ class NetworkHelper(object):
         rd.modify(vlans=existing_vlans)
         return True
 
-    @log_helpers.log_method_call
-    def get_vlans_in_route_domain_by_id(self, bigip,
-                                        partition=const.DEFAULT_PARTITION,
-                                        id=const.DEFAULT_ROUTE_DOMAIN_ID):
-        rd = self.get_route_domain_by_id(bigip, partition, id)
-        vlans = []
-        if not rd:
-            return vlans
-        if getattr(rd, 'vlans', None):
-            for vlan in rd.vlans:
-                vlans.append(vlan)
-        return vlans
-
     @log_helpers.log_method_call
     def arp_delete_by_mac(self,
                           bigip,
@@ -428,6 +418,62 @@ class NetworkHelper(object):
 
         return False
 
+    @log_helpers.log_method_call
+    def update_arps(self, bigip, add=None, remove=None,
+                    partition=const.DEFAULT_PARTITION):
+        """Create and delete static ARP entries of a partition at once.
+
+        The ARP entries of the partition are read with a single request,
+        so that only the entries which are missing, differ or have to go
+        are written.
+
+        :param add: dict of MAC address by IP address of entries to create.
+        :param remove: IP addresses of entries to delete.
+        """
+        add = add or {}
+        remove = set(remove or []) - set(add)
+        if not add and not remove:
+            return
+
+        params = {'params': get_filter(bigip, 'partition', 'eq', partition)}
+        try:
+            arps = bigip.tm.net.arps.get_collection(requests_params=params)
+        except HTTPError as err:
+            LOG.error("Error getting ARPs."
+                      "Repsponse status code: %s. Response "
+                      "message: %s." % (err.response.status_code,
+                                        err.message))
+            return
+        existing = dict((strip_domain_address(arp.ipAddress), arp)
+                        for arp in arps)
+
+        for ip_address in remove | set(add):
+            address = strip_domain_address(ip_address)
+            arp = existing.get(address)
+            if arp is None or add.get(ip_address) == arp.macAddress:
+                continue
+            try:
+                arp.delete()
+            except HTTPError as err:
+                LOG.error("Error deleting ARP %s."
+                          "Repsponse status code: %s. Response "
+                          "message: %s." % (arp.ipAddress,
+                                            err.response.status_code,
+                                            err.message))
+
+        for ip_address, mac_address in add.items():
+            arp = existing.get(strip_domain_address(ip_address))
+            if arp is not None and arp.macAddress == mac_address:
+                continue
+            try:
+                LOG.debug("Creating ARP with IP address %s and"
+                          "MAC addess %s" % (ip_address, mac_address))
+                bigip.tm.net.arps.arp.create(ip_address=ip_address,
+                                             mac_address=mac_address,
+                                             partition=partition)
+            except Exception as e:
+                LOG.error('could not create static arp: %s' % e.message)
+
     @log_helpers.log_method_call
     def arp_delete_by_subnet(self, bigip, subnet=None, mask=None,
                              partition=const.DEFAULT_PARTITION):
@@ -541,6 +587,55 @@ class NetworkHelper(object):
 
         return node_addrs
 
+    def _get_tunnel_records(self, bigip, tunnel_name, partition):
+        # Return the indexed records of a tunnel, reading them from the
+        # device the first time. None if the tunnel does not exist.
+        records = fdb_index.get(bigip, tunnel_name, partition)
+        if records is not None:
+            return records
+        with fdb_index.loading(bigip, tunnel_name, partition):
+            # Another greenthread may have read the tunnel meanwhile.
+            records = fdb_index.get(bigip, tunnel_name, partition)
+            if records is None:
+                tunnel = bigip.tm.net.fdb.tunnels.tunnel
+                if not tunnel.exists(name=tunnel_name, partition=partition):
+                    LOG.debug("Tunnel %s does not exist." % tunnel_name)
+                    return None
+                obj = tunnel.load(name=tunnel_name, partition=partition)
+                records = fdb_index.put(bigip, tunnel_name, partition, obj)
+        return records
+
+    def _get_tunnel_records_safe(self, bigip, tunnel_name, partition):
+        try:
+            return self._get_tunnel_records(bigip, tunnel_name, partition)
+        except HTTPError as err:
+            LOG.error("Error checking tunnel %s. "
+                      "Repsponse status code: %s. Response "
+                      "message: %s." % (tunnel_name,
+                                        err.response.status_code,
+                                        err.message))
+        return None
+
+    def _write_tunnel_records(self, bigip, tunnel_name, partition, records):
+        # Send the indexed records to the device. The SDK has no way to
+        # add or remove single records, so the full list is sent.
+        # On any error the index no longer matches the device, so it is
+        # read again next time.
+        try:
+            records.tunnel.modify(records=records.to_list())
+            return True
+        except HTTPError as err:
+            fdb_index.forget(bigip, tunnel_name, partition)
+            LOG.error("Error updating tunnel %s. "
+                      "Repsponse status code: %s. Response "
+                      "message: %s." % (tunnel_name,
+                                        err.response.status_code,
+                                        err.message))
+        except Exception:
+            fdb_index.forget(bigip, tunnel_name, partition)
+            raise
+        return False
+
     @log_helpers.log_method_call
     def add_fdb_entry(
             self,
@@ -551,52 +646,34 @@ class NetworkHelper(object):
             arp_ip_address=None,
             partition=const.DEFAULT_PARTITION):
 
-        records = self.get_fdb_entry(bigip,
-                                     tunnel_name=tunnel_name,
-                                     mac=None,
-                                     partition=partition)
-        fdb_entry = dict()
-        fdb_entry['name'] = mac_address
-        fdb_entry['endpoint'] = vtep_ip_address
-
-        for i in range(len(records)):
-            if records[i]['name'] == mac_address:
-                records[i] = fdb_entry
-                break
-        else:
-            records.append(fdb_entry)
+        records = self._get_tunnel_records_safe(
+            bigip, tunnel_name, partition)
+        if records is None:
+            return False
 
-        try:
-            tunnel = bigip.tm.net.fdb.tunnels.tunnel
-            if tunnel.exists(name=tunnel_name, partition=partition):
-                obj = tunnel.load(name=tunnel_name, partition=partition)
-                obj.modify(records=records)
-                if const.FDB_POPULATE_STATIC_ARP:
-                    # arp_ip_address is typcially member address.
-                    if arp_ip_address:
-                        try:
-                            LOG.debug("Creating ARP with IP address %s and"
-                                      "MAC addess %s" % (arp_ip_address,
-                                                         mac_address))
-                            arp = bigip.tm.net.arps.arp
-                            arp.create(ip_address=arp_ip_address,
-                                       mac_address=mac_address,
-                                       partition=partition)
-                        except Exception as e:
-                            LOG.error('add_fdb_entry',
-                                      'could not create static arp: %s'
-                                      % e.message)
-                            return False
-                return True
-            else:
-                LOG.debug("Tunnel %s does not exist." % tunnel_name)
-        except HTTPError as err:
-            LOG.error("Error checking tunnel %s. "
-                      "Repsponse status code: %s. Response "
-                      "message: %s." % (tunnel_name,
-                                        err.response.status_code,
-                                        err.message))
-        return False
+        with records.lock:
+            if records.add(mac_address, vtep_ip_address):
+                if not self._write_tunnel_records(
+                        bigip, tunnel_name, partition, records):
+                    return False
+
+        if const.FDB_POPULATE_STATIC_ARP:
+            # arp_ip_address is typcially member address.
+            if arp_ip_address:
+                try:
+                    LOG.debug("Creating ARP with IP address %s and"
+                              "MAC addess %s" % (arp_ip_address,
+                                                 mac_address))
+                    arp = bigip.tm.net.arps.arp
+                    arp.create(ip_address=arp_ip_address,
+                               mac_address=mac_address,
+                               partition=partition)
+                except Exception as e:
+                    LOG.error('add_fdb_entry',
+                              'could not create static arp: %s'
+                              % e.message)
+                    return False
+        return True
 
     @log_helpers.log_method_call
     def delete_fdb_entry(
@@ -613,105 +690,97 @@ class NetworkHelper(object):
                                 ip_address=arp_ip_address,
                                 partition=partition)
 
-        records = self.get_fdb_entry(
-            bigip, tunnel_name, mac=None, partition=partition)
-        if not records:
+        records = self._get_tunnel_records_safe(
+            bigip, tunnel_name, partition)
+        if records is None:
             return False
 
-        original_len = len(records)
-        records = [record for record in records
-                   if record.get('name') != mac_address]
-        if original_len != len(records):
-            if len(records) == 0:
-                records = None
-
-        try:
-            tunnel = bigip.tm.net.fdb.tunnels.tunnel
-            if tunnel.exists(name=tunnel_name, partition=partition):
-                obj = tunnel.load(name=tunnel_name, partition=partition)
-                obj.modify(records=records)
-        except HTTPError as err:
-            LOG.error("Error updating tunnel %s. "
-                      "Repsponse status code: %s. Response "
-                      "message: %s." % (tunnel_name,
-                                        err.response.status_code,
-                                        err.message))
+        with records.lock:
+            if not records.remove(mac_address):
+                return False
+            return self._write_tunnel_records(
+                bigip, tunnel_name, partition, records)
 
     @log_helpers.log_method_call
     def add_fdb_entries(self, bigip, fdb_entries=None):
-        # Add vxlan fdb entries
+        """Add the fdb records of several tunnels.
+
+        :param fdb_entries: dict by tunnel name of
+        {'folder': <partition>,
+         'records': {<mac>: {'endpoint': <vtep>, 'ip_address': <ip>}}}.
+        Each tunnel is written at most once. When static ARP population
+        is enabled, ARP entries are created for the records which have an
+        ip_address, in one pass per partition.
+        """
+        changed = False
+        # partition -> {ip address: mac address}
+        arps_to_create = {}
         for tunnel_name in fdb_entries:
             folder = fdb_entries[tunnel_name]['folder']
-            existing_records = self.get_fdb_entry(bigip,
-                                                  tunnel_name=tunnel_name,
-                                                  mac=None,
-                                                  partition=folder)
-            new_records = []
-            new_mac_addresses = []
-            new_arp_addresses = {}
+            records = self._get_tunnel_records_safe(
+                bigip, tunnel_name, folder)
+            if records is None:
+                continue
 
             tunnel_records = fdb_entries[tunnel_name]['records']
+            with records.lock:
+                updated = False
+                for mac in tunnel_records:
+                    if records.add(mac, tunnel_records[mac]['endpoint']):
+                        updated = True
+                # IMPORTANT: v1 code specifies version 11.5.0. f5-sdk
+                # should default to 11.6.0, so we expect it to work in 12
+                # and greater.
+                if updated:
+                    if not self._write_tunnel_records(
+                            bigip, tunnel_name, folder, records):
+                        continue
+                    changed = True
             for mac in tunnel_records:
-                fdb_entry = dict()
-                fdb_entry['name'] = mac
-                fdb_entry['endpoint'] = tunnel_records[mac]['endpoint']
-                new_records.append(fdb_entry)
-                new_mac_addresses.append(mac)
-                if tunnel_records[mac]['ip_address']:
-                    new_arp_addresses[mac] = tunnel_records[mac]['ip_address']
-
-            for record in existing_records:
-                if not record['name'] in new_mac_addresses:
-                    new_records.append(record)
-                else:
-                    # This fdb entry exists and is not being updated.
-                    # So, do not update the ARP record either.
-                    if record['name'] in new_arp_addresses:
-                        del new_arp_addresses[record['name']]
+                if tunnel_records[mac].get('ip_address'):
+                    arps_to_create.setdefault(folder, {})[
+                        tunnel_records[mac]['ip_address']] = mac
 
-            tunnel = bigip.tm.net.fdb.tunnels.tunnel
-            # IMPORTANT: v1 code specifies version 11.5.0. f5-sdk should
-            # default to 11.6.0, so we expect it to work in 12 and greater.
-            if tunnel.exists(name=tunnel_name, partition=folder):
-                obj = tunnel.load(name=tunnel_name, partition=folder)
-                obj.modify(records=new_records)
+        if const.FDB_POPULATE_STATIC_ARP:
+            for folder in arps_to_create:
+                self.update_arps(bigip, add=arps_to_create[folder],
+                                 partition=folder)
+        return changed
 
     @log_helpers.log_method_call
     def delete_fdb_entries(self, bigip, tunnel_name=None, fdb_entries=None):
+        """Delete the fdb records of several tunnels.
+
+        Takes fdb_entries in the format of add_fdb_entries.
+        """
+        changed = False
+        # partition -> ip addresses
+        arps_to_delete = {}
         for tunnel_name in fdb_entries:
             folder = fdb_entries[tunnel_name]['folder']
-            existing_records = self.get_fdb_entry(bigip,
-                                                  tunnel_name=tunnel_name,
-                                                  mac=None,
-                                                  partition=folder)
-            arps_to_delete = {}
-            new_records = []
-
-            for record in existing_records:
-                for mac in fdb_entries[tunnel_name]['records']:
-                    if record['name'] == mac and mac['ip_address']:
-                        arps_to_delete[mac] = mac['ip_address']
-                        break
-                else:
-                    new_records.append(record)
-
-            if len(new_records) == 0:
-                new_records = None
+            tunnel_records = fdb_entries[tunnel_name]['records']
+            for mac in tunnel_records:
+                if tunnel_records[mac].get('ip_address'):
+                    arps_to_delete.setdefault(folder, set()).add(
+                        tunnel_records[mac]['ip_address'])
+
+            records = self._get_tunnel_records_safe(
+                bigip, tunnel_name, folder)
+            if records is None:
+                continue
+
+            with records.lock:
+                removed = [mac for mac in tunnel_records
+                           if records.remove(mac)]
+                if removed and self._write_tunnel_records(
+                        bigip, tunnel_name, folder, records):
+                    changed = True
 
-            tunnel = bigip.tm.net.fdb.tunnels.tunnel
-            # IMPORTANT: v1 code specifies version 11.5.0. f5-sdk should
-            # default to 11.6.0, so we expect it to work in 12 and greater.
-            if tunnel.exists(name=tunnel_name, partition=folder):
-                obj = tunnel.load(name=tunnel_name, partition=folder)
-                obj.modify(records=new_records)
-
-            if const.FDB_POPULATE_STATIC_ARP:
-                for mac in arps_to_delete:
-                    self.arp_delete(bigip,
-                                    ip_address=arps_to_delete[mac],
-                                    partition='Common')
-            return True
-        return False
+        if const.FDB_POPULATE_STATIC_ARP:
+            for folder in arps_to_delete:
+                self.update_arps(bigip, remove=arps_to_delete[folder],
+                                 partition=folder)
+        return changed
 
     @log_helpers.log_method_call
     def get_fdb_entry(self,
@@ -748,6 +817,7 @@ class NetworkHelper(object):
             tunnel_name,
             partition=const.DEFAULT_PARTITION):
         """Delete all fdb entries."""
+        fdb_index.forget(bigip, tunnel_name, partition)
         try:
             t = bigip.tm.net.fdb.tunnels.tunnel
             obj = t.load(name=tunnel_name, partition=partition)
@@ -766,6 +836,7 @@ class NetworkHelper(object):
             tunnel_name,
             partition=const.DEFAULT_PARTITION):
         """Delete a vxlan or gre tunnel."""
+        fdb_index.forget(bigip, tunnel_name, partition)
         t = bigip.tm.net.fdb.tunnels.tunnel
         try:
             if t.exists(name=tunnel_name, partition=partition):
@@ -826,13 +897,16 @@ class NetworkHelper(object):
     def get_tunnel_count(self, bigip, partition='/'):
         """Return sum of VXLAN and GRE tunnels"""
         all_tunnels = bigip.tm.net.tunnels.tunnels.get_collection(
-            partition=partition)
+            partition=partition,
+            requests_params={'params': '$select=name,profile'})
 
         tunnels = [item for item in all_tunnels if
-                   item.profile.find('vxlan') > 0 or
-                   item.profile.find('gre') > 0]
+                   item.get('profile', '').find('vxlan') > 0 or
+                   item.get('profile', '').find('gre') > 0]
         return len(tunnels)
 
     def get_vlan_count(self, bigip, partition='/'):
         """Return number of VLANs"""
-        return len(bigip.tm.net.vlans.get_collection(partition=partition))
+        return len(bigip.tm.net.vlans.get_collection(
+            partition=partition,
+            requests_params={'params': '$select=name'}))
@@ -13,7 +13,6 @@
 # limitations under the License.
 #
 
-import itertools
 import netaddr
 
 from neutron.common.exceptions import NeutronException
@@ -21,13 +20,18 @@ from neutron.plugins.common import constants as plugin_const
 from oslo_log import log as logging
 
 from f5_openstack_agent.lbaasv2.drivers.bigip import exceptions as f5_ex
+from f5_openstack_agent.lbaasv2.drivers.bigip.address_index import \
+    AddressIndex
 from f5_openstack_agent.lbaasv2.drivers.bigip.l2_service import \
     L2ServiceBuilder
 from f5_openstack_agent.lbaasv2.drivers.bigip.network_helper import \
     NetworkHelper
+from f5_openstack_agent.lbaasv2.drivers.bigip.rds_cache import load_cache
+from f5_openstack_agent.lbaasv2.drivers.bigip.rds_cache import \
+    RouteDomainSubnetCache
+from f5_openstack_agent.lbaasv2.drivers.bigip.rds_cache import save_cache
 from f5_openstack_agent.lbaasv2.drivers.bigip.selfips import BigipSelfIpManager
 from f5_openstack_agent.lbaasv2.drivers.bigip.snats import BigipSnatManager
-from f5_openstack_agent.lbaasv2.drivers.bigip.utils import strip_domain_address
 
 LOG = logging.getLogger(__name__)
 
@@ -46,7 +50,11 @@ class NetworkServiceBuilder(object):
         self.bigip_snat_manager = BigipSnatManager(
             self.driver, self.l2_service, self.driver.l3_binding)
 
-        self.rds_cache = {}
+        self.rds_cache = RouteDomainSubnetCache()
+        self.rds_cache_loaded = False
+        # (bigip hostname, folder) -> AddressIndex of the current
+        # post_service_networking pass
+        self.address_indexes = {}
         self.interface_mapping = self.l2_service.interface_mapping
         self.network_helper = NetworkHelper()
         self.service_adapter = self.driver.service_adapter
@@ -132,20 +140,9 @@ class NetworkServiceBuilder(object):
 
         # Per Device Network Connectivity (VLANs or Tunnels)
         subnetsinfo = self._get_subnets_to_assure(service)
-        for (assure_bigip, subnetinfo) in (
-                itertools.product(self.driver.get_all_bigips(), subnetsinfo)):
-            LOG.debug("Assuring per device network connectivity "
-                      "for %s on subnet %s." % (assure_bigip.hostname,
-                                                subnetinfo['subnet']))
-
-            # Make sure the L2 network is established
-            self.l2_service.assure_bigip_network(
-                assure_bigip, subnetinfo['network'])
-
-            # Connect the BigIP device to network, by getting
-            # a self-ip address on the subnet.
-            self.bigip_selfip_manager.assure_bigip_selfip(
-                assure_bigip, service, subnetinfo)
+        self.driver.device_fanout.run(self.driver.get_all_bigips(),
+                                      self._assure_bigip_networks,
+                                      service, subnetsinfo)
 
         # L3 Shared Config
         assure_bigips = self.driver.get_config_bigips()
@@ -161,11 +158,27 @@ class NetworkServiceBuilder(object):
                 except KeyError as err:
                     raise f5_ex.VirtualServerCreationException(err.message)
 
-                for assure_bigip in assure_bigips:
-                    # If we are not using SNATS, attempt to become
-                    # the subnet's default gateway.
-                    self.bigip_selfip_manager.assure_gateway_on_subnet(
-                        assure_bigip, subnetinfo, traffic_group)
+                # If we are not using SNATS, attempt to become
+                # the subnet's default gateway.
+                self.driver.device_fanout.run(
+                    assure_bigips,
+                    self.bigip_selfip_manager.assure_gateway_on_subnet,
+                    subnetinfo, traffic_group)
+
+    def _assure_bigip_networks(self, assure_bigip, service, subnetsinfo):
+        for subnetinfo in subnetsinfo:
+            LOG.debug("Assuring per device network connectivity "
+                      "for %s on subnet %s." % (assure_bigip.hostname,
+                                                subnetinfo['subnet']))
+
+            # Make sure the L2 network is established
+            self.l2_service.assure_bigip_network(
+                assure_bigip, subnetinfo['network'])
+
+            # Connect the BigIP device to network, by getting
+            # a self-ip address on the subnet.
+            self.bigip_selfip_manager.assure_bigip_selfip(
+                assure_bigip, service, subnetinfo)
 
     def _annotate_service_route_domains(self, service):
         # Add route domain notation to pool member and vip addresses.
@@ -242,49 +255,26 @@ class NetworkServiceBuilder(object):
         LOG.debug("assign route domain checking for available route domain")
         # need new route domain ?
         check_cidr = netaddr.IPNetwork(subnet['cidr'])
-        placed_route_domain_id = None
-        for route_domain_id in self.rds_cache[tenant_id]:
-            LOG.debug("checking rd %s" % route_domain_id)
-            rd_entry = self.rds_cache[tenant_id][route_domain_id]
-            overlapping_subnet = None
-            for net_shortname in rd_entry:
-                LOG.debug("checking net %s" % net_shortname)
-                net_entry = rd_entry[net_shortname]
-                for exist_subnet_id in net_entry['subnets']:
-                    if exist_subnet_id == subnet['id']:
-                        continue
-                    exist_subnet = net_entry['subnets'][exist_subnet_id]
-                    exist_cidr = exist_subnet['cidr']
-                    if check_cidr in exist_cidr or exist_cidr in check_cidr:
-                        overlapping_subnet = exist_subnet
-                        LOG.debug('rd %s: overlaps with subnet %s id: %s' % (
-                            (route_domain_id, exist_subnet, exist_subnet_id)))
-                        break
-                if overlapping_subnet:
-                    # no need to keep looking
-                    break
-            if not overlapping_subnet:
-                placed_route_domain_id = route_domain_id
-                break
+        placed_route_domain_id = self.rds_cache.find_route_domain(
+            tenant_id, subnet['id'], check_cidr)
 
         if placed_route_domain_id is None:
-            if (len(self.rds_cache[tenant_id]) <
+            if (len(self.rds_cache.route_domains(tenant_id)) <
                     self.conf.max_namespaces_per_tenant):
                 placed_route_domain_id = self._create_aux_rd(tenant_id)
-                self.rds_cache[tenant_id][placed_route_domain_id] = {}
+                self.rds_cache.add_route_domain(
+                    tenant_id, placed_route_domain_id)
                 LOG.debug("Tenant %s now has %d route domains" %
-                          (tenant_id, len(self.rds_cache[tenant_id])))
+                          (tenant_id,
+                           len(self.rds_cache.route_domains(tenant_id))))
             else:
                 raise Exception("Cannot allocate route domain")
 
         LOG.debug("Placed in route domain %s" % placed_route_domain_id)
-        rd_entry = self.rds_cache[tenant_id][placed_route_domain_id]
-
         net_short_name = self.get_neutron_net_short_name(network)
-        if net_short_name not in rd_entry:
-            rd_entry[net_short_name] = {'subnets': {}}
-        net_subnets = rd_entry[net_short_name]['subnets']
-        net_subnets[subnet['id']] = {'cidr': check_cidr}
+        self.rds_cache.add_subnet(tenant_id, placed_route_domain_id,
+                                  net_short_name, subnet['id'], check_cidr)
+        self.save_rds_cache()
         network['route_domain_id'] = placed_route_domain_id
 
     def _create_aux_rd(self, tenant_id):
@@ -308,106 +298,110 @@ class NetworkServiceBuilder(object):
                   % (route_domain_id, tenant_id))
         return route_domain_id
 
-    # The purpose of the route domain subnet cache is to
-    # determine whether there is an existing bigip
-    # subnet that conflicts with a new one being
-    # assigned to the route domain.
-    """
-    # route domain subnet cache
-    rds_cache =
-        {'<tenant_id>': {
-            {'0': {
-                '<network type>-<segmentation id>': [
-                    'subnets': [
-                        '<subnet id>': {
-                            'cidr': '<cidr>'
-                        }
-                ],
-            '1': {}}}}
-    """
     def update_rds_cache(self, tenant_id):
         # Update the route domain cache from bigips
+        if not self.rds_cache_loaded:
+            self.load_rds_cache()
         if tenant_id not in self.rds_cache:
             LOG.debug("rds_cache: adding tenant %s" % tenant_id)
-            self.rds_cache[tenant_id] = {}
-            for bigip in self.driver.get_all_bigips():
-                self.update_rds_cache_bigip(tenant_id, bigip)
-            LOG.debug("rds_cache updated: " + str(self.rds_cache))
-
-    def update_rds_cache_bigip(self, tenant_id, bigip):
-        # Update the route domain cache for this tenant
-        # with information from bigip's vlan and tunnels
-        LOG.debug("rds_cache: processing bigip %s" % bigip.device_name)
-
-        route_domain_ids = self.network_helper.get_route_domain_ids(
-            bigip,
-            partition=self.service_adapter.get_folder_name(tenant_id))
-        # LOG.debug("rds_cache: got bigip route domains: %s" % route_domains)
-        for route_domain_id in route_domain_ids:
-            self.update_rds_cache_bigip_rd_vlans(
-                tenant_id, bigip, route_domain_id)
-
-    def update_rds_cache_bigip_rd_vlans(
-            self, tenant_id, bigip, route_domain_id):
-        # Update the route domain cache with information
-        # from the bigip vlans and tunnels from
-        # this route domain
-        LOG.debug("rds_cache: processing bigip %s rd %s"
-                  % (bigip.device_name, route_domain_id))
-        # this gets tunnels too
-        partition_id = self.service_adapter.get_folder_name(tenant_id)
-        rd_vlans = self.network_helper.get_vlans_in_route_domain_by_id(
-            bigip,
-            partition=partition_id,
-            id=route_domain_id
-        )
-        LOG.debug("rds_cache: bigip %s rd %s vlans: %s"
-                  % (bigip.device_name, route_domain_id, rd_vlans))
-        if len(rd_vlans) == 0:
-            LOG.debug("No vlans found for route domain: %d" %
-                      (route_domain_id))
+            self.rds_cache.add_tenant(tenant_id)
+
+    def load_rds_cache(self):
+        # Fill the route domain cache for all tenants, from the agent
+        # state or the cache file if there is a usable one, from the
+        # bigips otherwise
+        bigips = self.driver.get_all_bigips()
+        hostnames = [bigip.hostname for bigip in bigips]
+        state_store = self.driver.state_store
+        cache_file = self.conf.route_domain_cache_file
+        rds_cache = None
+        if state_store:
+            # The stored route domains are only good if none of the
+            # bigips changed since they were stored.
+            route_domains = state_store.get('route_domains')
+            if route_domains is not None and \
+                    all(bigip.state_restored for bigip in bigips):
+                rds_cache = RouteDomainSubnetCache.from_dict(route_domains)
+        elif cache_file:
+            rds_cache = load_cache(cache_file, hostnames)
+        from_bigips = rds_cache is None
+        if from_bigips:
+            rds_cache = RouteDomainSubnetCache()
+            for bigip in bigips:
+                self.load_rds_cache_bigip(rds_cache, bigip)
+        self.rds_cache = rds_cache
+        self.rds_cache_loaded = True
+        if from_bigips:
+            self.save_rds_cache()
+        LOG.debug("rds_cache loaded: " + str(self.rds_cache))
+
+    def save_rds_cache(self):
+        # Keep the route domain cache in the agent state, which the
+        # driver writes at the end of the service pass, or write the
+        # cache file, if there is one
+        if not self.rds_cache_loaded:
             return
+        state_store = self.driver.state_store
+        cache_file = self.conf.route_domain_cache_file
+        if state_store:
+            state_store.put('route_domains', self.rds_cache.to_dict())
+        elif cache_file:
+            save_cache(self.rds_cache, cache_file,
+                       [bigip.hostname for bigip in
+                        self.driver.get_all_bigips()])
+
+    def load_rds_cache_bigip(self, rds_cache, bigip):
+        # Add the route domains of all tenants on bigip to rds_cache,
+        # with the networks (vlans and tunnels) and subnets (selfips)
+        # in them. Each type of object is read with a single request.
+        LOG.debug("rds_cache: processing bigip %s" % bigip.device_name)
+        prefix = self.service_adapter.prefix
+        net_short_names = {}
+        for tunnel in bigip.tm.net.tunnels.tunnels.get_collection():
+            if 'tunnel-gre-' in tunnel.name:
+                net_short_names[tunnel.fullPath] = \
+                    'gre-%s' % getattr(tunnel, 'key', None)
+            elif 'tunnel-vxlan-' in tunnel.name:
+                net_short_names[tunnel.fullPath] = \
+                    'vxlan-%s' % getattr(tunnel, 'key', None)
+        for vlan in bigip.tm.net.vlans.get_collection():
+            net_short_names[vlan.fullPath] = \
+                'vlan-%s' % getattr(vlan, 'tag', None)
+        selfips = {}
+        for selfip in bigip.tm.net.selfips.get_collection():
+            selfips.setdefault(selfip.vlan, []).append(selfip)
+
+        for route_domain in bigip.tm.net.route_domains.get_collection():
+            partition = route_domain.partition
+            if not partition.startswith(prefix):
+                continue
+            tenant_id = partition[len(prefix):]
+            rd_vlans = getattr(route_domain, 'vlans', None)
+            if not rd_vlans:
+                LOG.debug("No vlans found for route domain: %d" %
+                          (route_domain.id))
+                continue
 
-        # make sure this rd has a cache entry
-        tenant_entry = self.rds_cache[tenant_id]
-        if route_domain_id not in tenant_entry:
-            tenant_entry[route_domain_id] = {}
-
-        # for every VLAN or TUNNEL on this bigip...
-        for rd_vlan in rd_vlans:
-            self.update_rds_cache_bigip_vlan(
-                tenant_id, bigip, route_domain_id, rd_vlan)
-
-    def update_rds_cache_bigip_vlan(
-            self, tenant_id, bigip, route_domain_id, rd_vlan):
-        # Update the route domain cache with information
-        #    from the bigip vlan or tunnel
-        LOG.debug("rds_cache: processing bigip %s rd %d vlan %s"
-                  % (bigip.device_name, route_domain_id, rd_vlan))
-        net_short_name = self.get_bigip_net_short_name(
-            bigip, tenant_id, rd_vlan)
-
-        # make sure this net has a cache entry
-        tenant_entry = self.rds_cache[tenant_id]
-        rd_entry = tenant_entry[route_domain_id]
-        if net_short_name not in rd_entry:
-            rd_entry[net_short_name] = {'subnets': {}}
-        net_subnets = rd_entry[net_short_name]['subnets']
-
-        partition_id = self.service_adapter.get_folder_name(tenant_id)
-        LOG.debug("Calling get_selfips with: partition %s and vlan_name %s",
-                  partition_id, rd_vlan)
-        selfips = self.bigip_selfip_manager.get_selfips(
-            bigip,
-            partition=partition_id,
-            vlan_name=rd_vlan
-        )
-
-        LOG.debug("rds_cache: got selfips")
+            # make sure this rd has a cache entry
+            rds_cache.add_route_domain(tenant_id, route_domain.id)
+            for rd_vlan in rd_vlans:
+                if not rd_vlan.startswith('/'):
+                    rd_vlan = "/%s/%s" % (partition, rd_vlan)
+                net_short_name = net_short_names.get(rd_vlan)
+                if net_short_name is None:
+                    LOG.error("rds_cache: Found unknown network %s in "
+                              "route domain %s of tenant %s" %
+                              (rd_vlan, route_domain.id, tenant_id))
+                    continue
+                rds_cache.add_network(
+                    tenant_id, route_domain.id, net_short_name)
+                self._load_rds_cache_selfips(
+                    rds_cache, bigip, tenant_id, route_domain.id,
+                    net_short_name, selfips.get(rd_vlan, []))
+
+    def _load_rds_cache_selfips(self, rds_cache, bigip, tenant_id,
+                                route_domain_id, net_short_name, selfips):
         for selfip in selfips:
-            LOG.debug("rds_cache: processing bigip %s rd %s vlan %s self %s" %
-                      (bigip.device_name, route_domain_id, rd_vlan,
-                       selfip.name))
             if bigip.device_name not in selfip.name:
                 LOG.error("rds_cache: Found unexpected selfip %s for tenant %s"
                           % (selfip.name, tenant_id))
@@ -417,76 +411,28 @@ class NetworkServiceBuilder(object):
             # convert 10.1.1.1%1/24 to 10.1.1.1/24
             (addr, netbits) = selfip.address.split('/')
             addr = addr.split('%')[0]
-            selfip.address = addr + '/' + netbits
 
             # selfip addresses will have slash notation: 10.1.1.1/24
-            netip = netaddr.IPNetwork(selfip.address)
+            netip = netaddr.IPNetwork(addr + '/' + netbits)
             LOG.debug("rds_cache: updating subnet %s with %s"
                       % (subnet_id, str(netip.cidr)))
-            net_subnets[subnet_id] = {'cidr': netip.cidr}
-            LOG.debug("rds_cache: now %s" % self.rds_cache)
+            rds_cache.add_subnet(tenant_id, route_domain_id,
+                                 net_short_name, subnet_id, netip.cidr)
 
     def get_route_domain_from_cache(self, network):
         # Get route domain from cache by network
         net_short_name = self.get_neutron_net_short_name(network)
-        for tenant_id in self.rds_cache:
-            tenant_cache = self.rds_cache[tenant_id]
-            for route_domain_id in tenant_cache:
-                if net_short_name in tenant_cache[route_domain_id]:
-                    return route_domain_id
+        return self.rds_cache.get_route_domain(net_short_name)
 
     def remove_from_rds_cache(self, network, subnet):
         # Get route domain from cache by network
         LOG.debug("remove_from_rds_cache")
         net_short_name = self.get_neutron_net_short_name(network)
-        for tenant_id in self.rds_cache:
-            LOG.debug("rds_cache: processing remove for %s" % tenant_id)
-            deleted_rds = []
-            tenant_cache = self.rds_cache[tenant_id]
-            for route_domain_id in tenant_cache:
-                if net_short_name in tenant_cache[route_domain_id]:
-                    net_entry = tenant_cache[route_domain_id][net_short_name]
-                    if subnet['id'] in net_entry['subnets']:
-                        del net_entry['subnets'][subnet['id']]
-                        if len(net_entry['subnets']) == 0:
-                            del net_entry['subnets']
-                    if len(tenant_cache[route_domain_id][net_short_name]) == 0:
-                        del tenant_cache[route_domain_id][net_short_name]
-                if len(self.rds_cache[tenant_id][route_domain_id]) == 0:
-                    deleted_rds.append(route_domain_id)
-            for rd in deleted_rds:
-                LOG.debug("removing route domain %d from tenant %s" %
-                          (rd, tenant_id))
-                del self.rds_cache[tenant_id][rd]
-
-    def get_bigip_net_short_name(self, bigip, tenant_id, network_name):
-        # Return <network_type>-<seg_id> for bigip network
-        LOG.debug("get_bigip_net_short_name: %s:%s" % (
-            tenant_id, network_name))
-        partition_id = self.service_adapter.get_folder_name(tenant_id)
-        LOG.debug("network_name %s", network_name.split('/'))
-        network_name = network_name.split("/")[-1]
-        if 'tunnel-gre-' in network_name:
-            tunnel_key = self.network_helper.get_tunnel_key(
-                bigip,
-                network_name,
-                partition=partition_id
-            )
-            return 'gre-%s' % tunnel_key
-        elif 'tunnel-vxlan-' in network_name:
-            LOG.debug("Getting tunnel key for VXLAN: %s", network_name)
-            tunnel_key = self.network_helper.get_tunnel_key(
-                bigip,
-                network_name,
-                partition=partition_id
-            )
-            return 'vxlan-%s' % tunnel_key
-        else:
-            LOG.debug("Getting tunnel key for VLAN: %s", network_name)
-            vlan_id = self.network_helper.get_vlan_id(bigip,
-                                                      name=network_name,
-                                                      partition=partition_id)
-            return 'vlan-%s' % vlan_id
+        removed = self.rds_cache.remove_subnet(net_short_name, subnet['id'])
+        if removed:
+            LOG.debug("removing route domain %d from tenant %s" %
+                      (removed[1], removed[0]))
+        self.save_rds_cache()
 
     @staticmethod
     def get_neutron_net_short_name(network):
@@ -518,9 +464,9 @@ class NetworkServiceBuilder(object):
                     "Unable to satisfy request to allocate %d "
                     "snats.  Actual SNAT count: %d SNATs" %
                     (snats_per_subnet, len(snat_addrs)))
-            for assure_bigip in assure_bigips:
-                self.bigip_snat_manager.assure_bigip_snats(
-                    assure_bigip, subnetinfo, snat_addrs, tenant_id)
+            self.driver.device_fanout.run(
+                assure_bigips, self.bigip_snat_manager.assure_bigip_snats,
+                subnetinfo, snat_addrs, tenant_id)
 
     def _allocate_gw_addr(self, subnetinfo):
         # Create a name for the port and for the IP Forwarding
@@ -567,6 +513,10 @@ class NetworkServiceBuilder(object):
         if self.conf.f5_global_routed_mode:
             return
 
+        folder = self.service_adapter.get_folder_name(
+            service['loadbalancer']['tenant_id'])
+        self._forget_address_indexes(folder)
+
         # L2toL3 networking layer
         # Non Shared Config -  Local Per BIG-IP
         self.update_bigip_l2(service)
@@ -602,28 +552,33 @@ class NetworkServiceBuilder(object):
             self.driver.plugin_rpc.delete_port_by_name(
                 port_name=port_name)
 
+        self._forget_address_indexes(folder)
+
     def update_bigip_l2(self, service):
         # Update fdb entries on bigip
         loadbalancer = service['loadbalancer']
         service_adapter = self.service_adapter
 
-        for bigip in self.driver.get_all_bigips():
-            for member in service['members']:
-                LOG.debug("update_bigip_l2 update service members")
-                member['network'] = service_adapter.get_network_from_service(
-                    service,
-                    member['network_id']
-                )
-                member_status = member['provisioning_status']
-                if member_status == plugin_const.PENDING_DELETE:
-                    self.delete_bigip_member_l2(bigip, loadbalancer, member)
-                else:
-                    self.update_bigip_member_l2(bigip, loadbalancer, member)
-
-            if "network_id" not in loadbalancer:
-                LOG.error("update_bigip_l2, expected network ID")
-                return
+        # The fdb records of the service do not depend on the bigip.
+        # Gather them by tunnel first, so that each tunnel is written
+        # once per bigip.
+        add_fdbs = {}
+        delete_fdbs = {}
+        for member in service['members']:
+            LOG.debug("update_bigip_l2 update service members")
+            member['network'] = service_adapter.get_network_from_service(
+                service,
+                member['network_id']
+            )
+            member_status = member['provisioning_status']
+            if member_status == plugin_const.PENDING_DELETE:
+                self.delete_bigip_member_l2(delete_fdbs, loadbalancer, member)
+            else:
+                self.update_bigip_member_l2(add_fdbs, loadbalancer, member)
 
+        if "network_id" not in loadbalancer:
+            LOG.error("update_bigip_l2, expected network ID")
+        else:
             LOG.debug("update_bigip_l2 get network for ID %s" %
                       loadbalancer["network_id"])
             loadbalancer['network'] = service_adapter.get_network_from_service(
@@ -632,14 +587,29 @@ class NetworkServiceBuilder(object):
             )
             lb_status = loadbalancer['provisioning_status']
             if lb_status == plugin_const.PENDING_DELETE:
-                self.delete_bigip_vip_l2(bigip, loadbalancer)
+                self.delete_bigip_vip_l2(delete_fdbs, loadbalancer)
             else:
                 LOG.debug("update_bigip_l2 calling update_bigip_vip_l2")
-                self.update_bigip_vip_l2(bigip, loadbalancer)
-            LOG.debug("update_bigip_l2 complete")
-
-    def update_bigip_member_l2(self, bigip, loadbalancer, member):
-        # update pool member l2 records
+                self.update_bigip_vip_l2(add_fdbs, loadbalancer)
+
+        if add_fdbs or delete_fdbs:
+            self.driver.device_fanout.run(self.driver.get_all_bigips(),
+                                          self._update_bigip_fdbs,
+                                          add_fdbs, delete_fdbs)
+        LOG.debug("update_bigip_l2 complete")
+
+    def _update_bigip_fdbs(self, bigip, add_fdbs, delete_fdbs):
+        # Deletes go first, so that records which are both deleted and
+        # added, e.g. the same port for an old and a new member, remain.
+        if delete_fdbs:
+            self.network_helper.delete_fdb_entries(
+                bigip, fdb_entries=delete_fdbs)
+        if add_fdbs:
+            self.network_helper.add_fdb_entries(
+                bigip, fdb_entries=add_fdbs)
+
+    def update_bigip_member_l2(self, fdbs, loadbalancer, member):
+        # Add pool member l2 records to fdbs
         network = member['network']
         if network:
             if self.l2_service.is_common_network(network):
@@ -651,11 +621,11 @@ class NetworkServiceBuilder(object):
             fdb_info = {'network': network,
                         'ip_address': member['address'],
                         'mac_address': member['port']['mac_address']}
-            self.l2_service.add_bigip_fdbs(
-                bigip, net_folder, fdb_info, member)
+            self.l2_service.merge_bigip_fdbs(
+                fdbs, net_folder, fdb_info, member)
 
-    def delete_bigip_member_l2(self, bigip, loadbalancer, member):
-        # Delete pool member l2 records
+    def delete_bigip_member_l2(self, fdbs, loadbalancer, member):
+        # Add pool member l2 records to delete to fdbs
         network = member['network']
         if network:
             if 'port' in member:
@@ -668,8 +638,8 @@ class NetworkServiceBuilder(object):
                 fdb_info = {'network': network,
                             'ip_address': member['address'],
                             'mac_address': member['port']['mac_address']}
-                self.l2_service.delete_bigip_fdbs(
-                    bigip, net_folder, fdb_info, member)
+                self.l2_service.merge_bigip_fdbs(
+                    fdbs, net_folder, fdb_info, member)
             else:
                 LOG.error('Member on SDN has no port. Manual '
                           'removal on the BIG-IP will be '
@@ -677,8 +647,8 @@ class NetworkServiceBuilder(object):
                           'deleted before the pool member '
                           'was deleted?')
 
-    def update_bigip_vip_l2(self, bigip, loadbalancer):
-        # Update vip l2 records
+    def update_bigip_vip_l2(self, fdbs, loadbalancer):
+        # Add vip l2 records to fdbs
         network = loadbalancer['network']
         if network:
             if self.l2_service.is_common_network(network):
@@ -690,11 +660,11 @@ class NetworkServiceBuilder(object):
             fdb_info = {'network': network,
                         'ip_address': None,
                         'mac_address': None}
-            self.l2_service.add_bigip_fdbs(
-                bigip, net_folder, fdb_info, loadbalancer)
+            self.l2_service.merge_bigip_fdbs(
+                fdbs, net_folder, fdb_info, loadbalancer)
 
-    def delete_bigip_vip_l2(self, bigip, loadbalancer):
-        # Delete loadbalancer l2 records
+    def delete_bigip_vip_l2(self, fdbs, loadbalancer):
+        # Add loadbalancer l2 records to delete to fdbs
         network = loadbalancer['network']
         if network:
             if self.l2_service.is_common_network(network):
@@ -706,8 +676,8 @@ class NetworkServiceBuilder(object):
             fdb_info = {'network': network,
                         'ip_address': None,
                         'mac_address': None}
-            self.l2_service.delete_bigip_fdbs(
-                bigip, net_folder, fdb_info, loadbalancer)
+            self.l2_service.merge_bigip_fdbs(
+                fdbs, net_folder, fdb_info, loadbalancer)
 
     def _assure_delete_nets_shared(self, bigip, service, subnet_hints):
         # Assure shared configuration (which syncs) is deleted
@@ -834,56 +804,38 @@ class NetworkServiceBuilder(object):
         # Does the big-ip have any IP addresses on this subnet?
         LOG.debug("_ips_exist_on_subnet entry %s rd %s"
                   % (str(subnet['cidr']), route_domain))
-        route_domain = str(route_domain)
-        ipsubnet = netaddr.IPNetwork(subnet['cidr'])
-
-        # Are there any virtual addresses on this subnet?
         folder = self.service_adapter.get_folder_name(
             service['loadbalancer']['tenant_id']
         )
-        virtual_services = self.network_helper.get_virtual_service_insertion(
-            bigip,
-            partition=folder
-        )
-        for virt_serv in virtual_services:
-            (_, dest) = virt_serv.items()[0]
-            LOG.debug("            _ips_exist_on_subnet: checking vip %s"
-                      % str(dest['address']))
-            if len(dest['address'].split('%')) > 1:
-                vip_route_domain = dest['address'].split('%')[1]
-            else:
-                vip_route_domain = '0'
-            if vip_route_domain != route_domain:
-                continue
-            vip_addr = strip_domain_address(dest['address'])
-            if netaddr.IPAddress(vip_addr) in ipsubnet:
-                LOG.debug("            _ips_exist_on_subnet: found")
-                return True
-
-        # If there aren't any virtual addresses, are there
-        # node addresses on this subnet?
-        nodes = self.network_helper.get_node_addresses(
-            bigip,
-            partition=folder
-        )
-        for node in nodes:
-            LOG.debug("            _ips_exist_on_subnet: checking node %s"
-                      % str(node))
-            if len(node.split('%')) > 1:
-                node_route_domain = node.split('%')[1]
-            else:
-                node_route_domain = '0'
-            if node_route_domain != route_domain:
-                continue
-            node_addr = strip_domain_address(node)
-            if netaddr.IPAddress(node_addr) in ipsubnet:
-                LOG.debug("        _ips_exist_on_subnet: found")
-                return True
-
-        LOG.debug("            _ips_exist_on_subnet exit %s"
-                  % str(subnet['cidr']))
-        # nothing found
-        return False
+        found = self._get_address_index(bigip, folder).in_subnet(
+            subnet['cidr'], route_domain)
+        LOG.debug("            _ips_exist_on_subnet exit %s found %s"
+                  % (str(subnet['cidr']), found))
+        return found
+
+    def _forget_address_indexes(self, folder):
+        for bigip in self.driver.get_all_bigips():
+            self.address_indexes.pop((bigip.hostname, folder), None)
+
+    def _get_address_index(self, bigip, folder):
+        # Index the virtual and node addresses of the folder once per
+        # post_service_networking pass, rather than reading and scanning
+        # them for every subnet.
+        key = (bigip.hostname, folder)
+        address_index = self.address_indexes.get(key)
+        if address_index is None:
+            address_index = AddressIndex()
+            virtual_services = \
+                self.network_helper.get_virtual_service_insertion(
+                    bigip, partition=folder)
+            for virt_serv in virtual_services:
+                (_, dest) = virt_serv.items()[0]
+                address_index.add(dest['address'])
+            for node in self.network_helper.get_node_addresses(
+                    bigip, partition=folder):
+                address_index.add(node)
+            self.address_indexes[key] = address_index
+        return address_index
 
     def add_bigip_fdb(self, bigip, fdb):
         self.l2_service.add_bigip_fdb(bigip, fdb)
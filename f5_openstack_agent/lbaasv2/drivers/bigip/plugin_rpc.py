@@ -23,8 +23,47 @@ from neutron.plugins.common import constants as plugin_const
 from neutron_lbaas.services.loadbalancer import constants as lb_const
 
 from f5_openstack_agent.lbaasv2.drivers.bigip import constants_v2 as constants
+from f5_openstack_agent.lbaasv2.drivers.bigip import metrics
 
-LOG = logging.getLogger
+LOG = logging.getLogger(__name__)
+
+# Errors of a plugin which does not know a method.
+UNKNOWN_METHOD_ERRORS = ('NoSuchMethod', 'UnsupportedVersion')
+
+
+class StatusBatch(object):
+    """Status updates of the objects of one loadbalancer, sent at once.
+
+    Object types are loadbalancer, listener, pool, member and
+    health_monitor. Updates are sent by flush() in the order they were
+    made.
+    """
+
+    def __init__(self, plugin_rpc, loadbalancer_id):
+        self.plugin_rpc = plugin_rpc
+        self.loadbalancer_id = loadbalancer_id
+        self.statuses = []
+
+    def __len__(self):
+        return len(self.statuses)
+
+    def update_status(self, object_type, object_id,
+                      provisioning_status=plugin_const.ERROR,
+                      operating_status=lb_const.OFFLINE):
+        self.statuses.append({'type': object_type,
+                              'id': object_id,
+                              'provisioning_status': provisioning_status,
+                              'operating_status': operating_status})
+
+    def destroyed(self, object_type, object_id):
+        self.statuses.append({'type': object_type,
+                              'id': object_id,
+                              'destroyed': True})
+
+    def flush(self):
+        statuses, self.statuses = self.statuses, []
+        if statuses:
+            self.plugin_rpc.update_statuses(self.loadbalancer_id, statuses)
 
 
 class LBaaSv2PluginRPC(object):
@@ -32,6 +71,9 @@ class LBaaSv2PluginRPC(object):
 
     RPC_API_NAMESPACE = None
 
+    # How many service definitions to fetch per call.
+    SERVICES_CHUNK_SIZE = 50
+
     def __init__(self, topic, context, env, group, host):
         """Initialize LBaaSv2PluginRPC."""
         super(LBaaSv2PluginRPC, self).__init__()
@@ -49,6 +91,10 @@ class LBaaSv2PluginRPC(object):
         self.env = env
         self.group = group
         self.host = host
+        # Cleared when the plugin turns out not to have the bulk call.
+        self.bulk_services = True
+        # Whether the plugin has update_statuses, None until known.
+        self.bulk_status = None
 
     def _make_msg(self, method, **kwargs):
         return {'method': method,
@@ -86,7 +132,51 @@ class LBaaSv2PluginRPC(object):
             callee = self._client
 
         func = getattr(callee, kwargs['rpc_method'])
-        return func(context, msg['method'], **msg['args'])
+        with metrics.RPC_SECONDS.time(method=msg['method']):
+            return func(context, msg['method'], **msg['args'])
+
+    def status_batch(self, loadbalancer_id):
+        """Return a StatusBatch for the objects of a loadbalancer."""
+        return StatusBatch(self, loadbalancer_id)
+
+    @log_helpers.log_method_call
+    def update_statuses(self, loadbalancer_id, statuses):
+        """Update the status of many objects of a loadbalancer.
+
+        The statuses are sent in one message, or one message per object
+        to a plugin without update_statuses.
+        """
+        if self.bulk_status is not False:
+            msg = self._make_msg('update_statuses',
+                                 loadbalancer_id=loadbalancer_id,
+                                 statuses=statuses)
+            if self.bulk_status:
+                self._cast(self.context, msg, topic=self.topic)
+                return
+            # Find out whether the plugin has the method.
+            try:
+                self._call(self.context, msg, topic=self.topic)
+                self.bulk_status = True
+                return
+            except messaging.RemoteError as err:
+                if err.exc_type in UNKNOWN_METHOD_ERRORS:
+                    LOG.info("Plugin does not support update_statuses, "
+                             "updating status one object at a time")
+                    self.bulk_status = False
+                else:
+                    LOG.error("agent->plugin RPC exception caught: "
+                              "update_statuses: %s" % err)
+            except messaging.MessagingException as err:
+                LOG.error("agent->plugin RPC exception caught: "
+                          "update_statuses: %s" % err)
+
+        for status in statuses:
+            if status.get('destroyed'):
+                getattr(self, '%s_destroyed' % status['type'])(status['id'])
+            else:
+                getattr(self, 'update_%s_status' % status['type'])(
+                    status['id'], status['provisioning_status'],
+                    status['operating_status'])
 
     @log_helpers.log_method_call
     def update_loadbalancer_status(self,
@@ -372,6 +462,57 @@ class LBaaSv2PluginRPC(object):
 
         return service
 
+    @log_helpers.log_method_call
+    def get_services_by_loadbalancer_ids(self, loadbalancer_ids):
+        """Retrieve the service definitions of many loadbalancers.
+
+        Services are fetched SERVICES_CHUNK_SIZE at a time, or one at a
+        time from a plugin without the bulk call.
+
+        :returns: {loadbalancer id: service}, leaving out loadbalancers
+        whose service could not be retrieved.
+        """
+        loadbalancer_ids = list(loadbalancer_ids)
+        services = {}
+        for start in range(0, len(loadbalancer_ids),
+                           self.SERVICES_CHUNK_SIZE):
+            chunk = loadbalancer_ids[start:start + self.SERVICES_CHUNK_SIZE]
+            if self.bulk_services:
+                try:
+                    for service in self._get_services(chunk):
+                        if service and service.get('loadbalancer'):
+                            services[service['loadbalancer']['id']] = \
+                                service
+                    continue
+                except messaging.RemoteError as err:
+                    if err.exc_type not in UNKNOWN_METHOD_ERRORS:
+                        raise
+                    LOG.info("Plugin does not support "
+                             "get_services_by_loadbalancer_ids, fetching "
+                             "services one at a time")
+                    self.bulk_services = False
+            for loadbalancer_id in chunk:
+                service = self.get_service_by_loadbalancer_id(loadbalancer_id)
+                if service and service.get('loadbalancer'):
+                    services[loadbalancer_id] = service
+        return services
+
+    def _get_services(self, loadbalancer_ids):
+        services = []
+        try:
+            services = self._call(
+                self.context,
+                self._make_msg('get_services_by_loadbalancer_ids',
+                               loadbalancer_ids=loadbalancer_ids,
+                               host=self.host),
+                topic=self.topic
+            )
+        except messaging.MessageDeliveryFailure:
+            LOG.error("agent->plugin RPC exception caught: "
+                      "get_services_by_loadbalancer_ids")
+
+        return services
+
     @log_helpers.log_method_call
     def get_all_loadbalancers(self, env=None, group=None, host=None):
         """Retrieve a list of loadbalancers in Neutron."""
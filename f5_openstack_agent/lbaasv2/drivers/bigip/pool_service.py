@@ -17,6 +17,9 @@
 from oslo_log import log as logging
 import urllib
 
+from f5_openstack_agent.lbaasv2.drivers.bigip import config_snapshot
+from f5_openstack_agent.lbaasv2.drivers.bigip.device_fanout import \
+    DeviceFanout
 from f5_openstack_agent.lbaasv2.drivers.bigip.resource_helper import \
     BigIPResourceHelper
 from f5_openstack_agent.lbaasv2.drivers.bigip.resource_helper import \
@@ -32,8 +35,9 @@ class PoolServiceBuilder(object):
     health monitors, and members on one or more BIG-IP® systems.
     """
 
-    def __init__(self, service_adapter):
+    def __init__(self, service_adapter, device_fanout=None):
         self.service_adapter = service_adapter
+        self.device_fanout = device_fanout or DeviceFanout()
         self.http_mon_helper = BigIPResourceHelper(ResourceType.http_monitor)
         self.https_mon_helper = BigIPResourceHelper(ResourceType.https_monitor)
         self.tcp_mon_helper = BigIPResourceHelper(ResourceType.tcp_monitor)
@@ -123,39 +127,79 @@ class PoolServiceBuilder(object):
     def create_member(self, service, bigips):
         pool = self.service_adapter.get_pool(service)
         member = self.service_adapter.get_member(service)
-        for bigip in bigips:
-            part = pool["partition"]
-            p = self.pool_helper.load(bigip,
-                                      name=pool["name"],
-                                      partition=part)
-            m = p.members_s.members
-            member_exists = m.exists(name=urllib.quote(member["name"]),
-                                     partition=part)
+        self.device_fanout.run(bigips, self._create_bigip_member,
+                               pool, member)
 
-            if not member_exists:
-                m.create(**member)
+    def _create_bigip_member(self, bigip, pool, member):
+        part = pool["partition"]
+        p = self.pool_helper.load_cached(bigip,
+                                         name=pool["name"],
+                                         partition=part)
+        m = p.members_s.members
+        if not self._member_exists(bigip, pool, member, m):
+            m.create(**member)
+            self._member_names(bigip, pool, add=member["name"])
+
+    def create_members(self, service, bigips):
+        """Create the members of a pool with one request per BIG-IP®.
+
+        A pool which has no members on a BIG-IP® is given its whole
+        member list at once. Pools which already have members are left
+        alone, as setting the member list would replace the existing
+        members; create_member() handles those.
+
+        :param service: Dictionary which contains a pool, a load balancer
+        and the list of members to create.
+        :param bigips: Array of BigIP class instances to update.
+        """
+        pool = self.service_adapter.get_pool(service)
+        members = [
+            self.service_adapter.get_member(
+                {"loadbalancer": service["loadbalancer"], "member": member})
+            for member in service["members"]]
+        if members:
+            self.device_fanout.run(bigips, self._create_bigip_members,
+                                   pool, members)
+
+    def _create_bigip_members(self, bigip, pool, members):
+        p = self.pool_helper.load_cached(bigip,
+                                         name=pool["name"],
+                                         partition=pool["partition"])
+        names = self._member_names(bigip, pool)
+        if names is None:
+            names = [m.name for m in p.members_s.get_collection()]
+        if names:
+            return
+
+        LOG.debug("Creating %d members of pool %s" %
+                  (len(members), pool["name"]))
+        p.modify(members=members)
+        for member in members:
+            self._member_names(bigip, pool, add=member["name"])
 
     def delete_member(self, service, bigips):
         pool = self.service_adapter.get_pool(service)
         member = self.service_adapter.get_member(service)
+        node = self.service_adapter.get_member_node(service)
+        self.device_fanout.run(bigips, self._delete_bigip_member,
+                               pool, member, node)
+
+    def _delete_bigip_member(self, bigip, pool, member, node):
         part = pool["partition"]
-        for bigip in bigips:
-            p = self.pool_helper.load(bigip,
-                                      name=pool["name"],
-                                      partition=part)
+        p = self.pool_helper.load_cached(bigip,
+                                         name=pool["name"],
+                                         partition=part)
 
-            m = p.members_s.members
-            member_exists = m.exists(name=urllib.quote(member["name"]),
-                                     partition=part)
-            if member_exists:
-                m = m.load(name=urllib.quote(member["name"]),
-                           partition=part)
+        m = p.members_s.members
+        if self._member_exists(bigip, pool, member, m):
+            m = m.load(name=urllib.quote(member["name"]),
+                       partition=part)
 
-                m.delete()
-                node = self.service_adapter.get_member_node(service)
-                self.node_helper.delete(bigip,
-                                        name=urllib.quote(node["name"]),
-                                        partition=node["partition"])
+            m.delete()
+            self._member_names(bigip, pool, discard=member["name"])
+            self.node_helper.delete(bigip,
+                                    name=urllib.quote(node["name"]),
+                                    partition=node["partition"])
 
     def update_member(self, service, bigips):
         # TODO(jl) handle state -- SDK enforces at least state=None
@@ -164,16 +208,36 @@ class PoolServiceBuilder(object):
         member = self.service_adapter.get_member(service)
         part = pool["partition"]
         for bigip in bigips:
-            p = self.pool_helper.load(bigip,
-                                      name=pool["name"],
-                                      partition=part)
+            p = self.pool_helper.load_cached(bigip,
+                                             name=pool["name"],
+                                             partition=part)
 
             m = p.members_s.members
-            if m.exists(name=urllib.quote(member["name"]), partition=part):
+            if self._member_exists(bigip, pool, member, m):
                 m = m.load(name=urllib.quote(member["name"]),
                            partition=part)
                 m.modify(**member)
 
+    def _member_exists(self, bigip, pool, member, members):
+        names = self._member_names(bigip, pool)
+        if names is not None:
+            return member["name"] in names
+        return members.exists(name=urllib.quote(member["name"]),
+                              partition=pool["partition"])
+
+    def _member_names(self, bigip, pool, add=None, discard=None):
+        # Pool member names from the tenant snapshot, None if unknown.
+        snapshot = config_snapshot.get_snapshot(bigip, pool["partition"])
+        if not snapshot:
+            return None
+        names = snapshot.children(ResourceType.pool, pool["name"])
+        if names is not None:
+            if add:
+                names.add(add)
+            if discard:
+                names.discard(discard)
+        return names
+
     def _get_monitor_helper(self, service):
         monitor_type = self.service_adapter.get_monitor_type(service)
         if monitor_type == "HTTPS":
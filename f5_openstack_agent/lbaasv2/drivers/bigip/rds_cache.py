@@ -0,0 +1,284 @@
+# coding=utf-8
+"""Cache of the subnets placed in each tenant route domain."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import bisect
+import collections
+import json
+import os
+
+import netaddr
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Version of the format written by save_cache.
+CACHE_FILE_VERSION = 1
+
+
+class RouteDomainSubnets(object):
+    """Subnets of the networks in one route domain, indexed for overlap.
+
+    Two prefixes overlap only when one contains the other. Subnets which
+    contain a candidate prefix are found by looking up the candidate's
+    supernet for each prefix length in use, subnets which are contained
+    in it by a binary search over the subnets sorted by first address.
+    """
+
+    def __init__(self):
+        # network short name -> {subnet id: cidr}
+        self.networks = {}
+        # (ip version, prefix length, first address) -> set of subnet ids
+        self._prefixes = collections.defaultdict(set)
+        # ip version -> {prefix length: number of subnets}
+        self._prefixlens = collections.defaultdict(
+            lambda: collections.defaultdict(int))
+        # sorted (ip version, first address, last address, subnet id)
+        self._ranges = []
+
+    def __len__(self):
+        return len(self.networks)
+
+    def add_network(self, net_short_name):
+        self.networks.setdefault(net_short_name, {})
+
+    def add_subnet(self, net_short_name, subnet_id, cidr):
+        cidr = netaddr.IPNetwork(cidr).cidr
+        subnets = self.networks.setdefault(net_short_name, {})
+        if subnet_id in subnets:
+            self._unindex(subnet_id, subnets[subnet_id])
+        subnets[subnet_id] = cidr
+        self._prefixes[(cidr.version, cidr.prefixlen, cidr.first)].add(
+            subnet_id)
+        self._prefixlens[cidr.version][cidr.prefixlen] += 1
+        bisect.insort(self._ranges,
+                      (cidr.version, cidr.first, cidr.last, subnet_id))
+
+    def remove_subnet(self, net_short_name, subnet_id):
+        """Remove a subnet, and its network if it has no subnets left.
+
+        :returns: True if the subnet was in the route domain.
+        """
+        subnets = self.networks.get(net_short_name)
+        if subnets is None or subnet_id not in subnets:
+            return False
+        self._unindex(subnet_id, subnets.pop(subnet_id))
+        if not subnets:
+            del self.networks[net_short_name]
+        return True
+
+    def overlaps(self, cidr, subnet_id=None):
+        """Return whether cidr overlaps a subnet other than subnet_id."""
+        cidr = netaddr.IPNetwork(cidr).cidr
+        version = cidr.version
+        width = 32 if version == 4 else 128
+
+        # subnets containing cidr
+        for prefixlen in self._prefixlens[version]:
+            if prefixlen > cidr.prefixlen:
+                continue
+            first = cidr.first >> (width - prefixlen) << (width - prefixlen)
+            if self._prefixes.get((version, prefixlen, first), set()) - \
+                    set([subnet_id]):
+                return True
+
+        # subnets contained in cidr
+        index = bisect.bisect_left(self._ranges, (version, cidr.first))
+        while index < len(self._ranges):
+            entry = self._ranges[index]
+            if entry[0] != version or entry[1] > cidr.last:
+                break
+            if entry[3] != subnet_id:
+                return True
+            index += 1
+        return False
+
+    def _unindex(self, subnet_id, cidr):
+        key = (cidr.version, cidr.prefixlen, cidr.first)
+        self._prefixes[key].discard(subnet_id)
+        if not self._prefixes[key]:
+            del self._prefixes[key]
+        prefixlens = self._prefixlens[cidr.version]
+        prefixlens[cidr.prefixlen] -= 1
+        if not prefixlens[cidr.prefixlen]:
+            del prefixlens[cidr.prefixlen]
+        entry = (cidr.version, cidr.first, cidr.last, subnet_id)
+        index = bisect.bisect_left(self._ranges, entry)
+        if index < len(self._ranges) and self._ranges[index] == entry:
+            del self._ranges[index]
+
+
+class RouteDomainSubnetCache(object):
+    """Route domains of each tenant and the subnets placed in them.
+
+    The purpose of the route domain subnet cache is to determine whether
+    there is an existing BIG-IP® subnet that conflicts with a new one
+    being assigned to a route domain. Networks are identified by their
+    short name, <network type>-<segmentation id>.
+    """
+
+    def __init__(self):
+        # tenant id -> {route domain id: RouteDomainSubnets}
+        self._tenants = {}
+        # network short name -> (tenant id, route domain id)
+        self._networks = {}
+
+    def __contains__(self, tenant_id):
+        return tenant_id in self._tenants
+
+    def add_tenant(self, tenant_id):
+        self._tenants.setdefault(tenant_id, collections.OrderedDict())
+
+    def route_domains(self, tenant_id):
+        """Return the route domain ids of a tenant, in the order added."""
+        return list(self._tenants.get(tenant_id, {}))
+
+    def add_route_domain(self, tenant_id, route_domain_id):
+        self.add_tenant(tenant_id)
+        route_domains = self._tenants[tenant_id]
+        if route_domain_id not in route_domains:
+            route_domains[route_domain_id] = RouteDomainSubnets()
+        return route_domains[route_domain_id]
+
+    def add_network(self, tenant_id, route_domain_id, net_short_name):
+        self.add_route_domain(tenant_id, route_domain_id).add_network(
+            net_short_name)
+        self._networks[net_short_name] = (tenant_id, route_domain_id)
+
+    def add_subnet(self, tenant_id, route_domain_id, net_short_name,
+                   subnet_id, cidr):
+        self.add_route_domain(tenant_id, route_domain_id).add_subnet(
+            net_short_name, subnet_id, cidr)
+        self._networks[net_short_name] = (tenant_id, route_domain_id)
+
+    def get_route_domain(self, net_short_name):
+        """Return the route domain id of a network, or None."""
+        location = self._networks.get(net_short_name)
+        if location:
+            return location[1]
+        return None
+
+    def find_route_domain(self, tenant_id, subnet_id, cidr):
+        """Return the first route domain where cidr fits, or None."""
+        for route_domain_id, subnets in \
+                self._tenants.get(tenant_id, {}).items():
+            if not subnets.overlaps(cidr, subnet_id):
+                return route_domain_id
+        return None
+
+    def remove_subnet(self, net_short_name, subnet_id):
+        """Remove a subnet, dropping its network and route domain if empty.
+
+        :returns: (tenant id, route domain id) of a dropped route domain,
+        or None.
+        """
+        location = self._networks.get(net_short_name)
+        if location is None:
+            return None
+        tenant_id, route_domain_id = location
+        route_domains = self._tenants[tenant_id]
+        subnets = route_domains[route_domain_id]
+        subnets.remove_subnet(net_short_name, subnet_id)
+        if net_short_name not in subnets.networks:
+            del self._networks[net_short_name]
+        if not len(subnets):
+            del route_domains[route_domain_id]
+            return location
+        return None
+
+    def to_dict(self):
+        """Return {tenant id: {route domain id: {network: {subnet: cidr}}}}.
+
+        Subnets are given as strings, so the result can be serialized.
+        """
+        return dict(
+            (tenant_id, dict(
+                (route_domain_id, dict(
+                    (net_short_name, dict(
+                        (subnet_id, str(cidr))
+                        for subnet_id, cidr in subnets.items()))
+                    for net_short_name, subnets in
+                    route_domain.networks.items()))
+                for route_domain_id, route_domain in route_domains.items()))
+            for tenant_id, route_domains in self._tenants.items())
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a cache from the result of to_dict()."""
+        cache = cls()
+        for tenant_id, route_domains in data.items():
+            cache.add_tenant(tenant_id)
+            for route_domain_id in sorted(route_domains, key=int):
+                networks = route_domains[route_domain_id]
+                route_domain_id = int(route_domain_id)
+                cache.add_route_domain(tenant_id, route_domain_id)
+                for net_short_name, subnets in networks.items():
+                    cache.add_network(tenant_id, route_domain_id,
+                                      net_short_name)
+                    for subnet_id, cidr in subnets.items():
+                        cache.add_subnet(tenant_id, route_domain_id,
+                                         net_short_name, subnet_id, cidr)
+        return cache
+
+    def __str__(self):
+        return str(dict(
+            (tenant_id, dict((route_domain_id, subnets.networks)
+                             for route_domain_id, subnets in
+                             route_domains.items()))
+            for tenant_id, route_domains in self._tenants.items()))
+
+
+def save_cache(cache, path, hostnames):
+    """Write cache to path, for the BIG-IP® devices named hostnames."""
+    data = {'version': CACHE_FILE_VERSION,
+            'hostnames': sorted(hostnames),
+            'tenants': cache.to_dict()}
+    # Write a new file and rename it, so the file is never left half
+    # written.
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'w') as cache_file:
+            json.dump(data, cache_file)
+        os.rename(temp_path, path)
+    except (IOError, OSError) as err:
+        LOG.error("Failed to save route domain cache to %s: %s" %
+                  (path, err))
+
+
+def load_cache(path, hostnames):
+    """Read a cache written by save_cache for the same devices.
+
+    :returns: RouteDomainSubnetCache, or None if there is no usable file.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as cache_file:
+            data = json.load(cache_file)
+        if data.get('version') != CACHE_FILE_VERSION:
+            LOG.info("Ignoring route domain cache %s of version %s" %
+                     (path, data.get('version')))
+            return None
+        if data.get('hostnames') != sorted(hostnames):
+            LOG.info("Ignoring route domain cache %s of other devices %s" %
+                     (path, data.get('hostnames')))
+            return None
+        return RouteDomainSubnetCache.from_dict(data['tenants'])
+    except (IOError, OSError, ValueError, KeyError, TypeError,
+            netaddr.AddrFormatError) as err:
+        LOG.error("Failed to load route domain cache from %s: %s" %
+                  (path, err))
+    return None
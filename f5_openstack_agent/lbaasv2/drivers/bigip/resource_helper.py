@@ -14,6 +14,9 @@
 #   limitations under the License.
 
 from enum import Enum
+import urllib
+
+from f5_openstack_agent.lbaasv2.drivers.bigip import config_snapshot
 from f5_openstack_agent.lbaasv2.drivers.bigip.utils import get_filter
 
 from oslo_log import log as logging
@@ -46,6 +49,76 @@ class ResourceType(Enum):
     tunnel = 20
 
 
+# Resource types whose existence is answered from the tenant snapshot
+# during a service pass, see config_snapshot.
+SNAPSHOT_RESOURCES = frozenset([
+    ResourceType.virtual,
+    ResourceType.pool,
+    ResourceType.http_monitor,
+    ResourceType.https_monitor,
+    ResourceType.tcp_monitor,
+    ResourceType.ping_monitor,
+    ResourceType.node,
+    ResourceType.snatpool,
+    ResourceType.snat_translation,
+    ResourceType.selfip
+])
+
+# Subcollections fetched along with the snapshot, by resource type.
+SNAPSHOT_SUBCOLLECTIONS = {
+    ResourceType.pool: 'membersReference'
+}
+
+
+def get_model_changes(resource, model):
+    u"""Return the attributes of model which differ on the BIG-IP®.
+
+    The BIG-IP® returns references to objects with their full path and
+    adds attributes of its own to nested objects, so a model value is
+    considered current when it matches the device value once the
+    partition of the model has been prepended to bare names, and when
+    each key of a nested dict matches. Anything else, including
+    attributes the device does not report, is returned as changed.
+
+    :param resource: Resource object loaded from the BIG-IP®.
+    :param model: Dictionary of BIG-IP® attributes.
+    :returns: dict of the model attributes to modify.
+    """
+    partition = model.get("partition")
+    changes = {}
+    for key, value in model.items():
+        if key in ("name", "partition"):
+            continue
+        if not hasattr(resource, key) or not _same_value(
+                value, getattr(resource, key), partition):
+            changes[key] = value
+    return changes
+
+
+def _same_value(value, current, partition):
+    if isinstance(value, dict):
+        return isinstance(current, dict) and all(
+            key in current and _same_value(item, current[key], partition)
+            for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return isinstance(current, (list, tuple)) and \
+            len(value) == len(current) and all(
+                _same_value(item, current_item, partition)
+                for item, current_item in zip(value, current))
+    if isinstance(value, bool) or isinstance(current, bool):
+        return value is current
+    if value == current:
+        return True
+    if isinstance(value, basestring) and isinstance(current, basestring):
+        if partition and not value.startswith("/") and \
+                current == "/%s/%s" % (partition, value):
+            return True
+        return False
+    if isinstance(value, (int, long)) or isinstance(current, (int, long)):
+        return str(value) == str(current)
+    return False
+
+
 class BigIPResourceHelper(object):
     u"""Helper class for creating, updating and deleting BIG-IP® resources.
 
@@ -76,19 +149,28 @@ class BigIPResourceHelper(object):
         include name and partition.
         :returns: created or updated resource object.
         """
-        resource = self._resource(bigip)
         partition = None
         if "partition" in model:
             partition = model["partition"]
-        if resource.exists(name=model["name"], partition=partition):
+        if self.exists(bigip, name=model["name"], partition=partition):
             obj = self.update(bigip, model)
         else:
+            resource = self._resource(bigip)
             obj = resource.create(**model)
+            snapshot = self._snapshot(bigip, partition)
+            if snapshot:
+                snapshot.add(self.resource_type, model["name"], obj)
+                if self.resource_type in SNAPSHOT_SUBCOLLECTIONS:
+                    snapshot.set_children(self.resource_type, model["name"],
+                                          [])
 
         return obj
 
     def exists(self, bigip, name=None, partition=None):
         """Test for the existence of a resource."""
+        snapshot, obj = self._lookup(bigip, name, partition)
+        if snapshot:
+            return obj is not None
         resource = self._resource(bigip)
         return resource.exists(name=name, partition=partition)
 
@@ -102,6 +184,13 @@ class BigIPResourceHelper(object):
         :param name: Name of resource to delete.
         :param partition: Partition name for resou
         """
+        snapshot, obj = self._lookup(bigip, name, partition)
+        if snapshot:
+            if obj is not None:
+                obj.delete()
+                snapshot.discard(self.resource_type, urllib.unquote(name))
+            return
+
         resource = self._resource(bigip)
         if resource.exists(name=name, partition=partition):
             obj = resource.load(name=name, partition=partition)
@@ -118,9 +207,31 @@ class BigIPResourceHelper(object):
         :param partition: Partition name for resource.
         :returns: created or updated resource object.
         """
+        # The caller may change the object behind the helper's back.
+        snapshot = self._snapshot(bigip, partition)
+        if snapshot:
+            snapshot.invalidate(self.resource_type, urllib.unquote(name))
         resource = self._resource(bigip)
         return resource.load(name=name, partition=partition)
 
+    def load_cached(self, bigip, name=None, partition=None):
+        u"""Retrieve a BIG-IP® resource, from the tenant snapshot if possible.
+
+        The object may not reflect changes made by others since the
+        snapshot was taken. Use it to modify the resource or to reach its
+        subcollections, not to read its attributes.
+
+        :param bigip: BigIP instance to use for creating resource.
+        :param name: Name of resource to load.
+        :param partition: Partition name for resource.
+        :returns: resource object.
+        """
+        snapshot, obj = self._lookup(bigip, name, partition)
+        if obj is None:
+            resource = self._resource(bigip)
+            obj = resource.load(name=name, partition=partition)
+        return obj
+
     def update(self, bigip, model):
         u"""Update a resource (e.g., pool) on a BIG-IP® system.
 
@@ -130,16 +241,29 @@ class BigIPResourceHelper(object):
         :param bigip: BigIP instance to use for creating resource.
         :param model: Dictionary of BIG-IP® attributes to update resource.
         Must include name and partition in order to identify resource.
+
+        Only the attributes which differ from the current configuration
+        are sent, and nothing is sent if the resource is up to date.
         """
         partition = None
         if "partition" in model:
             partition = model["partition"]
-        resource = self.load(bigip, name=model["name"], partition=partition)
-        resource.modify(**model)
+        resource = self.load_cached(bigip, name=model["name"],
+                                    partition=partition)
+        changes = get_model_changes(resource, model)
+        if changes:
+            LOG.debug("Updating %s %s: %s" %
+                      (self.resource_type.name, model["name"],
+                       changes.keys()))
+            resource.modify(**changes)
+        snapshot = self._snapshot(bigip, partition)
+        if snapshot:
+            snapshot.add(self.resource_type, model["name"], resource)
 
         return resource
 
-    def get_resources(self, bigip, partition=None):
+    def get_resources(self, bigip, partition=None,
+                      expand_subcollections=False):
         u"""Retrieve a collection BIG-IP® of resources from a BIG-IP®.
 
         Generates a list of resources objects on a BIG-IP® system.
@@ -147,6 +271,8 @@ class BigIPResourceHelper(object):
         :param bigip: BigIP instance to use for creating resource.
         :param name: Name of resource to load.
         :param partition: Partition name for resource.
+        :param expand_subcollections: Include subcollection items, e.g.
+        pool members, in the resources.
         :returns: list of created or updated resource objects.
         """
         resources = []
@@ -157,16 +283,61 @@ class BigIPResourceHelper(object):
             raise err
 
         if collection:
+            params = None
             if partition:
-                params = {
-                    'params': get_filter(bigip, 'partition', 'eq', partition)
-                }
-                resources = collection.get_collection(requests_params=params)
+                params = get_filter(bigip, 'partition', 'eq', partition)
+            if expand_subcollections:
+                if params is None:
+                    params = {'expandSubcollections': 'true'}
+                elif isinstance(params, dict):
+                    params['expandSubcollections'] = 'true'
+                else:
+                    params += '&expandSubcollections=true'
+            if params:
+                resources = collection.get_collection(
+                    requests_params={'params': params})
             else:
                 resources = collection.get_collection()
 
         return resources
 
+    def _snapshot(self, bigip, partition):
+        # Return the active tenant snapshot which covers this resource
+        # type, fetching the resources on first use.
+        if self.resource_type not in SNAPSHOT_RESOURCES:
+            return None
+        snapshot = config_snapshot.get_snapshot(bigip, partition)
+        if snapshot is None:
+            return None
+
+        if snapshot.resources(self.resource_type) is None:
+            subcollection = SNAPSHOT_SUBCOLLECTIONS.get(self.resource_type)
+            resources = {}
+            for obj in self.get_resources(
+                    bigip, partition,
+                    expand_subcollections=bool(subcollection)):
+                resources[obj.name] = obj
+                if subcollection:
+                    reference = getattr(obj, subcollection, {})
+                    snapshot.set_children(
+                        self.resource_type, obj.name,
+                        [item['name'] for item in reference.get('items', [])])
+            snapshot.set_resources(self.resource_type, resources)
+        return snapshot
+
+    def _lookup(self, bigip, name, partition):
+        # Return (snapshot, object) when the snapshot knows about the
+        # resource, object being None if it does not exist. Return
+        # (None, None) when the device must be asked. Callers may pass
+        # URL quoted names, the snapshot has them as the device does.
+        snapshot = self._snapshot(bigip, partition)
+        if not snapshot or name is None:
+            return None, None
+        name = urllib.unquote(name)
+        if snapshot.is_stale(self.resource_type, name):
+            return None, None
+        return snapshot, snapshot.resources(self.resource_type).get(name)
+
     def _resource(self, bigip):
         return {
             ResourceType.nat: lambda bigip: bigip.tm.ltm.nats.nat,
@@ -0,0 +1,186 @@
+# coding=utf-8
+"""Account for the iControl® REST requests sent to BIG-IP® devices."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import heapq
+import random
+import time
+import urlparse
+
+from eventlet import greenthread
+from oslo_log import log as logging
+
+from f5_openstack_agent.lbaasv2.drivers.bigip import metrics
+
+LOG = logging.getLogger(__name__)
+
+# Slowest requests listed in the summary of an account.
+TOP_SLOWEST = 5
+
+# greenthread -> RestAccount its requests are recorded in
+_accounts = {}
+
+
+def uri_template(url):
+    """Return the path of a REST URI with object names and ids replaced.
+
+    Example:
+        https://host/mgmt/tm/ltm/pool/~Project_1~pool1/members?ver=11.6.0
+        ==> /mgmt/tm/ltm/pool/{name}/members
+    """
+    segments = []
+    for segment in urlparse.urlsplit(url).path.split('/'):
+        if segment.startswith('~'):
+            segment = '{name}'
+        elif segment.isdigit():
+            segment = '{id}'
+        segments.append(segment)
+    return '/'.join(segments)
+
+
+class RestAccount(object):
+    """REST requests sent on behalf of one operation, e.g. a service pass."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        # heap of the TOP_SLOWEST (seconds, method, uri template, status)
+        self.slowest = []
+
+    def record(self, method, template, status, size, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        self.bytes += size
+        entry = (seconds, method, template, status)
+        if len(self.slowest) < TOP_SLOWEST:
+            heapq.heappush(self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def summary(self):
+        slowest = ['%s %s %s %.3f secs' % (method, template, status, seconds)
+                   for seconds, method, template, status in
+                   sorted(self.slowest, reverse=True)]
+        return '%s: %d REST calls, %.3f secs, %d bytes; slowest: %s' % (
+            self.name, self.calls, self.seconds, self.bytes,
+            ', '.join(slowest))
+
+
+def current():
+    """Return the account of the calling greenthread, or None."""
+    return _accounts.get(greenthread.getcurrent())
+
+
+def join(account):
+    """Record the requests of the calling greenthread in account.
+
+    Used by greenthreads spawned on behalf of an accounted operation,
+    e.g. by DeviceFanout. Pass the value returned by leave() to restore.
+    """
+    thread = greenthread.getcurrent()
+    previous = _accounts.get(thread)
+    if account:
+        _accounts[thread] = account
+    return previous
+
+
+def leave(previous=None):
+    thread = greenthread.getcurrent()
+    if previous:
+        _accounts[thread] = previous
+    else:
+        _accounts.pop(thread, None)
+
+
+def begin(name):
+    """Start recording the requests of the calling greenthread.
+
+    A nested operation is recorded in the account of the outer one.
+
+    :returns: token to pass to end() when the operation is over.
+    """
+    if current():
+        return None
+    account = RestAccount(name)
+    join(account)
+    return account
+
+
+def end(token):
+    """Stop recording and log the summary of the requests."""
+    if token is None:
+        return
+    leave()
+    if token.calls:
+        LOG.debug(token.summary())
+
+
+class SlowCallLog(object):
+    """Log a sample of the requests taking threshold seconds or more."""
+
+    def __init__(self, threshold=1.0, sample_rate=1.0):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+
+    def check(self, hostname, method, template, status, seconds):
+        if not self.threshold or seconds < self.threshold:
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        LOG.warning("Slow REST call to %s: %s %s %s took %.3f secs" %
+                    (hostname, method, template, status, seconds))
+
+
+def instrument(bigip, slow_calls=None):
+    """Account for every REST request sent to bigip.
+
+    Each request is counted in the REST metrics, recorded in the account
+    of the greenthread sending it, if any, and checked by slow_calls.
+    """
+    session = bigip._meta_data['icr_session'].session
+    if getattr(session, 'f5_accounting_hook', False):
+        return
+    hostname = bigip.hostname
+    send = session.request
+
+    def request(method, url, **kwargs):
+        method = method.upper()
+        start_time = time.time()
+        status = None
+        size = 0
+        try:
+            response = send(method, url, **kwargs)
+            status = response.status_code
+            size = len(response.content or '')
+            return response
+        finally:
+            seconds = time.time() - start_time
+            resource = metrics.resource_type(url)
+            metrics.REST_REQUESTS.inc(device=hostname, resource=resource,
+                                      method=method)
+            metrics.REST_REQUEST_SECONDS.observe(
+                seconds, resource=resource, method=method)
+            template = uri_template(url)
+            account = current()
+            if account:
+                account.record(method, template, status, size, seconds)
+            if slow_calls:
+                slow_calls.check(hostname, method, template, status, seconds)
+
+    session.request = request
+    session.f5_accounting_hook = True
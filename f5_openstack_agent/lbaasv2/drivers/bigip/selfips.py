@@ -25,7 +25,6 @@ from f5_openstack_agent.lbaasv2.drivers.bigip.resource_helper \
     import BigIPResourceHelper
 from f5_openstack_agent.lbaasv2.drivers.bigip.resource_helper \
     import ResourceType
-from f5_openstack_agent.lbaasv2.drivers.bigip.utils import get_filter
 from requests import HTTPError
 
 LOG = logging.getLogger(__name__)
@@ -326,40 +325,10 @@ class BigipSelfIpManager(object):
 
         return selfip_addr
 
-    def get_selfips(self, bigip, partition=const.DEFAULT_PARTITION,
-                    vlan_name=None):
-        selfips_list = []
-
-        if vlan_name:
-            if not vlan_name.startswith('/'):
-                vlan_name = "/%s/%s" % (partition, vlan_name)
-
-        params = {'params': get_filter(bigip, 'partition', 'eq', partition)}
-        try:
-            selfips_list = [selfip for selfip in
-                            bigip.tm.net.selfips.get_collection(
-                                requests_params=params
-                            )
-                            if vlan_name == selfip.vlan or not vlan_name]
-        except HTTPError as err:
-            LOG.exception("Error getting selfips for vlan(%s). "
-                          "Response status code: %s. "
-                          "Response message: %s." % (
-                              vlan_name,
-                              err.response.status_code,
-                              err.message))
-            raise f5_ex.SelfIPQueryException(
-                "Failed to get selfips assigned to vlan")
-
-        return selfips_list
-
     def delete_selfip(self, bigip, name, partition=const.DEFAULT_PARTITION):
         """Delete the selfip if it exists."""
         try:
-            s = bigip.tm.net.selfips.selfip
-            if s.exists(name=name, partition=partition):
-                obj = s.load(name=name, partition=partition)
-                obj.delete()
+            self.selfip_manager.delete(bigip, name=name, partition=partition)
         except HTTPError as err:
             LOG.exception("Error deleting selfip %s. "
                           "Response status code: %s. Response "
@@ -0,0 +1,234 @@
+# coding=utf-8
+"""Per-loadbalancer scheduling of driver requests."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import collections
+from time import time
+import uuid
+
+from eventlet import event
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Number of dispatched requests used to compute the reported wait times.
+WAIT_SAMPLE_SIZE = 100
+
+
+class ServiceRequest(object):
+    """A driver request waiting for its turn in the service queue."""
+
+    def __init__(self, method_name, service=None, coalesce=False):
+        self.request_id = uuid.uuid4()
+        self.method_name = method_name
+        self.service = service
+        self.coalesce = coalesce
+        self.loadbalancer_id = None
+        self.tenant_id = None
+        if service and service.get('loadbalancer'):
+            self.loadbalancer_id = service['loadbalancer'].get('id')
+            self.tenant_id = service['loadbalancer'].get('tenant_id')
+        self.enqueue_time = time()
+        self.start_time = None
+        # Requests merged into this one, and the request this one was
+        # merged into.
+        self.followers = []
+        self.leader = None
+        self.ready = event.Event()
+
+    @property
+    def is_global(self):
+        """Requests not bound to a loadbalancer need exclusive access."""
+        return self.loadbalancer_id is None
+
+    @property
+    def started(self):
+        return self.start_time is not None
+
+    def wait(self):
+        """Block the calling greenthread until the request may run.
+
+        If the request was merged into another one, return the result
+        (or raise the exception) of that request instead.
+        """
+        return self.ready.wait()
+
+
+class ServiceQueue(object):
+    """Schedule driver requests with one FIFO per loadbalancer.
+
+    Requests for the same loadbalancer run in arrival order, one at a
+    time. Requests for different loadbalancers may run at the same time,
+    up to max_concurrent, as long as they belong to different tenants
+    (tenants share folders, route domains and networks on the BIG-IP®).
+    Requests which are not bound to a loadbalancer, e.g. remove_orphans,
+    run alone.
+
+    Waiting greenthreads block on an event which is sent when the
+    request is dispatched, rather than polling the queue.
+
+    Requests created with coalesce=True only run a full service pass
+    for the service definition they carry. When such a request is
+    dispatched, the coalescing requests queued right behind it for the
+    same loadbalancer are merged into it: it runs once with the newest
+    service definition and the merged requests complete with its result.
+
+    NOTE: The queue state is shared by all greenthreads. None of the
+    methods which alter it do I/O or call monkey-patched code, so they
+    are never preempted by another greenthread. Keep it that way; in
+    particular, DO NOT add logging to enqueue, complete or _dispatch.
+    """
+
+    def __init__(self, max_concurrent=1):
+        self.max_concurrent = max_concurrent
+        # loadbalancer id (None for global requests) -> deque of requests.
+        # Ordered so that loadbalancers are served round robin.
+        self._queues = collections.OrderedDict()
+        self._running = {}
+        self._running_tenants = collections.defaultdict(int)
+        self._waits = collections.deque(maxlen=WAIT_SAMPLE_SIZE)
+
+    def __len__(self):
+        """Return the number of waiting and running requests."""
+        return sum(1 + len(request.followers)
+                   for request in self._running.values()) + sum(
+            len(queue) for queue in self._queues.values())
+
+    def enqueue(self, method_name, service=None, coalesce=False):
+        """Add a request to the queue of its loadbalancer.
+
+        :param method_name: Name of the driver method being scheduled.
+        :param service: Service definition the method was called with.
+        :param coalesce: Whether the request may be merged with other
+        coalescing requests for the same loadbalancer.
+        :returns: ServiceRequest to wait on, then pass to complete().
+        """
+        request = ServiceRequest(method_name, service, coalesce)
+        loadbalancer_id = request.loadbalancer_id
+        if loadbalancer_id not in self._queues:
+            self._queues[loadbalancer_id] = collections.deque()
+        self._queues[loadbalancer_id].append(request)
+        self._dispatch()
+        return request
+
+    def complete(self, request, result=None, error=None):
+        """Remove a finished (or abandoned) request and wake up the next.
+
+        Requests merged into the finished one are completed with its
+        result, or with its error if it failed.
+        """
+        if request.request_id in self._running:
+            del self._running[request.request_id]
+            if request.tenant_id is not None:
+                self._running_tenants[request.tenant_id] -= 1
+                if not self._running_tenants[request.tenant_id]:
+                    del self._running_tenants[request.tenant_id]
+            for follower in request.followers:
+                if error is not None:
+                    follower.ready.send_exception(error)
+                else:
+                    follower.ready.send(result)
+        else:
+            queue = self._queues.get(request.loadbalancer_id)
+            if queue and request in queue:
+                queue.remove(request)
+                if not queue:
+                    del self._queues[request.loadbalancer_id]
+        self._dispatch()
+
+    def get_loadbalancer_stats(self):
+        """Return the queue depth and wait time of each loadbalancer."""
+        now = time()
+        loadbalancer_queues = {}
+        for loadbalancer_id, queue in self._queues.items():
+            loadbalancer_queues[loadbalancer_id or 'global'] = {
+                'depth': len(queue),
+                'wait': round(now - queue[0].enqueue_time, 3)
+            }
+        for request in self._running.values():
+            entry = loadbalancer_queues.setdefault(
+                request.loadbalancer_id or 'global', {'depth': 0, 'wait': 0})
+            entry['depth'] += 1 + len(request.followers)
+        return loadbalancer_queues
+
+    def get_stats(self):
+        """Return the aggregate queue depth and wait time metrics.
+
+        These are reported with the agent state, so they do not grow
+        with the number of loadbalancers.
+        """
+        loadbalancer_queues = self.get_loadbalancer_stats()
+        max_wait = max(
+            [queue['wait'] for queue in loadbalancer_queues.values()] +
+            list(self._waits) + [0])
+        avg_wait = 0
+        if self._waits:
+            avg_wait = sum(self._waits) / len(self._waits)
+
+        return {'request_queue_depth': len(self),
+                'request_queue_running': len(self._running),
+                'request_queue_max_wait': round(max_wait, 3),
+                'request_queue_avg_wait': round(avg_wait, 3)}
+
+    def _dispatch(self):
+        # Start as many waiting requests as the limits allow.
+        while len(self._running) < max(1, self.max_concurrent):
+            request = self._next_request()
+            if not request:
+                return
+            self._start(request)
+
+    def _next_request(self):
+        # Return the first queue head which is allowed to run now.
+        global_running = any(
+            request.is_global for request in self._running.values())
+        if global_running:
+            return None
+
+        running_lbs = set(
+            request.loadbalancer_id for request in self._running.values())
+        for loadbalancer_id, queue in self._queues.items():
+            if loadbalancer_id in running_lbs:
+                continue
+            request = queue[0]
+            if request.is_global:
+                # Nothing may overtake a waiting global request.
+                return None if self._running else request
+            if request.tenant_id in self._running_tenants:
+                continue
+            return request
+        return None
+
+    def _start(self, request):
+        queue = self._queues.pop(request.loadbalancer_id)
+        queue.popleft()
+        request.start_time = time()
+        if request.coalesce:
+            while queue and queue[0].coalesce:
+                follower = queue.popleft()
+                follower.leader = request
+                self._waits.append(request.start_time - follower.enqueue_time)
+                request.followers.append(follower)
+                request.service = follower.service
+        if queue:
+            # Move to the back so other loadbalancers get their turn.
+            self._queues[request.loadbalancer_id] = queue
+
+        self._waits.append(request.start_time - request.enqueue_time)
+        self._running[request.request_id] = request
+        if request.tenant_id is not None:
+            self._running_tenants[request.tenant_id] += 1
+        request.ready.send()
@@ -82,4 +82,5 @@ class SSLProfileHelper(object):
     def get_client_ssl_profile_count(bigip):
         return len(
             bigip.tm.ltm.profile.client_ssls.get_collection(
-                partition='Common'))
+                partition='Common',
+                requests_params={'params': '$select=name'}))
@@ -13,224 +13,100 @@
 # limitations under the License.
 #
 
+import collections
 import re
 
-
 from oslo_log import log as logging
 
 LOG = logging.getLogger(__name__)
 
+# Current values of the global statistics used as capacity metrics, and
+# the start of the period they are measured over.
+GlobalStatistics = collections.namedtuple(
+    'GlobalStatistics', ['active_connections', 'ssl_tps', 'throughput_in',
+                         'throughput_out', 'since'])
+
+# Table header of sys performance all-stats -> {row label: field}
+GLOBAL_STATISTICS_TABLE = {
+    'Active Connections': {'Connections': 'active_connections'},
+    'SSL Transactions': {'SSL TPS': 'ssl_tps'},
+    'Throughput(bits)': {'In': 'throughput_in', 'Out': 'throughput_out'},
+}
+
+# e.g. 'Throughput(bits)(bits/sec)  Current  Average  Max(since <time>)'
+HEADER_PATTERN = re.compile(r'(?P<header>\S.*?)\s{2,}Current\s+Average\s+'
+                            r'Max\(since (?P<since>[^)]*)')
+# e.g. 'In                               16995    14108    52077'
+ROW_PATTERN = re.compile(r'(?P<label>\S.*?)\s{2,}(?P<current>\S+)\s')
+
+
+def _header_fields(header):
+    for table_header, fields in GLOBAL_STATISTICS_TABLE.items():
+        if header.startswith(table_header):
+            return fields
+    return None
+
+
+def parse_global_statistics(raw_values):
+    """Read the capacity metrics from the text of all-stats.
+
+    Lines are read one at a time until all of the metrics have been
+    found. Values which are not integers, like nan, are read as 0.
+    """
+    values = dict.fromkeys(GlobalStatistics._fields, 0)
+    values['since'] = None
+    missing = sum(len(fields) for fields in GLOBAL_STATISTICS_TABLE.values())
+    fields = None
+    for line in raw_values.splitlines():
+        header = HEADER_PATTERN.match(line)
+        if header:
+            fields = _header_fields(header.group('header'))
+            values['since'] = header.group('since')
+            continue
+        if not fields:
+            continue
+        row = ROW_PATTERN.match(line)
+        if row and row.group('label') in fields:
+            try:
+                value = int(row.group('current'))
+            except ValueError:
+                value = 0
+            values[fields[row.group('label')]] = value
+            missing -= 1
+            if not missing:
+                break
+    return GlobalStatistics(**values)
+
 
 class StatHelper(object):
     def get_global_statistics(self, bigip):
         allstats = bigip.tm.sys.performances.all_stats.load().__dict__
         if 'apiRawValues' in allstats:
-            sr = {
-                'Sys::Performance System': {
-                    'System CPU Usage': {
-                        'Utilization': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        }
-                    },
-                    'Memory Used': {
-                        'TMM Memory Used': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        },
-                        'Other Memory Used': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        },
-                        'Swap Memory Used': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        }
-                    }
-                },
-                'Sys::Performance Connections': {
-                    'Active Connections': {
-                        'Connections': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        }
-                    },
-                    'Total New Connections': {
-                        'Client Connections': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        },
-                        'Server Connections': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        }
-                    },
-                    'HTTP Requests': {
-                        'HTTP Requests': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        }
-                    }
-                },
-                'Sys::Performance Throughput': {
-                    'Throughput(bits)': {
-                        'In': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        },
-                        'Out': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        }
-                    },
-                    'SSL Transactions': {
-                        'SSL TPS': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        }
-                    },
-                    'Throughput(packets)': {
-                        'In': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        },
-                        'Out': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        }
-                    }
-                },
-                'Sys::Performance Ramcache': {
-                    'RAM Cache Utilization': {
-                        'Hit Rate': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        },
-                        'Byte Rate': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        },
-                        'Eviction Rate': {
-                            'current': 0,
-                            'average': 0,
-                            'max': 0
-                        }
-                    }
-                }
-            }
-            stats_display = allstats['apiRawValues']['apiAnonymous']
-            lines = str(stats_display).split('\n')
-            sec = None
-            div = None
-            since = None
-            for line in lines:
-                if len(line) > 2:
-                    for this_section in sr.keys():
-                        if str(line).startswith(this_section):
-                            if sec:
-                                if not (sec == this_section):
-                                    sec = this_section
-                                    div = None
-                            else:
-                                sec = this_section
-                    if sec:
-                        for division in sr[sec].keys():
-                            if str(line).startswith(division):
-                                try:
-                                    since_idx = line.index('since')
-                                    end_since_idx = line.index(')',
-                                                               since_idx)
-                                    since = line[since_idx + 6:end_since_idx]
-                                except ValueError:
-                                    pass
-                                div = division
-                    if div:
-                        for fields in sr[sec][div].keys():
-                            for field in fields:
-                                if str(line).startswith(field):
-                                    values = re.split(r'\s{2,}', line)
-                                    if len(values) == 4:
-                                        if values[0] in fields:
-                                            value = values[0]
-                                            vdict = sr[sec][div][value]
-                                            value_set = (
-                                                (1, 'current'),
-                                                (2, 'average'),
-                                                (3, 'max'),
-                                            )
-                                            for i, k in value_set:
-                                                try:
-                                                    vdict[k] = int(values[i])
-                                                except ValueError:
-                                                    vdict[k] = 0
-                                                    pass
-                                            sr[sec][div][values[0]] = vdict
-            sr['since'] = since
-            return sr
+            return parse_global_statistics(
+                str(allstats['apiRawValues']['apiAnonymous']))
         return None
 
     def get_active_connection_count(self, bigip, global_stats=None):
         if not global_stats:
             global_stats = self.get_global_statistics(bigip)
-        return int(
-            global_stats['Sys::Performance Connections'][
-                'Active Connections'][
-                'Connections']['current']
-        )
+        return global_stats.active_connections
 
     def get_active_SSL_TPS(self, bigip, global_stats=None):
         if not global_stats:
             global_stats = self.get_global_statistics(bigip)
-        return int(
-            global_stats['Sys::Performance Throughput'][
-                'SSL Transactions'][
-                'SSL TPS']['current']
-        )
+        return global_stats.ssl_tps
 
     def get_inbound_throughput(self, bigip, global_stats=None):
         if not global_stats:
             global_stats = self.get_global_statistics(bigip)
-        return int(
-            global_stats['Sys::Performance Throughput']
-            ['Throughput(bits)']
-            ['In']['current']
-        )
+        return global_stats.throughput_in
 
     def get_outbound_throughput(self, bigip, global_stats=None):
         if not global_stats:
             global_stats = self.get_global_statistics(bigip)
-        return int(
-            global_stats['Sys::Performance Throughput']
-            ['Throughput(bits)']
-            ['Out']['current']
-        )
+        return global_stats.throughput_out
 
     def get_throughput(self, bigip, global_stats=None):
         if not global_stats:
             global_stats = self.get_global_statistics(bigip)
-        inbound = int(
-            global_stats['Sys::Performance Throughput']
-            ['Throughput(bits)']
-            ['In']['current']
-        )
-        outbound = int(
-            global_stats['Sys::Performance Throughput']
-            ['Throughput(bits)']
-            ['Out']['current']
-        )
-        return inbound + outbound
+        return global_stats.throughput_in + global_stats.throughput_out
@@ -0,0 +1,155 @@
+# coding=utf-8
+"""Agent state which is kept across restarts in a local file."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import hashlib
+import json
+import os
+
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Version of the format written by StateStore.save.
+STATE_FILE_VERSION = 1
+
+# Collections of the objects whose existence the device state records:
+# the networks, route domains, selfips and SNAT objects of all tenants.
+MARKER_COLLECTIONS = (
+    lambda bigip: bigip.tm.net.route_domains,
+    lambda bigip: bigip.tm.net.vlans,
+    lambda bigip: bigip.tm.net.tunnels.tunnels,
+    lambda bigip: bigip.tm.net.selfips,
+    lambda bigip: bigip.tm.ltm.snatpools,
+    lambda bigip: bigip.tm.ltm.snat_translations,
+)
+
+# Collections of the objects the periodic service check looks for.
+DEPLOYED_COLLECTIONS = (
+    lambda bigip: bigip.tm.sys.folders,
+    lambda bigip: bigip.tm.ltm.virtuals,
+    lambda bigip: bigip.tm.ltm.pools,
+)
+
+
+def _get_paths(bigip, collections):
+    paths = []
+    for collection in collections:
+        for item in collection(bigip).get_collection(
+                requests_params={'params': '$select=fullPath'}):
+            paths.append(item['fullPath'])
+    return paths
+
+
+def get_config_marker(bigip):
+    u"""Return a digest of the network objects on a BIG-IP®.
+
+    The marker changes whenever one of these objects is created or
+    deleted, on the device or by another client. Only the object paths
+    are read, with one request per collection, and come back as dicts.
+    """
+    paths = _get_paths(bigip, MARKER_COLLECTIONS)
+    return hashlib.sha1('\n'.join(sorted(paths))).hexdigest()
+
+
+def get_deployed_paths(bigip):
+    u"""Return the paths of the folders, virtual servers and pools.
+
+    Only /, /Common and objects in it are left on a BIG-IP® which was
+    replaced or reset.
+    """
+    return set(_get_paths(bigip, DEPLOYED_COLLECTIONS))
+
+
+class StateStore(object):
+    """Agent state kept in one JSON file, e.g. under $state_path.
+
+    The state of each BIG-IP® is stored along with the config marker of
+    the device at the time it was saved, so it can be checked against
+    the current marker of the device before it is used again. Other
+    state is stored under a key.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # hostname -> {'marker': config marker, 'state': device state}
+        self._devices = {}
+        # key -> state
+        self._state = {}
+        self.dirty = False
+
+    def load(self):
+        """Read the state file, if there is a usable one."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path) as state_file:
+                data = json.load(state_file)
+            if data.get('version') != STATE_FILE_VERSION:
+                LOG.info("Ignoring agent state %s of version %s" %
+                         (self.path, data.get('version')))
+                return False
+            self._devices = data['devices']
+            self._state = data['state']
+        except (IOError, OSError, ValueError, KeyError, TypeError) as err:
+            LOG.error("Failed to load agent state from %s: %s" %
+                      (self.path, err))
+            return False
+        self.dirty = False
+        return True
+
+    def save(self):
+        """Write the state file."""
+        data = {'version': STATE_FILE_VERSION,
+                'devices': self._devices,
+                'state': self._state}
+        # Write a new file and rename it, so the file is never left half
+        # written.
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w') as state_file:
+                json.dump(data, state_file)
+            os.rename(temp_path, self.path)
+        except (IOError, OSError) as err:
+            LOG.error("Failed to save agent state to %s: %s" %
+                      (self.path, err))
+            return
+        self.dirty = False
+
+    def get(self, key, default=None):
+        return self._state.get(key, default)
+
+    def put(self, key, value):
+        if self._state.get(key) != value:
+            self._state[key] = value
+            self.dirty = True
+
+    def get_device(self, hostname):
+        """Return (config marker, state) of a device, or (None, None)."""
+        device = self._devices.get(hostname)
+        if device is None:
+            return None, None
+        return device['marker'], device['state']
+
+    def put_device(self, hostname, marker, state):
+        device = {'marker': marker, 'state': state}
+        if self._devices.get(hostname) != device:
+            self._devices[hostname] = device
+            self.dirty = True
+
+    def forget_device(self, hostname):
+        if self._devices.pop(hostname, None) is not None:
+            self.dirty = True
@@ -0,0 +1,199 @@
+# coding=utf-8
+"""Collect statistics of BIG-IP® tenant partitions in the background."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import time
+
+import eventlet
+from oslo_log import log as logging
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.device_fanout import \
+    DeviceFanout
+from f5_openstack_agent.lbaasv2.drivers.bigip.utils import get_filter
+
+LOG = logging.getLogger(__name__)
+
+# Collection intervals after which a partition nobody asked about is no
+# longer collected.
+IDLE_INTERVALS = 3
+
+# Statistics of virtual servers (client side) and pools (server side),
+# as bits and connection counters.
+VIRTUAL_COUNTERS = (('bytes_in', 'clientside.bitsIn'),
+                    ('bytes_out', 'clientside.bitsOut'),
+                    ('active_connections', 'clientside.curConns'),
+                    ('total_connections', 'clientside.totConns'))
+POOL_COUNTERS = (('bytes_in', 'serverside.bitsIn'),
+                 ('bytes_out', 'serverside.bitsOut'),
+                 ('active_connections', 'serverside.curConns'),
+                 ('total_connections', 'serverside.totConns'))
+
+
+def _nested_entries(stats):
+    return stats.get('nestedStats', {}).get('entries', {})
+
+
+def _counters(entries, counters):
+    values = {}
+    for key, name in counters:
+        value = entries.get(name, {}).get('value', 0)
+        if name.endswith('bitsIn') or name.endswith('bitsOut'):
+            value //= 8
+        values[key] = value
+    return values
+
+
+def _member_state(entries):
+    # Monitor state of a pool member, as reported by iControl® SOAP,
+    # e.g. up ==> MONITOR_STATUS_UP
+    state = entries.get('monitorStatus', {}).get('description', 'unknown')
+    return {'addr': entries.get('addr', {}).get('description', ''),
+            'port': entries.get('port', {}).get('value', 0),
+            'state': 'MONITOR_STATUS_' + state.upper().replace('-', '_')}
+
+
+class StatsCollector(object):
+    """Statistics of tenant partitions, refreshed on a schedule of their own.
+
+    Each collection reads the statistics of all virtual servers and
+    pools, with their members, in a partition with one request per
+    collection and device, for all devices in parallel. Callers are
+    answered from the last collection, so asking for statistics costs
+    no device requests once a partition is being collected.
+
+    A partition is collected from the first time it is asked about
+    until it has not been asked about for IDLE_INTERVALS intervals.
+    """
+
+    def __init__(self, get_bigips, device_fanout=None, interval=60):
+        self.get_bigips = get_bigips
+        self.device_fanout = device_fanout or DeviceFanout()
+        self.interval = interval
+        # partition -> time last asked about
+        self._partitions = {}
+        # partition -> {hostname: {'virtuals': {path: counters},
+        #                          'pools': {path: counters}}}
+        self._stats = {}
+        self._collector = None
+
+    def get_partition_stats(self, partition):
+        """Return the last statistics of partition on each device.
+
+        :returns: list of {'virtuals': {path: counters},
+        'pools': {path: counters}}, one per device, where the counters
+        of a pool include the monitor states of its members.
+        """
+        self._partitions[partition] = time.time()
+        if partition not in self._stats:
+            self.collect([partition])
+        if self._collector is None:
+            self._collector = eventlet.spawn(self._run)
+        return self._stats.get(partition, {}).values()
+
+    def forget(self, partition):
+        self._partitions.pop(partition, None)
+        self._stats.pop(partition, None)
+
+    def collect(self, partitions=None):
+        """Read the statistics of partitions from all devices."""
+        if partitions is None:
+            partitions = list(self._partitions)
+        bigips = list(self.get_bigips())
+        if not partitions or not bigips:
+            return
+        results = self.device_fanout.run(
+            bigips, self._collect_device, partitions)
+        for partition in partitions:
+            previous = self._stats.get(partition, {})
+            stats = {}
+            for bigip, device_stats in zip(bigips, results):
+                if partition in device_stats:
+                    stats[bigip.hostname] = device_stats[partition]
+                elif bigip.hostname in previous:
+                    stats[bigip.hostname] = previous[bigip.hostname]
+            if stats:
+                self._stats[partition] = stats
+
+    def _run(self):
+        try:
+            while self._partitions:
+                eventlet.sleep(self.interval)
+                idle_since = time.time() - self.interval * IDLE_INTERVALS
+                for partition, asked in self._partitions.items():
+                    if asked < idle_since:
+                        self.forget(partition)
+                try:
+                    self.collect()
+                except Exception as exc:
+                    LOG.error("Failed to collect statistics: %s" % exc)
+        finally:
+            self._collector = None
+
+    def _collect_device(self, bigip, partitions):
+        # Errors only lose the partitions they happen in, which keep
+        # their statistics of the previous collection.
+        device_stats = {}
+        for partition in partitions:
+            try:
+                device_stats[partition] = {
+                    'virtuals': self._get_virtual_stats(bigip, partition),
+                    'pools': self._get_pool_stats(bigip, partition)}
+            except Exception as exc:
+                LOG.error("Failed to collect statistics of %s on %s: %s" %
+                          (partition, bigip.hostname, exc))
+        return device_stats
+
+    def _get_virtual_stats(self, bigip, partition):
+        virtuals = {}
+        for path, entries in self._get_stats(bigip, 'virtual', partition):
+            virtuals[path] = _counters(entries, VIRTUAL_COUNTERS)
+        return virtuals
+
+    def _get_pool_stats(self, bigip, partition):
+        pools = {}
+        for path, entries in self._get_stats(bigip, 'pool', partition,
+                                             expand=True):
+            pool = _counters(entries, POOL_COUNTERS)
+            pool['members'] = []
+            for key, value in entries.items():
+                if key.endswith('/members/stats'):
+                    pool['members'] = [
+                        _member_state(_nested_entries(member))
+                        for member in _nested_entries(value).values()]
+            pools[path] = pool
+        return pools
+
+    def _get_stats(self, bigip, collection, partition, expand=False):
+        # (full path, stats entries) of the objects of a partition, read
+        # with one request
+        params = get_filter(bigip, 'partition', 'eq', partition)
+        if expand:
+            if isinstance(params, dict):
+                params['expandSubcollections'] = 'true'
+            else:
+                params += '&expandSubcollections=true'
+        session = bigip._meta_data['icr_session'].session
+        response = session.get(
+            '%stm/ltm/%s/stats' % (bigip._meta_data['uri'], collection),
+            params=params)
+        response.raise_for_status()
+        prefix = '/%s/' % partition
+        for stats in response.json().get('entries', {}).values():
+            entries = _nested_entries(stats)
+            path = entries.get('tmName', {}).get('description', '')
+            # The filter is not applied to statistics by all versions.
+            if path.startswith(prefix):
+                yield path, entries
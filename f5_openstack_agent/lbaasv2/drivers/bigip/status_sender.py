@@ -0,0 +1,151 @@
+# coding=utf-8
+"""Send status updates to Neutron apart from BIG-IP® provisioning."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import collections
+
+import eventlet
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Seconds to wait before sending a failed update again, times the
+# number of failures so far.
+RETRY_INTERVAL = 2
+
+# Sends of an update before it is given up.
+MAX_ATTEMPTS = 3
+
+
+class StatusSender(object):
+    """Queue of status updates, sent by a greenthread of its own.
+
+    Updates are queued per loadbalancer as StatusBatch statuses. Only
+    the latest status of an object is kept: a newer update replaces a
+    queued one and moves to the end, so the loadbalancer status, which
+    comes last in a batch, is still sent last. A failed update is queued
+    again after a while, unless a newer one was queued in the meantime;
+    the sender goes on with the other updates until then.
+
+    At most max_statuses updates are queued. When more arrive, the
+    updates of the loadbalancer waiting longest are dropped; the
+    periodic resync refreshes loadbalancers left pending.
+    """
+
+    def __init__(self, plugin_rpc=None, max_statuses=10000):
+        self.plugin_rpc = plugin_rpc
+        self.max_statuses = max_statuses
+        # loadbalancer id ->
+        # OrderedDict((object type, object id) -> status)
+        self._pending = collections.OrderedDict()
+        # loadbalancer id -> failed attempts of its queued updates
+        self._attempts = {}
+        # loadbalancer id -> failed updates waiting to be queued again
+        self._retrying = {}
+        self._size = 0
+        self._sender = None
+        self.dropped = 0
+
+    def __len__(self):
+        return self._size
+
+    def send(self, batch):
+        """Queue the statuses of a StatusBatch, without waiting."""
+        statuses = batch.statuses
+        batch.statuses = []
+        if not statuses:
+            return
+        self._queue(batch.loadbalancer_id, statuses)
+        while self._size > self.max_statuses and len(self._pending) > 1:
+            loadbalancer_id, dropped = self._pending.popitem(last=False)
+            self._attempts.pop(loadbalancer_id, None)
+            self._size -= len(dropped)
+            self.dropped += len(dropped)
+            LOG.error("Status queue full, dropped %d status updates of "
+                      "loadbalancer %s" % (len(dropped), loadbalancer_id))
+        self._start_sender()
+
+    def get_stats(self):
+        """Return the backlog of the queue."""
+        return {'status_queue_depth': self._size,
+                'status_queue_loadbalancers': len(self._pending),
+                'status_queue_retrying': sum(
+                    len(failed) for failed in self._retrying.values()),
+                'status_queue_dropped': self.dropped}
+
+    def _start_sender(self):
+        if self._sender is None:
+            self._sender = eventlet.spawn(self._send_pending)
+
+    def _queue(self, loadbalancer_id, statuses):
+        queued = self._pending.pop(
+            loadbalancer_id, collections.OrderedDict())
+        self._size -= len(queued)
+        # Newer updates replace failed ones waiting to be retried.
+        failed = self._retrying.get(loadbalancer_id, {})
+        for status in statuses:
+            key = (status['type'], status['id'])
+            queued.pop(key, None)
+            failed.pop(key, None)
+            queued[key] = status
+        self._pending[loadbalancer_id] = queued
+        self._size += len(queued)
+
+    def _send_pending(self):
+        try:
+            while self._pending:
+                loadbalancer_id, queued = self._pending.popitem(last=False)
+                self._size -= len(queued)
+                try:
+                    self.plugin_rpc.update_statuses(
+                        loadbalancer_id, queued.values())
+                    self._attempts.pop(loadbalancer_id, None)
+                except Exception as exc:
+                    self._retry(loadbalancer_id, queued, exc)
+        finally:
+            self._sender = None
+
+    def _retry(self, loadbalancer_id, queued, exc):
+        attempts = self._attempts.get(loadbalancer_id, 0) + 1
+        if attempts >= MAX_ATTEMPTS:
+            self._attempts.pop(loadbalancer_id, None)
+            self.dropped += len(queued)
+            LOG.error("Giving up status updates of loadbalancer %s: %s" %
+                      (loadbalancer_id, exc))
+            return
+        LOG.warning("Failed to send status updates of loadbalancer %s, "
+                    "retrying: %s" % (loadbalancer_id, exc))
+        self._attempts[loadbalancer_id] = attempts
+        # Updates queued while these were being sent are newer.
+        newer = self._pending.get(loadbalancer_id, {})
+        for key in newer:
+            queued.pop(key, None)
+        self._retrying[loadbalancer_id] = queued
+        eventlet.spawn_after(RETRY_INTERVAL * attempts, self._requeue,
+                             loadbalancer_id)
+
+    def _requeue(self, loadbalancer_id):
+        # Queue failed updates again, ahead of those queued since.
+        failed = self._retrying.pop(loadbalancer_id, None)
+        if not failed:
+            return
+        newer = self._pending.pop(loadbalancer_id, None)
+        if newer:
+            self._size -= len(newer)
+        self._queue(loadbalancer_id, failed.values())
+        if newer:
+            self._queue(loadbalancer_id, newer.values())
+        self._start_sender()
@@ -183,8 +183,9 @@ class SystemHelper(object):
                  folder))
 
     def get_tenant_folder_count(self, bigip):
-        folders = bigip.tm.sys.folders.get_collection()
+        folders = bigip.tm.sys.folders.get_collection(
+            requests_params={'params': '$select=name'})
         # ignore '/' and 'Common'
-        tenants = [item for item in folders if item.name != '/' and
-                   item.name != 'Common']
+        tenants = [item for item in folders if item['name'] != '/' and
+                   item['name'] != 'Common']
         return len(tenants)
@@ -55,48 +55,56 @@ class BigipTenantManager(object):
         # create tenant folder
         folder_name = self.service_adapter.get_folder_name(tenant_id)
         LOG.debug("Creating tenant folder %s" % folder_name)
-        for bigip in self.driver.get_config_bigips():
-            if not self.system_helper.folder_exists(bigip, folder_name):
-                folder = self.service_adapter.get_folder(service)
-                # This folder is a dict config obj, that can be passed to
-                # folder.create in the SDK
-                try:
-                    self.system_helper.create_folder(bigip, folder)
-                except Exception as err:
-                    # XXX Maybe we can make this more specific?
-                    LOG.exception("Error creating folder %s" %
-                                  (folder))
-                    raise f5ex.SystemCreationException(
-                        "Folder creation error for tenant %s" %
-                        (tenant_id))
-
-            if not self.driver.disconnected_service.network_exists(
-                    bigip, folder_name):
-                try:
-                    self.driver.disconnected_service.create_network(
-                        bigip, folder_name)
-                except Exception as err:
-                    LOG.exception("Error creating disconnected network %s." %
-                                  (folder_name))
-                    raise f5ex.SystemCreationException(
-                        "Disconnected network create error for tenant %s" %
-                        (tenant_id))
+        folder = self.service_adapter.get_folder(service)
+        self.driver.device_fanout.run(self.driver.get_config_bigips(),
+                                      self._assure_bigip_tenant_created,
+                                      tenant_id, folder_name, folder)
 
         # create tenant route domain
         if self.conf.use_namespaces:
-            for bigip in self.driver.get_all_bigips():
-                if not self.network_helper.route_domain_exists(bigip,
-                                                               folder_name):
-                    try:
-                        self.network_helper.create_route_domain(
-                            bigip,
-                            folder_name,
-                            self.conf.f5_route_domain_strictness)
-                    except Exception as err:
-                        LOG.exception(err.message)
-                        raise f5ex.RouteDomainCreationException(
-                            "Failed to create route domain for "
-                            "tenant in %s" % (folder_name))
+            self.driver.device_fanout.run(self.driver.get_all_bigips(),
+                                          self._assure_bigip_route_domain,
+                                          folder_name)
+
+    def _assure_bigip_tenant_created(self, bigip, tenant_id, folder_name,
+                                     folder):
+        if not self.system_helper.folder_exists(bigip, folder_name):
+            # This folder is a dict config obj, that can be passed to
+            # folder.create in the SDK
+            try:
+                self.system_helper.create_folder(bigip, folder)
+            except Exception:
+                # XXX Maybe we can make this more specific?
+                LOG.exception("Error creating folder %s" %
+                              (folder))
+                raise f5ex.SystemCreationException(
+                    "Folder creation error for tenant %s" %
+                    (tenant_id))
+
+        if not self.driver.disconnected_service.network_exists(
+                bigip, folder_name):
+            try:
+                self.driver.disconnected_service.create_network(
+                    bigip, folder_name)
+            except Exception:
+                LOG.exception("Error creating disconnected network %s." %
+                              (folder_name))
+                raise f5ex.SystemCreationException(
+                    "Disconnected network create error for tenant %s" %
+                    (tenant_id))
+
+    def _assure_bigip_route_domain(self, bigip, folder_name):
+        if not self.network_helper.route_domain_exists(bigip, folder_name):
+            try:
+                self.network_helper.create_route_domain(
+                    bigip,
+                    folder_name,
+                    self.conf.f5_route_domain_strictness)
+            except Exception as err:
+                LOG.exception(err.message)
+                raise f5ex.RouteDomainCreationException(
+                    "Failed to create route domain for "
+                    "tenant in %s" % (folder_name))
 
     def assure_tenant_cleanup(self, service, all_subnet_hints):
         """Delete tenant partition."""
@@ -0,0 +1,48 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.address_index import \
+    AddressIndex
+
+
+class TestAddressIndex(object):
+    def test_in_subnet(self):
+        index = AddressIndex(['10.1.0.5%2', '10.2.0.5', '10.3.0.5%2'])
+        assert index.in_subnet('10.1.0.0/24', 2)
+        assert not index.in_subnet('10.1.0.0/24', 0)
+        assert not index.in_subnet('10.1.1.0/24', 2)
+        assert index.in_subnet('10.2.0.0/16')
+        assert index.in_subnet('10.3.0.5/32', '2')
+        assert index.in_subnet('10.0.0.0/8', 2)
+
+    def test_subnet_boundaries(self):
+        index = AddressIndex(['10.1.0.0', '10.1.2.255'])
+        assert index.in_subnet('10.1.0.0/24')
+        assert not index.in_subnet('10.1.1.0/24')
+        assert index.in_subnet('10.1.2.0/24')
+        assert not index.in_subnet('10.1.3.0/24')
+
+    def test_ip_versions(self):
+        index = AddressIndex(['2001:db8::5%3', '10.1.0.5%3'])
+        assert index.in_subnet('2001:db8::/64', 3)
+        assert not index.in_subnet('2001:db9::/64', 3)
+        assert not index.in_subnet('0.0.0.0/0', 0)
+        assert index.in_subnet('0.0.0.0/0', 3)
+
+    def test_invalid_addresses_are_ignored(self):
+        index = AddressIndex(['any6', 'server.example.com%2'])
+        assert not index.in_subnet('0.0.0.0/0', 2)
@@ -0,0 +1,51 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mock
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.capacity_sampler import \
+    CapacitySampler
+
+
+def _bigip(hostname):
+    bigip = mock.MagicMock()
+    bigip.hostname = hostname
+    return bigip
+
+
+class TestCapacitySampler(object):
+    def test_one_global_statistics_snapshot(self):
+        stat_helper = mock.MagicMock()
+        sampler = CapacitySampler(stat_helper, ttl=60)
+        bigip = _bigip('bigip1')
+        for metric in ('throughput', 'active_connections', 'ssltps'):
+            sampler.get_metric(bigip, metric,
+                               sampler.get_global_statistics)
+        sampler.get_metric(_bigip('bigip2'), 'throughput',
+                           sampler.get_global_statistics)
+        assert stat_helper.get_global_statistics.call_count == 2
+
+    def test_metrics_are_read_again_when_expired(self):
+        sampler = CapacitySampler(mock.MagicMock(), ttl=60)
+        bigip = _bigip('bigip1')
+        read_metric = mock.MagicMock(side_effect=[10, 20])
+        with mock.patch('time.time', return_value=1000):
+            assert sampler.get_metric(bigip, 'node_count', read_metric) == 10
+        with mock.patch('time.time', return_value=1059):
+            assert sampler.get_metric(bigip, 'node_count', read_metric) == 10
+        with mock.patch('time.time', return_value=1060):
+            assert sampler.get_metric(bigip, 'node_count', read_metric) == 20
+        assert read_metric.call_count == 2
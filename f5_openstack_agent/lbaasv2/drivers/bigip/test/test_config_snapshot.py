@@ -0,0 +1,144 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mock
+import pytest
+
+from f5_openstack_agent.lbaasv2.drivers.bigip import config_snapshot
+from f5_openstack_agent.lbaasv2.drivers.bigip.pool_service import \
+    PoolServiceBuilder
+from f5_openstack_agent.lbaasv2.drivers.bigip.resource_helper import \
+    BigIPResourceHelper
+from f5_openstack_agent.lbaasv2.drivers.bigip.resource_helper import \
+    ResourceType
+
+PARTITION = 'Project_tenant'
+
+
+def _obj(name, **kwargs):
+    obj = mock.MagicMock()
+    obj.name = name
+    for key, value in kwargs.items():
+        setattr(obj, key, value)
+    return obj
+
+
+@pytest.fixture
+def bigip():
+    bigip = mock.MagicMock()
+    bigip.hostname = 'bigip1'
+    bigip.tmos_version = '12.1.0'
+    virtuals = bigip.tm.ltm.virtuals
+    virtuals.get_collection.return_value = [_obj('vs1'), _obj('vs2')]
+    pools = bigip.tm.ltm.pools
+    pools.get_collection.return_value = [
+        _obj('pool1', membersReference={'items': [{'name': '10.0.0.1:80'}]}),
+        _obj('pool2', membersReference={})
+    ]
+    return bigip
+
+
+@pytest.fixture
+def snapshot(bigip):
+    token = config_snapshot.begin([bigip], PARTITION)
+    yield config_snapshot.get_snapshot(bigip, PARTITION)
+    config_snapshot.end(token)
+
+
+class TestConfigSnapshot(object):
+    def test_no_snapshot_outside_pass(self, bigip):
+        helper = BigIPResourceHelper(ResourceType.virtual)
+        helper.exists(bigip, name='vs1', partition=PARTITION)
+        virtual = bigip.tm.ltm.virtuals.virtual
+        virtual.exists.assert_called_once_with(name='vs1',
+                                               partition=PARTITION)
+        assert config_snapshot.get_snapshot(bigip, PARTITION) is None
+
+    def test_common_is_never_snapshotted(self, bigip):
+        token = config_snapshot.begin([bigip], 'Common')
+        assert config_snapshot.get_snapshot(bigip, 'Common') is None
+        config_snapshot.end(token)
+
+    def test_exists_fetches_collection_once(self, bigip, snapshot):
+        helper = BigIPResourceHelper(ResourceType.virtual)
+        assert helper.exists(bigip, name='vs1', partition=PARTITION)
+        assert helper.exists(bigip, name='vs2', partition=PARTITION)
+        assert not helper.exists(bigip, name='vs3', partition=PARTITION)
+        assert bigip.tm.ltm.virtuals.get_collection.call_count == 1
+        assert not bigip.tm.ltm.virtuals.virtual.exists.called
+
+    def test_other_partition_asks_device(self, bigip, snapshot):
+        helper = BigIPResourceHelper(ResourceType.virtual)
+        helper.exists(bigip, name='vs1', partition='Common')
+        assert bigip.tm.ltm.virtuals.virtual.exists.called
+        assert not bigip.tm.ltm.virtuals.get_collection.called
+
+    def test_create_and_update(self, bigip, snapshot):
+        helper = BigIPResourceHelper(ResourceType.virtual)
+        virtual = bigip.tm.ltm.virtuals.virtual
+        cached = helper.load_cached(bigip, name='vs1', partition=PARTITION)
+        helper.create(bigip, {'name': 'vs1', 'partition': PARTITION,
+                              'description': 'new'})
+        cached.modify.assert_called_once_with(description='new')
+        helper.create(bigip, {'name': 'vs3', 'partition': PARTITION})
+        virtual.create.assert_called_once_with(name='vs3',
+                                               partition=PARTITION)
+        assert helper.exists(bigip, name='vs3', partition=PARTITION)
+        assert not virtual.load.called
+        assert not virtual.exists.called
+
+    def test_delete(self, bigip, snapshot):
+        helper = BigIPResourceHelper(ResourceType.virtual)
+        cached = helper.load_cached(bigip, name='vs2', partition=PARTITION)
+        helper.delete(bigip, name='vs2', partition=PARTITION)
+        helper.delete(bigip, name='vs3', partition=PARTITION)
+        cached.delete.assert_called_once_with()
+        assert not helper.exists(bigip, name='vs2', partition=PARTITION)
+
+    def test_load_invalidates(self, bigip, snapshot):
+        helper = BigIPResourceHelper(ResourceType.virtual)
+        helper.load(bigip, name='vs1', partition=PARTITION)
+        helper.exists(bigip, name='vs1', partition=PARTITION)
+        assert bigip.tm.ltm.virtuals.virtual.exists.called
+
+    def test_quoted_names(self, bigip, snapshot):
+        virtuals = bigip.tm.ltm.virtuals
+        virtuals.get_collection.return_value = [_obj('10.0.0.1%2')]
+        helper = BigIPResourceHelper(ResourceType.virtual)
+        assert helper.exists(bigip, name='10.0.0.1%252', partition=PARTITION)
+
+    def test_pool_members(self, bigip, snapshot):
+        builder = PoolServiceBuilder(mock.MagicMock())
+        pool = {'name': 'pool1', 'partition': PARTITION}
+        builder._create_bigip_member(bigip, pool, {'name': '10.0.0.1:80'})
+        builder._create_bigip_member(bigip, pool, {'name': '10.0.0.2:80'})
+        builder._create_bigip_member(bigip, pool, {'name': '10.0.0.2:80'})
+
+        pools = bigip.tm.ltm.pools
+        assert pools.get_collection.call_count == 1
+        assert not pools.pool.load.called
+        members = snapshot.resources(ResourceType.pool)['pool1'].\
+            members_s.members
+        assert not members.exists.called
+        members.create.assert_called_once_with(name='10.0.0.2:80')
+
+    def test_pool_members_of_empty_pool(self, bigip, snapshot):
+        builder = PoolServiceBuilder(mock.MagicMock())
+        pool = {'name': 'pool2', 'partition': PARTITION}
+        builder._create_bigip_member(bigip, pool, {'name': '10.0.0.1:80'})
+        members = snapshot.resources(ResourceType.pool)['pool2'].\
+            members_s.members
+        members.create.assert_called_once_with(name='10.0.0.1:80')
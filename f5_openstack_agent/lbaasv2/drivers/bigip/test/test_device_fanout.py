@@ -0,0 +1,81 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import eventlet
+import mock
+import pytest
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.device_fanout import \
+    DeviceFanout
+
+
+def _bigip(hostname):
+    bigip = mock.MagicMock()
+    bigip.hostname = hostname
+    return bigip
+
+
+class Recorder(object):
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    def __call__(self, bigip, value, fail=()):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        eventlet.sleep(0.01)
+        self.active -= 1
+        if bigip.hostname in fail:
+            raise ValueError(bigip.hostname)
+        return '%s:%s' % (bigip.hostname, value)
+
+
+class TestDeviceFanout(object):
+    def test_results_in_device_order(self):
+        recorder = Recorder()
+        bigips = [_bigip('a'), _bigip('b'), _bigip('c')]
+        results = DeviceFanout().run(bigips, recorder, 1)
+        assert results == ['a:1', 'b:1', 'c:1']
+        assert recorder.max_active == 3
+
+    def test_single_device_runs_inline(self):
+        bigip = _bigip('a')
+        func = mock.Mock(return_value='done')
+        assert DeviceFanout().run([bigip], func, 1, x=2) == ['done']
+        func.assert_called_once_with(bigip, 1, x=2)
+
+    def test_no_devices(self):
+        assert DeviceFanout().run([], mock.Mock()) == []
+
+    def test_first_error_is_raised_after_all_devices(self):
+        recorder = Recorder()
+        bigips = [_bigip('a'), _bigip('b'), _bigip('c')]
+        calls = []
+
+        def func(bigip):
+            calls.append(bigip.hostname)
+            return recorder(bigip, 0, fail=('b', 'c'))
+        with pytest.raises(ValueError) as err:
+            DeviceFanout().run(bigips, func)
+        assert str(err.value) == 'b'
+        assert sorted(calls) == ['a', 'b', 'c']
+
+    def test_limit_per_device(self):
+        recorder = Recorder()
+        fanout = DeviceFanout(max_per_device=1)
+        bigips = [_bigip('a'), _bigip('a')]
+        fanout.run(bigips, recorder, 1)
+        assert recorder.max_active == 1
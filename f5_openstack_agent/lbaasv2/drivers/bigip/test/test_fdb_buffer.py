@@ -0,0 +1,95 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import eventlet
+import mock
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.fdb_buffer import FdbBuffer
+
+NETWORK = 'net1'
+
+
+def _fdb(vtep, *entries):
+    return {NETWORK: {'segment_id': 100, 'network_type': 'vxlan',
+                      'ports': {vtep: [list(entry) for entry in entries]}}}
+
+
+def _ports(fdb):
+    return fdb[NETWORK]['ports'] if fdb else {}
+
+
+class TestFdbBuffer(object):
+    def test_no_window_applies_immediately(self):
+        flush = mock.MagicMock()
+        buffer = FdbBuffer(0, flush)
+        buffer.add(_fdb('10.1.0.1', ('mac1', None)))
+        flush.assert_called_once_with(
+            {NETWORK: {'segment_id': 100, 'network_type': 'vxlan',
+                       'ports': {'10.1.0.1': [['mac1', None]]}}}, {})
+        assert len(buffer) == 0
+
+    def test_events_are_merged(self):
+        flush = mock.MagicMock()
+        buffer = FdbBuffer(60, flush)
+        buffer.add(_fdb('10.1.0.1', ('mac1', None), ('mac2', None)))
+        buffer.add(_fdb('10.1.0.2', ('mac3', None)))
+        buffer.remove(_fdb('10.1.0.1', ('mac4', None)))
+        assert not flush.called
+        buffer.flush()
+        assert flush.call_count == 1
+        add_fdb, remove_fdb = flush.call_args[0]
+        assert _ports(add_fdb) == {'10.1.0.1': [['mac1', None],
+                                                ['mac2', None]],
+                                   '10.1.0.2': [['mac3', None]]}
+        assert _ports(remove_fdb) == {'10.1.0.1': [['mac4', None]]}
+
+    def test_last_change_wins(self):
+        flush = mock.MagicMock()
+        buffer = FdbBuffer(60, flush)
+        buffer.add(_fdb('10.1.0.1', ('mac1', None), ('mac2', None)))
+        buffer.remove(_fdb('10.1.0.1', ('mac1', None)))
+        buffer.remove(_fdb('10.1.0.1', ('mac3', None)))
+        buffer.add(_fdb('10.1.0.2', ('mac3', None)))
+        buffer.flush()
+        add_fdb, remove_fdb = flush.call_args[0]
+        assert _ports(add_fdb) == {'10.1.0.1': [['mac2', None]],
+                                   '10.1.0.2': [['mac3', None]]}
+        assert _ports(remove_fdb) == {'10.1.0.1': [['mac1', None]]}
+
+    def test_flooding_entries_are_per_vtep(self):
+        flush = mock.MagicMock()
+        buffer = FdbBuffer(60, flush)
+        buffer.add(_fdb('10.1.0.1', ('00:00:00:00:00:00', '0.0.0.0')))
+        buffer.add(_fdb('10.1.0.2', ('00:00:00:00:00:00', '0.0.0.0')))
+        assert len(buffer) == 2
+
+    def test_window_flushes_once(self):
+        flush = mock.MagicMock()
+        buffer = FdbBuffer(0.01, flush)
+        for index in range(5):
+            buffer.add(_fdb('10.1.0.1', ('mac%d' % index, None)))
+        eventlet.sleep(0.05)
+        assert flush.call_count == 1
+        assert len(_ports(flush.call_args[0][0])['10.1.0.1']) == 5
+
+    def test_window_flush_error_is_logged(self):
+        flush = mock.MagicMock(side_effect=Exception('failed'))
+        buffer = FdbBuffer(0.01, flush)
+        buffer.add(_fdb('10.1.0.1', ('mac1', None)))
+        eventlet.sleep(0.05)
+        buffer.add(_fdb('10.1.0.1', ('mac2', None)))
+        eventlet.sleep(0.05)
+        assert flush.call_count == 2
@@ -0,0 +1,245 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import eventlet
+import mock
+import pytest
+from requests.exceptions import HTTPError
+
+from f5_openstack_agent.lbaasv2.drivers.bigip import fdb_index
+from f5_openstack_agent.lbaasv2.drivers.bigip.network_helper import \
+    NetworkHelper
+
+TUNNEL = 'tunnel-vxlan-100'
+FOLDER = 'Project_tenant'
+
+
+@pytest.fixture(autouse=True)
+def clean_index():
+    fdb_index._tunnels.clear()
+    yield
+    fdb_index._tunnels.clear()
+
+
+@pytest.fixture
+def tunnel():
+    tunnel = mock.MagicMock()
+    tunnel.records = [{'name': 'fa:16:3e:00:00:01', 'endpoint': '10.1.0.1'},
+                      {'name': 'fa:16:3e:00:00:02', 'endpoint': '10.1.0.2'}]
+    return tunnel
+
+
+@pytest.fixture
+def bigip(tunnel):
+    bigip = mock.MagicMock()
+    bigip.hostname = 'bigip1'
+    bigip.tm.net.fdb.tunnels.tunnel.exists.return_value = True
+    bigip.tm.net.fdb.tunnels.tunnel.load.return_value = tunnel
+    return bigip
+
+
+@pytest.fixture
+def network_helper():
+    nh = NetworkHelper()
+    nh.update_arps = mock.MagicMock()
+    return nh
+
+
+def _entries(records):
+    return {TUNNEL: {'folder': FOLDER, 'records': records}}
+
+
+def _written(tunnel):
+    return tunnel.modify.call_args[1]['records']
+
+
+class TestTunnelRecords(object):
+    def test_add_and_remove(self):
+        records = fdb_index.TunnelRecords(None, [
+            {'name': 'mac1', 'endpoint': '10.1.0.1'}])
+        assert not records.add('mac1', '10.1.0.1')
+        assert records.add('mac1', '10.1.0.9')
+        assert records.add('mac2', '10.1.0.2')
+        assert records.to_list() == [
+            {'name': 'mac1', 'endpoint': '10.1.0.9'},
+            {'name': 'mac2', 'endpoint': '10.1.0.2'}]
+        assert records.remove('mac1')
+        assert not records.remove('mac1')
+        assert records.remove('mac2')
+        assert records.to_list() is None
+
+    def test_forget(self):
+        bigip = mock.MagicMock(hostname='bigip1')
+        other = mock.MagicMock(hostname='bigip2')
+        fdb_index.put(bigip, 't1', FOLDER, mock.MagicMock(records=[]))
+        fdb_index.put(bigip, 't2', FOLDER, mock.MagicMock(records=[]))
+        fdb_index.put(other, 't1', FOLDER, mock.MagicMock(records=[]))
+        fdb_index.forget(bigip, 't1', FOLDER)
+        assert fdb_index.get(bigip, 't1', FOLDER) is None
+        assert fdb_index.get(bigip, 't2', FOLDER) is not None
+        fdb_index.forget(bigip)
+        assert fdb_index.get(bigip, 't2', FOLDER) is None
+        assert fdb_index.get(other, 't1', FOLDER) is not None
+
+
+class TestFdbEntries(object):
+    def test_tunnel_read_once(self, bigip, tunnel, network_helper):
+        for index in range(3, 6):
+            network_helper.add_fdb_entries(bigip, _entries({
+                'fa:16:3e:00:00:0%d' % index: {'endpoint': '10.1.0.3',
+                                               'ip_address': None}}))
+        tunnel_resource = bigip.tm.net.fdb.tunnels.tunnel
+        assert tunnel_resource.load.call_count == 1
+        assert tunnel.modify.call_count == 3
+        assert len(_written(tunnel)) == 5
+
+    def test_concurrent_first_use_reads_tunnel_once(
+            self, bigip, tunnel, network_helper):
+        def load(**kwargs):
+            eventlet.sleep(0)
+            return tunnel
+        tunnel_resource = bigip.tm.net.fdb.tunnels.tunnel
+        tunnel_resource.load.side_effect = load
+        pool = eventlet.GreenPool()
+        for index in range(3, 6):
+            pool.spawn(network_helper.add_fdb_entries, bigip, _entries({
+                'fa:16:3e:00:00:0%d' % index: {'endpoint': '10.1.0.3',
+                                               'ip_address': None}}))
+        pool.waitall()
+        assert tunnel_resource.load.call_count == 1
+        assert len(fdb_index.get(bigip, TUNNEL, FOLDER)) == 5
+
+    def test_put_keeps_indexed_records(self, bigip):
+        records = fdb_index.put(bigip, TUNNEL, FOLDER,
+                                mock.MagicMock(records=[]))
+        records.add('fa:16:3e:00:00:01', '10.1.0.1')
+        assert fdb_index.put(bigip, TUNNEL, FOLDER,
+                             mock.MagicMock(records=[])) is records
+
+    def test_unchanged_records_are_not_written(
+            self, bigip, tunnel, network_helper):
+        assert not network_helper.add_fdb_entries(bigip, _entries({
+            'fa:16:3e:00:00:01': {'endpoint': '10.1.0.1',
+                                  'ip_address': None}}))
+        assert not network_helper.delete_fdb_entries(bigip, fdb_entries=(
+            _entries({'fa:16:3e:00:00:09': {'endpoint': '10.1.0.1',
+                                            'ip_address': '10.0.0.9'}})))
+        assert not tunnel.modify.called
+
+    def test_delete_entries(self, bigip, tunnel, network_helper):
+        assert network_helper.delete_fdb_entries(bigip, fdb_entries=(
+            _entries({'fa:16:3e:00:00:01': {'endpoint': '10.1.0.1',
+                                            'ip_address': '10.0.0.1'}})))
+        assert _written(tunnel) == [
+            {'name': 'fa:16:3e:00:00:02', 'endpoint': '10.1.0.2'}]
+        network_helper.update_arps.assert_called_once_with(
+            bigip, remove=set(['10.0.0.1']), partition=FOLDER)
+
+        network_helper.delete_fdb_entries(bigip, fdb_entries=(
+            _entries({'fa:16:3e:00:00:02': {'endpoint': '10.1.0.2',
+                                            'ip_address': None}})))
+        assert _written(tunnel) is None
+
+    def test_add_entries_creates_arps(self, bigip, tunnel, network_helper):
+        network_helper.add_fdb_entries(bigip, _entries({
+            'fa:16:3e:00:00:01': {'endpoint': '10.1.0.1',
+                                  'ip_address': '10.0.0.1'},
+            'fa:16:3e:00:00:03': {'endpoint': '10.1.0.3',
+                                  'ip_address': '10.0.0.3'}}))
+        assert tunnel.modify.call_count == 1
+        network_helper.update_arps.assert_called_once_with(
+            bigip, add={'10.0.0.1': 'fa:16:3e:00:00:01',
+                        '10.0.0.3': 'fa:16:3e:00:00:03'},
+            partition=FOLDER)
+
+    def test_add_and_delete_entry(self, bigip, tunnel, network_helper):
+        assert network_helper.add_fdb_entry(
+            bigip, TUNNEL, mac_address='fa:16:3e:00:00:02',
+            vtep_ip_address='10.1.0.7', partition=FOLDER)
+        assert _written(tunnel)[1] == {'name': 'fa:16:3e:00:00:02',
+                                       'endpoint': '10.1.0.7'}
+        assert network_helper.delete_fdb_entry(
+            bigip, mac_address='fa:16:3e:00:00:01', tunnel_name=TUNNEL,
+            partition=FOLDER)
+        assert _written(tunnel) == [{'name': 'fa:16:3e:00:00:02',
+                                     'endpoint': '10.1.0.7'}]
+        assert tunnel.modify.call_count == 2
+
+    def test_missing_tunnel(self, bigip, network_helper):
+        bigip.tm.net.fdb.tunnels.tunnel.exists.return_value = False
+        assert not network_helper.add_fdb_entry(
+            bigip, TUNNEL, mac_address='fa:16:3e:00:00:03',
+            vtep_ip_address='10.1.0.3', partition=FOLDER)
+        assert fdb_index.get(bigip, TUNNEL, FOLDER) is None
+
+    def test_write_error_rereads_tunnel(self, bigip, tunnel, network_helper):
+        response = mock.MagicMock(status_code=404)
+        tunnel.modify.side_effect = HTTPError(response=response)
+        assert not network_helper.add_fdb_entries(bigip, _entries({
+            'fa:16:3e:00:00:03': {'endpoint': '10.1.0.3',
+                                  'ip_address': None}}))
+        assert fdb_index.get(bigip, TUNNEL, FOLDER) is None
+
+        tunnel.modify.side_effect = None
+        network_helper.add_fdb_entries(bigip, _entries({
+            'fa:16:3e:00:00:03': {'endpoint': '10.1.0.3',
+                                  'ip_address': None}}))
+        assert bigip.tm.net.fdb.tunnels.tunnel.load.call_count == 2
+
+    def test_any_write_error_forgets_records(
+            self, bigip, tunnel, network_helper):
+        tunnel.modify.side_effect = IOError('connection reset')
+        with pytest.raises(IOError):
+            network_helper.add_fdb_entries(bigip, _entries({
+                'fa:16:3e:00:00:03': {'endpoint': '10.1.0.3',
+                                      'ip_address': None}}))
+        assert fdb_index.get(bigip, TUNNEL, FOLDER) is None
+
+    def test_delete_tunnel_forgets_records(self, bigip, network_helper):
+        network_helper.add_fdb_entries(bigip, _entries({
+            'fa:16:3e:00:00:03': {'endpoint': '10.1.0.3',
+                                  'ip_address': None}}))
+        network_helper.delete_all_fdb_entries(bigip, TUNNEL, FOLDER)
+        assert fdb_index.get(bigip, TUNNEL, FOLDER) is None
+
+
+class TestUpdateArps(object):
+    def _arp(self, ip_address, mac_address):
+        return mock.MagicMock(ipAddress=ip_address, macAddress=mac_address)
+
+    def test_update_arps(self, bigip):
+        unchanged = self._arp('10.0.0.1%2', 'mac1')
+        moved = self._arp('10.0.0.2%2', 'old')
+        removed = self._arp('10.0.0.3%2', 'mac3')
+        bigip.tmos_version = '12.1.0'
+        bigip.tm.net.arps.get_collection.return_value = [
+            unchanged, moved, removed]
+        NetworkHelper().update_arps(
+            bigip, add={'10.0.0.1': 'mac1', '10.0.0.2': 'mac2',
+                        '10.0.0.4': 'mac4'},
+            remove=['10.0.0.3', '10.0.0.5'], partition=FOLDER)
+
+        assert bigip.tm.net.arps.get_collection.call_count == 1
+        assert not unchanged.delete.called
+        assert moved.delete.called
+        assert removed.delete.called
+        created = sorted(call[1]['ip_address'] for call in
+                         bigip.tm.net.arps.arp.create.call_args_list)
+        assert created == ['10.0.0.2', '10.0.0.4']
+
+    def test_nothing_to_do(self, bigip):
+        NetworkHelper().update_arps(bigip, add={}, remove=[])
+        assert not bigip.tm.net.arps.get_collection.called
@@ -0,0 +1,88 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mock
+
+from f5_openstack_agent.lbaasv2.drivers.bigip import metrics
+
+
+class TestRegistry(object):
+    def test_render_counter(self):
+        registry = metrics.Registry()
+        counter = registry.counter('requests_total', 'Requests', ('method',))
+        counter.inc(method='GET')
+        counter.inc(2, method='GET')
+        counter.inc(method='PATCH')
+        lines = registry.render().splitlines()
+        assert '# TYPE f5_agent_requests_total counter' in lines
+        assert 'f5_agent_requests_total{method="GET"} 3' in lines
+        assert 'f5_agent_requests_total{method="PATCH"} 1' in lines
+
+    def test_render_histogram(self):
+        registry = metrics.Registry()
+        histogram = registry.histogram('seconds', 'Seconds', ('stage',),
+                                       buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, stage='pools')
+        lines = registry.render().splitlines()
+        assert 'f5_agent_seconds_bucket{stage="pools",le="0.1"} 2' in lines
+        assert 'f5_agent_seconds_bucket{stage="pools",le="1.0"} 3' in lines
+        assert 'f5_agent_seconds_bucket{stage="pools",le="+Inf"} 4' in lines
+        assert 'f5_agent_seconds_sum{stage="pools"} 3.65' in lines
+        assert 'f5_agent_seconds_count{stage="pools"} 4' in lines
+
+    def test_gauges(self):
+        registry = metrics.Registry()
+        registry.add_gauges(lambda: {'queue_depth': 4, 'queues': {'a': 1}})
+        assert 'f5_agent_queue_depth 4' in registry.render().splitlines()
+
+
+class TestRestRequests(object):
+    def test_resource_type(self):
+        assert metrics.resource_type(
+            'https://bigip1:443/mgmt/tm/ltm/pool/~Project_t~pool1/members/'
+            '~Project_t~10.0.0.1:80?expandSubcollections=true') == \
+            'tm/ltm/pool/members'
+        assert metrics.resource_type(
+            'https://bigip1:443/mgmt/tm/transaction/1478/commands') == \
+            'tm/transaction/commands'
+
+
+class TestStatsdSink(object):
+    def test_flush(self):
+        registry = metrics.Registry()
+        counter = registry.counter('requests_total', 'Requests', ('device',))
+        histogram = registry.histogram('seconds', 'Seconds', ('stage',))
+        registry.add_gauges(lambda: {'queue_depth': 2})
+        sink = metrics.StatsdSink('127.0.0.1:8125', registry=registry)
+        sink._socket = mock.MagicMock()
+        registry.observers.append(sink._observe)
+
+        counter.inc(3, device='bigip1.example.com')
+        histogram.observe(0.25, stage='pools')
+        sink.flush()
+        counter.inc(device='bigip1.example.com')
+        sink.flush()
+
+        sent = [call[0][0].splitlines()
+                for call in sink._socket.sendto.call_args_list]
+        assert sorted(sent[0]) == [
+            'f5_agent_queue_depth:2|g',
+            'f5_agent_requests_total.bigip1_example_com:3|c',
+            'f5_agent_seconds.pools:250.000|ms']
+        assert sorted(sent[1]) == [
+            'f5_agent_queue_depth:2|g',
+            'f5_agent_requests_total.bigip1_example_com:1|c']
@@ -0,0 +1,40 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mock
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.network_helper import \
+    NetworkHelper
+
+
+class TestCounts(object):
+    def test_tunnel_count_reads_selected_items_as_dicts(self):
+        bigip = mock.MagicMock()
+        bigip.tm.net.tunnels.tunnels.get_collection.return_value = [
+            {'name': 'http-tunnel', 'profile': '/Common/tcp-forward'},
+            {'name': 'tunnel-vxlan-1', 'profile': '/Common/vxlan_ovs'},
+            {'name': 'tunnel-gre-2', 'profile': '/Common/gre_ovs'},
+            {'name': 'socks-tunnel'}]
+        assert NetworkHelper().get_tunnel_count(bigip) == 2
+
+    def test_route_domain_ids_are_not_selected(self):
+        bigip = mock.MagicMock()
+        bigip.tm.net.route_domains.get_collection.return_value = [
+            mock.MagicMock(id=0), mock.MagicMock(id=2)]
+        assert NetworkHelper().get_route_domain_ids(bigip, partition='') == \
+            [0, 2]
+        bigip.tm.net.route_domains.get_collection.assert_called_once_with(
+            requests_params={})
@@ -0,0 +1,94 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mock
+import pytest
+
+from f5_openstack_agent.lbaasv2.drivers.bigip import config_snapshot
+from f5_openstack_agent.lbaasv2.drivers.bigip.pool_service import \
+    PoolServiceBuilder
+from f5_openstack_agent.lbaasv2.drivers.bigip.service_adapter import \
+    ServiceModelAdapter
+
+PARTITION = 'Project_tenant'
+
+
+def _pool(name, members=None):
+    pool = mock.MagicMock()
+    pool.name = name
+    pool.membersReference = {}
+    if members:
+        pool.membersReference['items'] = [{'name': n} for n in members]
+    return pool
+
+
+def _service(*addresses):
+    return {'loadbalancer': {'id': 'lb1', 'tenant_id': 'tenant'},
+            'pool': {'id': 'pool1', 'name': 'pool1'},
+            'members': [{'address': address, 'protocol_port': 80}
+                        for address in addresses]}
+
+
+@pytest.fixture
+def builder():
+    conf = mock.MagicMock()
+    conf.environment_prefix = 'Project'
+    adapter = ServiceModelAdapter(conf)
+    adapter.get_pool = mock.Mock(
+        return_value={'name': 'pool1', 'partition': PARTITION})
+    return PoolServiceBuilder(adapter)
+
+
+@pytest.fixture
+def bigip():
+    bigip = mock.MagicMock()
+    bigip.hostname = 'bigip1'
+    bigip.tmos_version = '12.1.0'
+    token = config_snapshot.begin([bigip], PARTITION)
+    yield bigip
+    config_snapshot.end(token)
+
+
+class TestCreateMembers(object):
+    def test_empty_pool_gets_all_members(self, builder, bigip):
+        pool = _pool('pool1')
+        bigip.tm.ltm.pools.get_collection.return_value = [pool]
+        builder.create_members(_service('10.0.0.1', '10.0.0.2'), [bigip])
+        pool.modify.assert_called_once_with(members=[
+            {'name': '10.0.0.1:80', 'partition': PARTITION,
+             'address': '10.0.0.1'},
+            {'name': '10.0.0.2:80', 'partition': PARTITION,
+             'address': '10.0.0.2'}])
+
+        # The member by member pass which follows has nothing to do.
+        service = _service('10.0.0.2')
+        service['member'] = service['members'][0]
+        builder.create_member(service, [bigip])
+        assert not pool.members_s.members.create.called
+        assert not pool.members_s.members.exists.called
+
+    def test_pool_with_members_is_left_alone(self, builder, bigip):
+        pool = _pool('pool1', ['10.0.0.1:80'])
+        bigip.tm.ltm.pools.get_collection.return_value = [pool]
+        builder.create_members(_service('10.0.0.1', '10.0.0.2'), [bigip])
+        assert not pool.modify.called
+
+    def test_without_snapshot(self, builder):
+        bigip = mock.MagicMock()
+        pool = bigip.tm.ltm.pools.pool.load.return_value
+        pool.members_s.get_collection.return_value = []
+        builder.create_members(_service('10.0.0.1'), [bigip])
+        assert pool.modify.called
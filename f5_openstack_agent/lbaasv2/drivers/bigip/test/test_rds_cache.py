@@ -0,0 +1,124 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import netaddr
+import pytest
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.rds_cache import load_cache
+from f5_openstack_agent.lbaasv2.drivers.bigip.rds_cache import \
+    RouteDomainSubnetCache
+from f5_openstack_agent.lbaasv2.drivers.bigip.rds_cache import \
+    RouteDomainSubnets
+from f5_openstack_agent.lbaasv2.drivers.bigip.rds_cache import save_cache
+
+
+class TestRouteDomainSubnets(object):
+    @pytest.fixture
+    def subnets(self):
+        subnets = RouteDomainSubnets()
+        subnets.add_subnet('vxlan-1', 's1', '10.1.0.0/16')
+        subnets.add_subnet('vxlan-2', 's2', '10.2.1.0/24')
+        subnets.add_subnet('vxlan-3', 's3', 'fd00::/64')
+        return subnets
+
+    @pytest.mark.parametrize('cidr,overlaps', [
+        ('10.1.2.0/24', True),
+        ('10.0.0.0/8', True),
+        ('10.2.1.0/24', True),
+        ('10.2.1.128/25', True),
+        ('10.2.2.0/24', False),
+        ('10.3.0.0/16', False),
+        ('fd00::/48', True),
+        ('fd01::/64', False),
+    ])
+    def test_overlaps(self, subnets, cidr, overlaps):
+        assert subnets.overlaps(netaddr.IPNetwork(cidr)) == overlaps
+
+    def test_subnet_does_not_overlap_itself(self, subnets):
+        assert not subnets.overlaps('10.2.1.0/24', 's2')
+        assert subnets.overlaps('10.1.1.0/24', 's2')
+
+    def test_remove_subnet(self, subnets):
+        assert subnets.remove_subnet('vxlan-1', 's1')
+        assert not subnets.remove_subnet('vxlan-1', 's1')
+        assert 'vxlan-1' not in subnets.networks
+        assert not subnets.overlaps('10.1.2.0/24')
+        assert len(subnets) == 2
+
+    def test_readd_subnet(self, subnets):
+        subnets.add_subnet('vxlan-2', 's2', '10.4.0.0/24')
+        assert not subnets.overlaps('10.2.1.0/24')
+        assert subnets.overlaps('10.4.0.0/16')
+
+
+class TestRouteDomainSubnetCache(object):
+    @pytest.fixture
+    def cache(self):
+        cache = RouteDomainSubnetCache()
+        cache.add_tenant('t1')
+        cache.add_subnet('t1', 1, 'vxlan-1', 's1', '10.1.0.0/24')
+        cache.add_subnet('t1', 2, 'vxlan-2', 's2', '10.1.0.0/24')
+        cache.add_network('t1', 2, 'vxlan-3')
+        return cache
+
+    def test_get_route_domain(self, cache):
+        assert cache.get_route_domain('vxlan-1') == 1
+        assert cache.get_route_domain('vxlan-3') == 2
+        assert cache.get_route_domain('vxlan-4') is None
+
+    def test_find_route_domain(self, cache):
+        assert cache.route_domains('t1') == [1, 2]
+        assert cache.find_route_domain('t1', 's9', '10.2.0.0/24') == 1
+        assert cache.find_route_domain('t1', 's9', '10.1.0.0/25') is None
+        assert cache.find_route_domain('t1', 's1', '10.1.0.0/24') == 1
+        assert cache.find_route_domain('t2', 's9', '10.1.0.0/24') is None
+
+    def test_remove_subnet(self, cache):
+        assert cache.remove_subnet('vxlan-1', 's1') == ('t1', 1)
+        assert cache.route_domains('t1') == [2]
+        assert cache.get_route_domain('vxlan-1') is None
+        # vxlan-3 keeps route domain 2 alive
+        assert cache.remove_subnet('vxlan-2', 's2') is None
+        assert cache.route_domains('t1') == [2]
+        assert cache.remove_subnet('vxlan-9', 's9') is None
+
+    def test_many_subnets(self):
+        cache = RouteDomainSubnetCache()
+        for index in range(500):
+            cache.add_subnet('t1', 0, 'vxlan-%d' % index, 's%d' % index,
+                             '10.%d.%d.0/24' % (index // 256, index % 256))
+        assert cache.find_route_domain('t1', 'new', '10.1.0.0/16') is None
+        assert cache.find_route_domain('t1', 'new', '10.2.0.0/24') == 0
+
+    def test_save_and_load(self, cache, tmpdir):
+        path = str(tmpdir.join('rds_cache.json'))
+        save_cache(cache, path, ['bigip2', 'bigip1'])
+        loaded = load_cache(path, ['bigip1', 'bigip2'])
+        assert loaded.to_dict() == cache.to_dict()
+        assert loaded.route_domains('t1') == [1, 2]
+        assert loaded.get_route_domain('vxlan-3') == 2
+        assert loaded.find_route_domain('t1', 's9', '10.1.0.0/25') is None
+
+    def test_load_other_devices(self, cache, tmpdir):
+        path = str(tmpdir.join('rds_cache.json'))
+        save_cache(cache, path, ['bigip1'])
+        assert load_cache(path, ['bigip3']) is None
+
+    def test_load_missing_or_corrupt(self, tmpdir):
+        path = tmpdir.join('rds_cache.json')
+        assert load_cache(str(path), ['bigip1']) is None
+        path.write('{"version": 1, "hostnames": ["bigip1"]')
+        assert load_cache(str(path), ['bigip1']) is None
@@ -0,0 +1,107 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mock
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.resource_helper import \
+    BigIPResourceHelper
+from f5_openstack_agent.lbaasv2.drivers.bigip.resource_helper import \
+    get_model_changes
+from f5_openstack_agent.lbaasv2.drivers.bigip.resource_helper import \
+    ResourceType
+
+
+class Resource(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+        self.modify = mock.Mock()
+
+
+VIRTUAL = Resource(
+    name='vs1',
+    partition='Project_t1',
+    destination='/Project_t1/10.0.0.5%2:80',
+    pool='/Project_t1/pool1',
+    connectionLimit=0,
+    vlansEnabled=True,
+    vlans=['/Common/vlan-46'],
+    sourceAddressTranslation={'type': 'automap'},
+    persist=[{'name': 'cookie', 'partition': 'Common', 'tmDefault': 'yes'}]
+)
+
+
+def _model(**kwargs):
+    model = {'name': 'vs1',
+             'partition': 'Project_t1',
+             'destination': '10.0.0.5%2:80',
+             'pool': 'pool1',
+             'connectionLimit': 0,
+             'vlansEnabled': True,
+             'vlans': ['/Common/vlan-46'],
+             'sourceAddressTranslation': {'type': 'automap'},
+             'persist': [{'name': 'cookie'}]}
+    model.update(kwargs)
+    return model
+
+
+class TestGetModelChanges(object):
+    def test_no_changes(self):
+        assert get_model_changes(VIRTUAL, _model()) == {}
+
+    def test_changed_attributes(self):
+        changes = get_model_changes(
+            VIRTUAL, _model(pool='pool2', connectionLimit=100))
+        assert changes == {'pool': 'pool2', 'connectionLimit': 100}
+
+    def test_reference_to_other_partition(self):
+        changes = get_model_changes(VIRTUAL, _model(pool='/Common/pool1'))
+        assert changes == {'pool': '/Common/pool1'}
+
+    def test_attribute_not_on_device(self):
+        changes = get_model_changes(VIRTUAL, _model(description=''))
+        assert changes == {'description': ''}
+
+    def test_nested_values(self):
+        changes = get_model_changes(VIRTUAL, _model(
+            sourceAddressTranslation={'type': 'snat', 'pool': 'snat1'},
+            vlans=[]))
+        assert sorted(changes) == ['sourceAddressTranslation', 'vlans']
+
+    def test_booleans_are_not_numbers(self):
+        changes = get_model_changes(VIRTUAL, _model(connectionLimit=False))
+        assert changes == {'connectionLimit': False}
+
+    def test_numbers_as_strings(self):
+        assert get_model_changes(VIRTUAL, _model(connectionLimit='0')) == {}
+
+
+class TestUpdate(object):
+    def _helper(self, resource):
+        bigip = mock.MagicMock()
+        bigip.tm.ltm.virtuals.virtual.load.return_value = resource
+        return BigIPResourceHelper(ResourceType.virtual), bigip
+
+    def test_update_skips_unchanged(self):
+        resource = Resource(**VIRTUAL.__dict__)
+        helper, bigip = self._helper(resource)
+        helper.update(bigip, _model())
+        assert not resource.modify.called
+
+    def test_update_sends_changes_only(self):
+        resource = Resource(**VIRTUAL.__dict__)
+        helper, bigip = self._helper(resource)
+        helper.update(bigip, _model(pool=''))
+        resource.modify.assert_called_once_with(pool='')
@@ -0,0 +1,121 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mock
+
+from f5_openstack_agent.lbaasv2.drivers.bigip import metrics
+from f5_openstack_agent.lbaasv2.drivers.bigip import rest_accounting
+
+
+def _bigip(hostname, status_code=200, content='{}'):
+    bigip = mock.MagicMock()
+    bigip.hostname = hostname
+    session = mock.MagicMock(spec=['request'])
+    session.request.return_value = mock.MagicMock(status_code=status_code,
+                                                  content=content)
+    bigip._meta_data = {'icr_session': mock.MagicMock(session=session)}
+    return bigip, session
+
+
+class TestRestAccount(object):
+    def test_uri_template(self):
+        assert rest_accounting.uri_template(
+            'https://bigip1:443/mgmt/tm/ltm/pool/~Project_t~pool1/members/'
+            '~Project_t~10.0.0.1:80?ver=11.6.0') == \
+            '/mgmt/tm/ltm/pool/{name}/members/{name}'
+        assert rest_accounting.uri_template(
+            'https://bigip1:443/mgmt/tm/transaction/1478/commands') == \
+            '/mgmt/tm/transaction/{id}/commands'
+
+    def test_slowest(self):
+        account = rest_accounting.RestAccount('pass')
+        for seconds in range(1, 8):
+            account.record('GET', '/mgmt/tm/ltm/pool/{name}', 200, 10,
+                           float(seconds))
+        assert account.calls == 7
+        assert account.seconds == 28.0
+        assert account.bytes == 70
+        assert sorted(entry[0] for entry in account.slowest) == \
+            [3.0, 4.0, 5.0, 6.0, 7.0]
+        assert account.summary().startswith(
+            'pass: 7 REST calls, 28.000 secs, 70 bytes; slowest: '
+            'GET /mgmt/tm/ltm/pool/{name} 200 7.000 secs, ')
+
+    def test_begin_end(self):
+        account = rest_accounting.begin('pass')
+        try:
+            assert rest_accounting.current() is account
+            # a nested operation is recorded in the outer account
+            assert rest_accounting.begin('nested') is None
+            rest_accounting.end(None)
+            assert rest_accounting.current() is account
+        finally:
+            rest_accounting.end(account)
+        assert rest_accounting.current() is None
+
+
+class TestInstrument(object):
+    def test_requests_are_recorded(self):
+        bigip, session = _bigip('bigip-instrument', content='{"items": []}')
+        send = session.request
+        rest_accounting.instrument(bigip)
+        rest_accounting.instrument(bigip)
+        account = rest_accounting.begin('pass')
+        try:
+            bigip._meta_data['icr_session'].session.request(
+                'get', 'https://bigip1/mgmt/tm/ltm/pool/~Project_t~pool1')
+        finally:
+            rest_accounting.end(account)
+
+        send.assert_called_once_with(
+            'GET', 'https://bigip1/mgmt/tm/ltm/pool/~Project_t~pool1')
+        assert account.calls == 1
+        assert account.bytes == 13
+        assert account.slowest[0][1:] == ('GET', '/mgmt/tm/ltm/pool/{name}',
+                                          200)
+        assert metrics.REST_REQUESTS.values[
+            ('bigip-instrument', 'tm/ltm/pool', 'GET')] == 1
+
+    def test_slow_calls(self):
+        bigip, session = _bigip('bigip1', status_code=404)
+        slow_calls = mock.MagicMock()
+        rest_accounting.instrument(bigip, slow_calls)
+        with mock.patch('time.time', side_effect=[100.0, 102.5]):
+            session.request('delete', 'https://bigip1/mgmt/tm/net/tunnels/'
+                            'tunnel/~Common~tunnel-vxlan-46')
+        slow_calls.check.assert_called_once_with(
+            'bigip1', 'DELETE', '/mgmt/tm/net/tunnels/tunnel/{name}', 404,
+            2.5)
+
+
+class TestSlowCallLog(object):
+    def test_threshold(self):
+        slow_calls = rest_accounting.SlowCallLog(threshold=1.0)
+        with mock.patch.object(rest_accounting.LOG, 'warning') as warning:
+            slow_calls.check('bigip1', 'GET', '/mgmt/tm/ltm/pool', 200, 0.5)
+            slow_calls.check('bigip1', 'GET', '/mgmt/tm/ltm/pool', 200, 1.5)
+        assert warning.call_count == 1
+
+    def test_disabled_and_sampled(self):
+        with mock.patch.object(rest_accounting.LOG, 'warning') as warning:
+            rest_accounting.SlowCallLog(threshold=0).check(
+                'bigip1', 'GET', '/mgmt/tm/ltm/pool', 200, 30.0)
+            sampled = rest_accounting.SlowCallLog(threshold=1.0,
+                                                  sample_rate=0.5)
+            with mock.patch('random.random', side_effect=[0.7, 0.2]):
+                sampled.check('bigip1', 'GET', '/mgmt/tm/ltm/pool', 200, 2.0)
+                sampled.check('bigip1', 'GET', '/mgmt/tm/ltm/pool', 200, 2.0)
+        assert warning.call_count == 1
@@ -0,0 +1,231 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import eventlet
+import pytest
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.service_queue import \
+    ServiceQueue
+from f5_openstack_agent.lbaasv2.drivers.bigip.utils import serialized
+
+
+def _service(lb_id, tenant_id='tenant', name=None):
+    return {'loadbalancer': {'id': lb_id, 'tenant_id': tenant_id,
+                             'name': name}}
+
+
+class FakeDriver(object):
+    def __init__(self, max_concurrent=1):
+        self.service_queue = ServiceQueue(max_concurrent)
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    def _run(self, name):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.calls.append(name)
+        eventlet.sleep(0.01)
+        self.active -= 1
+
+    @serialized('create_member')
+    def create_member(self, name, service):
+        self._run(name)
+        return name
+
+    @serialized('update_member', coalesce=True)
+    def update_member(self, name, service):
+        self._run(service['loadbalancer']['name'])
+        return service['loadbalancer']['name']
+
+    @serialized('remove_orphans')
+    def remove_orphans(self, all_loadbalancers):
+        self._run('orphans')
+
+
+class TestServiceQueue(object):
+    def test_runs_immediately_when_idle(self):
+        queue = ServiceQueue()
+        request = queue.enqueue('create_member', _service('lb1'))
+        assert request.started
+        assert len(queue) == 1
+        queue.complete(request)
+        assert len(queue) == 0
+
+    def test_same_loadbalancer_is_fifo(self):
+        queue = ServiceQueue(max_concurrent=4)
+        first = queue.enqueue('create_member', _service('lb1'))
+        second = queue.enqueue('create_member', _service('lb1'))
+        assert first.started
+        assert not second.started
+        queue.complete(first)
+        assert second.started
+
+    def test_different_tenants_run_concurrently(self):
+        queue = ServiceQueue(max_concurrent=2)
+        first = queue.enqueue('create_member', _service('lb1', 't1'))
+        second = queue.enqueue('create_member', _service('lb2', 't2'))
+        third = queue.enqueue('create_member', _service('lb3', 't3'))
+        assert first.started
+        assert second.started
+        assert not third.started
+        queue.complete(second)
+        assert third.started
+
+    def test_same_tenant_is_not_concurrent(self):
+        queue = ServiceQueue(max_concurrent=2)
+        first = queue.enqueue('create_member', _service('lb1', 't1'))
+        second = queue.enqueue('create_member', _service('lb2', 't1'))
+        third = queue.enqueue('create_member', _service('lb3', 't2'))
+        assert not second.started
+        assert third.started
+        queue.complete(first)
+        assert second.started
+
+    def test_global_request_is_exclusive(self):
+        queue = ServiceQueue(max_concurrent=4)
+        first = queue.enqueue('create_member', _service('lb1', 't1'))
+        orphans = queue.enqueue('remove_orphans')
+        later = queue.enqueue('create_member', _service('lb2', 't2'))
+        assert not orphans.started
+        assert not later.started
+        queue.complete(first)
+        assert orphans.started
+        assert not later.started
+        queue.complete(orphans)
+        assert later.started
+
+    def test_round_robin_between_loadbalancers(self):
+        queue = ServiceQueue()
+        running = queue.enqueue('create_member', _service('lb1', 't1'))
+        lb1 = queue.enqueue('create_member', _service('lb1', 't1'))
+        lb2 = queue.enqueue('create_member', _service('lb2', 't2'))
+        queue.complete(running)
+        assert lb1.started
+        queue.complete(lb1)
+        assert lb2.started
+
+    def test_complete_abandoned_request(self):
+        queue = ServiceQueue()
+        running = queue.enqueue('create_member', _service('lb1'))
+        waiting = queue.enqueue('create_member', _service('lb1'))
+        queue.complete(waiting)
+        assert len(queue) == 1
+        queue.complete(running)
+        assert len(queue) == 0
+
+    def test_coalesce_queued_requests(self):
+        queue = ServiceQueue()
+        running = queue.enqueue('update_member', _service('lb1'), True)
+        first = queue.enqueue('update_member', _service('lb1'), True)
+        newest = _service('lb1')
+        second = queue.enqueue('update_member', newest, True)
+        assert len(queue) == 3
+        queue.complete(running)
+        assert first.started
+        assert first.followers == [second]
+        assert first.service is newest
+        assert second.leader is first
+        assert len(queue) == 2
+        queue.complete(first, result='done')
+        assert second.wait() == 'done'
+        assert len(queue) == 0
+
+    def test_coalesce_stops_at_other_request(self):
+        queue = ServiceQueue()
+        running = queue.enqueue('update_member', _service('lb1'), True)
+        first = queue.enqueue('update_member', _service('lb1'), True)
+        delete = queue.enqueue('delete_loadbalancer', _service('lb1'))
+        last = queue.enqueue('update_member', _service('lb1'), True)
+        queue.complete(running)
+        assert first.followers == []
+        queue.complete(first)
+        assert delete.started
+        assert delete.followers == []
+        queue.complete(delete)
+        assert last.started
+
+    def test_coalesce_error_is_shared(self):
+        queue = ServiceQueue()
+        running = queue.enqueue('update_member', _service('lb1'), True)
+        first = queue.enqueue('update_member', _service('lb1'), True)
+        second = queue.enqueue('update_member', _service('lb1'), True)
+        queue.complete(running)
+        queue.complete(first, error=ValueError('failed'))
+        with pytest.raises(ValueError):
+            second.wait()
+
+    def test_get_stats(self):
+        queue = ServiceQueue()
+        queue.enqueue('create_member', _service('lb1'))
+        queue.enqueue('create_member', _service('lb1'))
+        queue.enqueue('create_member', _service('lb2'))
+        stats = queue.get_stats()
+        assert stats['request_queue_depth'] == 3
+        assert stats['request_queue_running'] == 1
+        assert stats['request_queue_max_wait'] >= 0
+        assert 'request_queue_loadbalancers' not in stats
+        loadbalancers = queue.get_loadbalancer_stats()
+        assert loadbalancers['lb1']['depth'] == 2
+        assert loadbalancers['lb2']['depth'] == 1
+
+
+class TestSerialized(object):
+    def test_serialized_per_loadbalancer(self):
+        driver = FakeDriver(max_concurrent=2)
+        pool = eventlet.GreenPool()
+        pool.spawn(driver.create_member, 'a1', _service('lb1', 't1'))
+        pool.spawn(driver.create_member, 'a2', _service('lb1', 't1'))
+        pool.spawn(driver.create_member, 'b1', _service('lb2', 't2'))
+        pool.waitall()
+        assert driver.calls.index('a1') < driver.calls.index('a2')
+        assert driver.max_active == 2
+        assert len(driver.service_queue) == 0
+
+    def test_serialized_global(self):
+        driver = FakeDriver(max_concurrent=2)
+        pool = eventlet.GreenPool()
+        pool.spawn(driver.create_member, 'a1', _service('lb1', 't1'))
+        pool.spawn(driver.remove_orphans, [])
+        pool.spawn(driver.create_member, 'b1', _service('lb2', 't2'))
+        pool.waitall()
+        assert driver.calls == ['a1', 'orphans', 'b1']
+        assert driver.max_active == 1
+
+    def test_serialized_coalesce(self):
+        driver = FakeDriver()
+        pool = eventlet.GreenPool()
+        results = [pool.spawn(driver.update_member, 'm%d' % i,
+                              _service('lb1', name='v%d' % i))
+                   for i in range(4)]
+        pool.waitall()
+        # The first runs on its own, the others are merged into one pass
+        # with the newest service definition.
+        assert driver.calls == ['v0', 'v3']
+        assert [r.wait() for r in results] == ['v0', 'v3', 'v3', 'v3']
+        assert len(driver.service_queue) == 0
+
+    def test_serialized_releases_on_error(self):
+        driver = FakeDriver()
+
+        def fail(name):
+            raise ValueError(name)
+        driver._run = fail
+        try:
+            driver.create_member('a1', _service('lb1'))
+        except ValueError:
+            pass
+        assert len(driver.service_queue) == 0
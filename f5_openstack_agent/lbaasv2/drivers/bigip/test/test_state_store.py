@@ -0,0 +1,105 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import mock
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.state_store import \
+    get_config_marker
+from f5_openstack_agent.lbaasv2.drivers.bigip.state_store import \
+    get_deployed_paths
+from f5_openstack_agent.lbaasv2.drivers.bigip.state_store import StateStore
+
+DEVICE_STATE = {'assured_networks': {'net1': 'tunnel-vxlan-100'},
+                'assured_tenant_snat_subnets': {'t1': ['s1']},
+                'assured_gateway_subnets': []}
+
+
+def _bigip(*paths):
+    bigip = mock.MagicMock()
+    bigip.tm.net.vlans.get_collection.return_value = [
+        {'fullPath': path} for path in paths]
+    return bigip
+
+
+class TestStateStore(object):
+    def test_save_and_load(self, tmpdir):
+        path = str(tmpdir.join('state.json'))
+        store = StateStore(path)
+        store.put('services', {'lb1': {'tenant_id': 't1'}})
+        store.put_device('bigip1', 'marker1', DEVICE_STATE)
+        assert store.dirty
+        store.save()
+        assert not store.dirty
+
+        loaded = StateStore(path)
+        assert loaded.load()
+        assert loaded.get('services') == {'lb1': {'tenant_id': 't1'}}
+        assert loaded.get_device('bigip1') == ('marker1', DEVICE_STATE)
+        assert loaded.get_device('bigip2') == (None, None)
+
+    def test_unchanged_state_is_not_dirty(self):
+        store = StateStore('unused')
+        store.put('services', {})
+        store.put_device('bigip1', 'marker1', DEVICE_STATE)
+        store.dirty = False
+        store.put('services', {})
+        store.put_device('bigip1', 'marker1', dict(DEVICE_STATE))
+        assert not store.dirty
+        store.forget_device('bigip2')
+        assert not store.dirty
+        store.forget_device('bigip1')
+        assert store.dirty
+
+    def test_load_missing_or_corrupt(self, tmpdir):
+        path = tmpdir.join('state.json')
+        assert not StateStore(str(path)).load()
+        path.write('{"version": 1, "devices": {}')
+        assert not StateStore(str(path)).load()
+        path.write('{"version": 0, "devices": {}, "state": {}}')
+        assert not StateStore(str(path)).load()
+
+
+class TestConfigMarker(object):
+    def test_marker_follows_objects(self):
+        marker = get_config_marker(_bigip('/t1/vlan-1', '/t1/vlan-2'))
+        assert marker == get_config_marker(
+            _bigip('/t1/vlan-2', '/t1/vlan-1'))
+        assert marker != get_config_marker(_bigip('/t1/vlan-1'))
+
+    def test_only_paths_are_read(self):
+        bigip = _bigip()
+        get_config_marker(bigip)
+        bigip.tm.net.selfips.get_collection.assert_called_once_with(
+            requests_params={'params': '$select=fullPath'})
+
+
+class TestDeployedPaths(object):
+    def test_paths_of_folders_virtuals_and_pools(self):
+        bigip = mock.MagicMock()
+        bigip.tm.sys.folders.get_collection.return_value = [
+            {'fullPath': '/'}, {'fullPath': '/Project_t1'}]
+        bigip.tm.ltm.virtuals.get_collection.return_value = [
+            {'fullPath': '/Project_t1/vs1'}]
+        bigip.tm.ltm.pools.get_collection.return_value = [
+            {'fullPath': '/Project_t1/pool1'}]
+        assert get_deployed_paths(bigip) == set(
+            ['/', '/Project_t1', '/Project_t1/vs1', '/Project_t1/pool1'])
+
+    def test_empty_device(self):
+        paths = get_deployed_paths(mock.MagicMock())
+        assert paths == set()
+        assert not paths.issuperset(['/Project_t1'])
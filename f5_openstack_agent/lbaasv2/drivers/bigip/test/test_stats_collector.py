@@ -0,0 +1,126 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mock
+import pytest
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.stats_collector import \
+    StatsCollector
+
+PARTITION = 'Project_tenant'
+LINK = 'https://localhost/mgmt/tm/ltm/%s/~Project_tenant~%s/stats'
+
+
+def _virtual_stats(name, bits_in):
+    return {LINK % ('virtual', name): {'nestedStats': {'entries': {
+        'tmName': {'description': '/%s/%s' % (PARTITION, name)},
+        'clientside.bitsIn': {'value': bits_in},
+        'clientside.bitsOut': {'value': 16},
+        'clientside.curConns': {'value': 1},
+        'clientside.totConns': {'value': 5}}}}}
+
+
+def _pool_stats(name, members):
+    member_stats = dict(
+        ('%s/%s' % (name, addr), {'nestedStats': {'entries': {
+            'addr': {'description': addr},
+            'port': {'value': 80},
+            'monitorStatus': {'description': state}}}})
+        for addr, state in members)
+    return {LINK % ('pool', name): {'nestedStats': {'entries': {
+        'tmName': {'description': '/%s/%s' % (PARTITION, name)},
+        'serverside.bitsIn': {'value': 80},
+        (LINK % ('pool', name)).replace('/stats', '/members/stats'): {
+            'nestedStats': {'entries': member_stats}}}}}}
+
+
+def _bigip(hostname, virtuals, pools):
+    bigip = mock.MagicMock()
+    bigip.hostname = hostname
+    bigip.tmos_version = '12.1.0'
+    bigip._meta_data = {'uri': 'https://%s/mgmt/' % hostname,
+                        'icr_session': mock.MagicMock()}
+
+    def get(url, params=None):
+        response = mock.MagicMock()
+        response.json.return_value = {
+            'entries': virtuals if '/virtual/' in url else pools}
+        return response
+    bigip._meta_data['icr_session'].session.get.side_effect = get
+    return bigip
+
+
+@pytest.fixture
+def bigips():
+    return [_bigip('bigip1', _virtual_stats('vs1', 800),
+                   _pool_stats('pool1', [('10.0.0.1%2', 'up')])),
+            _bigip('bigip2', _virtual_stats('vs1', 8),
+                   _pool_stats('pool1', [('10.0.0.1%2', 'user-down')]))]
+
+
+def _requests(bigips):
+    return sum(bigip._meta_data['icr_session'].session.get.call_count
+               for bigip in bigips)
+
+
+class TestStatsCollector(object):
+    def test_partition_read_once_per_device(self, bigips):
+        collector = StatsCollector(lambda: bigips, interval=60)
+        stats = collector.get_partition_stats(PARTITION)
+        assert _requests(bigips) == 4
+        assert sorted(device['virtuals']['/%s/vs1' % PARTITION]['bytes_in']
+                      for device in stats) == [1, 100]
+        pool = stats[0]['pools']['/%s/pool1' % PARTITION]
+        assert pool['bytes_in'] == 10
+        assert pool['total_connections'] == 0
+
+        collector.get_partition_stats(PARTITION)
+        assert _requests(bigips) == 4
+        collector._collector.kill()
+
+    def test_member_states(self, bigips):
+        collector = StatsCollector(lambda: bigips, interval=60)
+        states = sorted(
+            member['state']
+            for device in collector.get_partition_stats(PARTITION)
+            for member in device['pools']['/%s/pool1' % PARTITION][
+                'members'])
+        assert states == ['MONITOR_STATUS_UP', 'MONITOR_STATUS_USER_DOWN']
+        collector._collector.kill()
+
+    def test_other_partitions_are_ignored(self, bigips):
+        collector = StatsCollector(lambda: bigips, interval=60)
+        stats = collector.get_partition_stats('Project_other')
+        assert [device['virtuals'] for device in stats] == [{}, {}]
+        collector._collector.kill()
+
+    def test_failed_collection_keeps_stats(self, bigips):
+        collector = StatsCollector(lambda: bigips, interval=60)
+        collector.get_partition_stats(PARTITION)
+        session = bigips[1]._meta_data['icr_session'].session
+        session.get.side_effect = Exception('timeout')
+        collector.collect()
+        stats = collector.get_partition_stats(PARTITION)
+        assert len(stats) == 2
+        collector._collector.kill()
+
+    def test_idle_partitions_are_forgotten(self, bigips):
+        collector = StatsCollector(lambda: bigips, interval=0)
+        collector.get_partition_stats(PARTITION)
+        collector._partitions[PARTITION] = 0
+        collector._collector.wait()
+        assert collector._collector is None
+        assert PARTITION not in collector._stats
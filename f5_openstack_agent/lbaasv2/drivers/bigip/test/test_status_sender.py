@@ -0,0 +1,115 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import eventlet
+import mock
+
+from f5_openstack_agent.lbaasv2.drivers.bigip import status_sender
+from f5_openstack_agent.lbaasv2.drivers.bigip.status_sender import \
+    StatusSender
+
+
+class Batch(object):
+    def __init__(self, loadbalancer_id, *statuses):
+        self.loadbalancer_id = loadbalancer_id
+        self.statuses = [{'type': object_type, 'id': object_id,
+                          'provisioning_status': provisioning_status}
+                         for object_type, object_id, provisioning_status
+                         in statuses]
+
+
+def _sent(plugin_rpc):
+    return [(call[0][0], [(status['id'], status['provisioning_status'])
+                          for status in call[0][1]])
+            for call in plugin_rpc.update_statuses.call_args_list]
+
+
+class TestStatusSender(object):
+    def test_send_does_not_wait(self):
+        plugin_rpc = mock.MagicMock()
+        sender = StatusSender(plugin_rpc)
+        sender.send(Batch('lb1', ('member', 'm1', 'ACTIVE'),
+                          ('loadbalancer', 'lb1', 'ACTIVE')))
+        assert not plugin_rpc.update_statuses.called
+        assert sender.get_stats()['status_queue_depth'] == 2
+        eventlet.sleep(0)
+        assert _sent(plugin_rpc) == [
+            ('lb1', [('m1', 'ACTIVE'), ('lb1', 'ACTIVE')])]
+        assert len(sender) == 0
+
+    def test_updates_are_collapsed(self):
+        plugin_rpc = mock.MagicMock()
+        sender = StatusSender(plugin_rpc)
+        sender.send(Batch('lb1', ('member', 'm1', 'ACTIVE'),
+                          ('loadbalancer', 'lb1', 'ACTIVE')))
+        sender.send(Batch('lb2', ('loadbalancer', 'lb2', 'ACTIVE')))
+        sender.send(Batch('lb1', ('member', 'm2', 'ACTIVE'),
+                          ('loadbalancer', 'lb1', 'ERROR')))
+        eventlet.sleep(0)
+        assert _sent(plugin_rpc) == [
+            ('lb2', [('lb2', 'ACTIVE')]),
+            ('lb1', [('m1', 'ACTIVE'), ('m2', 'ACTIVE'),
+                     ('lb1', 'ERROR')])]
+
+    def test_failed_updates_are_retried(self):
+        plugin_rpc = mock.MagicMock()
+        plugin_rpc.update_statuses.side_effect = [
+            Exception('failed'), None, None]
+        sender = StatusSender(plugin_rpc)
+        with mock.patch.object(status_sender, 'RETRY_INTERVAL', 0.01):
+            sender.send(Batch('lb1', ('member', 'm1', 'ACTIVE'),
+                              ('loadbalancer', 'lb1', 'ACTIVE')))
+            eventlet.sleep(0)
+            assert sender.get_stats()['status_queue_retrying'] == 2
+            sender.send(Batch('lb1', ('member', 'm1', 'ERROR')))
+            eventlet.sleep(0.05)
+        assert _sent(plugin_rpc)[1:] == [
+            ('lb1', [('m1', 'ERROR')]),
+            ('lb1', [('lb1', 'ACTIVE')])]
+        assert len(sender) == 0
+        assert sender.get_stats()['status_queue_retrying'] == 0
+
+    def test_retry_does_not_hold_up_other_updates(self):
+        plugin_rpc = mock.MagicMock()
+        plugin_rpc.update_statuses.side_effect = [Exception('failed'), None]
+        sender = StatusSender(plugin_rpc)
+        with mock.patch.object(status_sender, 'RETRY_INTERVAL', 60):
+            sender.send(Batch('lb1', ('loadbalancer', 'lb1', 'ACTIVE')))
+            sender.send(Batch('lb2', ('loadbalancer', 'lb2', 'ACTIVE')))
+            eventlet.sleep(0)
+        assert _sent(plugin_rpc)[1] == ('lb2', [('lb2', 'ACTIVE')])
+
+    def test_gives_up_after_attempts(self):
+        plugin_rpc = mock.MagicMock()
+        plugin_rpc.update_statuses.side_effect = Exception('failed')
+        sender = StatusSender(plugin_rpc)
+        with mock.patch.object(status_sender, 'RETRY_INTERVAL', 0):
+            sender.send(Batch('lb1', ('loadbalancer', 'lb1', 'ACTIVE')))
+            eventlet.sleep(0.05)
+        assert plugin_rpc.update_statuses.call_count == \
+            status_sender.MAX_ATTEMPTS
+        assert sender.get_stats()['status_queue_dropped'] == 1
+
+    def test_oldest_updates_are_dropped_when_full(self):
+        plugin_rpc = mock.MagicMock()
+        sender = StatusSender(plugin_rpc, max_statuses=2)
+        sender.send(Batch('lb1', ('loadbalancer', 'lb1', 'ACTIVE')))
+        sender.send(Batch('lb2', ('member', 'm2', 'ACTIVE'),
+                          ('loadbalancer', 'lb2', 'ACTIVE')))
+        assert sender.dropped == 1
+        eventlet.sleep(0)
+        assert [call[0] for call in _sent(plugin_rpc)] == ['lb2']
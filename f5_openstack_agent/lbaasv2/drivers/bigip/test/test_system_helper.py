@@ -0,0 +1,29 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mock
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.system_helper import \
+    SystemHelper
+
+
+class TestTenantFolderCount(object):
+    def test_reads_selected_items_as_dicts(self):
+        bigip = mock.MagicMock()
+        bigip.tm.sys.folders.get_collection.return_value = [
+            {'name': '/'}, {'name': 'Common'}, {'name': 'Project_1'},
+            {'name': 'Project_2'}]
+        assert SystemHelper().get_tenant_folder_count(bigip) == 2
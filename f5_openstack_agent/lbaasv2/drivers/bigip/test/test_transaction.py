@@ -0,0 +1,103 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import eventlet
+import mock
+import pytest
+
+from f5_openstack_agent.lbaasv2.drivers.bigip.device_fanout import \
+    DeviceFanout
+from f5_openstack_agent.lbaasv2.drivers.bigip import exceptions as f5ex
+from f5_openstack_agent.lbaasv2.drivers.bigip.transaction import \
+    BigipTransaction
+from f5_openstack_agent.lbaasv2.drivers.bigip.transaction import \
+    COORDINATION_HEADER
+
+
+class Session(object):
+    def __init__(self):
+        self.sent = []
+
+    def request(self, method, url, **kwargs):
+        headers = kwargs.get('headers') or {}
+        self.sent.append((method, url, headers.get(COORDINATION_HEADER)))
+
+
+def _bigip(hostname, trans_id):
+    bigip = mock.MagicMock()
+    bigip.hostname = hostname
+    session = Session()
+    bigip._meta_data = {'icr_session': mock.Mock(session=session)}
+    transaction = bigip.tm.transactions.transaction.create.return_value
+    transaction.transId = trans_id
+    return bigip, session, transaction
+
+
+class TestBigipTransaction(object):
+    def test_writes_of_participant_join_transaction(self):
+        bigip, session, transaction = _bigip('bigip1', 11)
+        with BigipTransaction([bigip]):
+            session.request('POST', '/pool')
+            session.request('GET', '/pool')
+            eventlet.spawn(session.request, 'PATCH', '/other').wait()
+        session.request('DELETE', '/pool')
+        assert session.sent == [('POST', '/pool', '11'),
+                                ('GET', '/pool', None),
+                                ('PATCH', '/other', None),
+                                ('DELETE', '/pool', None)]
+        transaction.modify.assert_called_once_with(state='VALIDATING')
+
+    def test_fanout_greenthreads_join_transaction(self):
+        bigip1, session1, _ = _bigip('bigip1', 11)
+        bigip2, session2, _ = _bigip('bigip2', 12)
+        sessions = {'bigip1': session1, 'bigip2': session2}
+
+        def write(bigip):
+            sessions[bigip.hostname].request('POST', '/member')
+
+        with BigipTransaction([bigip1, bigip2]):
+            DeviceFanout().run([bigip1, bigip2], write)
+        assert session1.sent == [('POST', '/member', '11')]
+        assert session2.sent == [('POST', '/member', '12')]
+
+    def test_exception_discards_transactions(self):
+        bigip, session, transaction = _bigip('bigip1', 11)
+        with pytest.raises(ValueError):
+            with BigipTransaction([bigip]):
+                raise ValueError()
+        assert not transaction.modify.called
+        transaction.delete.assert_called_once_with()
+
+    def test_commit_failure(self):
+        bigip1, _, transaction1 = _bigip('bigip1', 11)
+        bigip2, _, transaction2 = _bigip('bigip2', 12)
+        transaction1.modify.side_effect = Exception('invalid')
+        with pytest.raises(f5ex.TransactionCommitException):
+            with BigipTransaction([bigip1, bigip2]):
+                pass
+        assert not transaction2.modify.called
+        transaction2.delete.assert_called_once_with()
+
+    def test_commit_failure_on_later_bigip(self):
+        bigip1, _, transaction1 = _bigip('bigip1', 11)
+        bigip2, _, transaction2 = _bigip('bigip2', 12)
+        transaction2.modify.side_effect = Exception('invalid')
+        changes = BigipTransaction([bigip1, bigip2])
+        with pytest.raises(f5ex.TransactionCommitException):
+            with changes:
+                pass
+        assert changes.committed == ['bigip1']
+        assert not transaction1.delete.called
@@ -30,33 +30,6 @@ class TestUtils(object):
         domain = utils.strip_domain_address('192.168.1.1%20/24')
         assert domain == "192.168.1.1/24"
 
-    def test_request_index_0(self):
-        request_q = [
-            [1, 2, 3],
-            [2, 4, 6],
-            [3, 6, 9]
-        ]
-        index = utils.request_index(request_q, 1)
-        assert index == 0
-
-    def test_request_index_1(self):
-        request_q = [
-            [1, 2, 3],
-            [2, 4, 6],
-            [3, 6, 9]
-        ]
-        index = utils.request_index(request_q, 2)
-        assert index == 1
-
-    def test_request_index_none(self):
-        request_q = [
-            [1, 2, 3],
-            [2, 4, 6],
-            [3, 6, 9]
-        ]
-        index = utils.request_index(request_q, 99)
-        assert index == len(request_q)
-
     def test_get_filter_v11_5(self):
         bigip = mock.MagicMock()
         bigip.tmos_version = "11.5"
@@ -99,3 +72,12 @@ class TestUtils(object):
         bigip.tm.cm.devices.get_collection.return_value = [device]
         ret = utils.get_device_info(bigip)
         assert ret is device
+
+    def test_index_member_states(self):
+        states = [{'addr': '10.0.0.1%2', 'port': '80', 'state': 'UP'},
+                  {'addr': '10.0.0.2%2', 'port': '80', 'state': 'DOWN'},
+                  {'addr': '10.0.0.1%2', 'port': 80, 'state': 'DOWN'}]
+        index = utils.index_member_states(states)
+        assert index[('10.0.0.1', 80)] == [states[0], states[2]]
+        assert index[('10.0.0.2', 80)] == [states[1]]
+        assert ('10.0.0.1', 443) not in index
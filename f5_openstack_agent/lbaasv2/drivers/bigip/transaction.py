@@ -0,0 +1,147 @@
+# coding=utf-8
+"""iControl® REST transactions scoped to a greenthread."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from eventlet import greenthread
+from oslo_log import log as logging
+
+from f5_openstack_agent.lbaasv2.drivers.bigip import exceptions as f5ex
+
+LOG = logging.getLogger(__name__)
+
+COORDINATION_HEADER = 'X-F5-REST-Coordination-Id'
+
+# greenthread -> BigipTransaction it takes part in
+_participants = {}
+
+
+def current():
+    """Return the transaction of the calling greenthread, or None."""
+    return _participants.get(greenthread.getcurrent())
+
+
+def join(transaction):
+    """Make the calling greenthread take part in transaction.
+
+    Used by greenthreads spawned on behalf of a participant, e.g. by
+    DeviceFanout. Pass the value returned by leave() to restore.
+    """
+    thread = greenthread.getcurrent()
+    previous = _participants.get(thread)
+    if transaction:
+        _participants[thread] = transaction
+    return previous
+
+
+def leave(previous=None):
+    thread = greenthread.getcurrent()
+    if previous:
+        _participants[thread] = previous
+    else:
+        _participants.pop(thread, None)
+
+
+class BigipTransaction(object):
+    """Batch the writes of a greenthread into one commit per BIG-IP®.
+
+    Unlike the SDK's TransactionContextManager, which sets the
+    coordination header on the device session for everybody, only
+    requests sent by the greenthread which entered the context (and the
+    greenthreads it fans out to) are added to the transaction. Other
+    greenthreads, e.g. L2 population updates, keep talking to the device
+    directly.
+
+    Reads are sent outside of the transaction and so see the device
+    state from before the transaction: code run in the context must not
+    read back what it wrote in it.
+
+    On a clean exit, the transactions are committed device by device.
+    On an exception, or if a commit fails, the transactions which were
+    not committed are discarded. A commit failing on a later device
+    leaves the earlier ones committed; their hostnames are kept in
+    committed.
+    """
+
+    def __init__(self, bigips):
+        self.bigips = list(bigips)
+        # bigip hostname -> transaction id
+        self.transaction_ids = {}
+        self._transactions = []
+        # Hostnames of the bigips whose transaction was committed
+        self.committed = []
+
+    def __enter__(self):
+        try:
+            for bigip in self.bigips:
+                _install_request_hook(bigip)
+                transaction = bigip.tm.transactions.transaction.create()
+                self._transactions.append(transaction)
+                self.transaction_ids[bigip.hostname] = \
+                    str(transaction.transId)
+        except Exception:
+            self._discard(self._transactions)
+            raise
+        self._previous = join(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        leave(self._previous)
+        if exc_type is not None:
+            self._discard(self._transactions)
+            return False
+
+        for index, transaction in enumerate(self._transactions):
+            try:
+                transaction.modify(state='VALIDATING')
+            except Exception as err:
+                LOG.error("Failed to commit transaction %s on %s: %s" %
+                          (transaction.transId, self.bigips[index].hostname,
+                           str(err)))
+                self._discard(self._transactions[index + 1:])
+                raise f5ex.TransactionCommitException(str(err))
+            self.committed.append(self.bigips[index].hostname)
+        return False
+
+    def _discard(self, transactions):
+        for transaction in transactions:
+            try:
+                transaction.delete()
+            except Exception as err:
+                LOG.debug("Failed to delete transaction %s: %s" %
+                          (transaction.transId, str(err)))
+
+
+def _install_request_hook(bigip):
+    # Route the writes of participating greenthreads into their
+    # transaction by adding the coordination header per request.
+    session = bigip._meta_data['icr_session'].session
+    if getattr(session, 'f5_transaction_hook', False):
+        return
+    hostname = bigip.hostname
+    send = session.request
+
+    def request(method, url, **kwargs):
+        transaction = current()
+        if transaction and method.upper() != 'GET' and \
+                hostname in transaction.transaction_ids:
+            headers = dict(kwargs.get('headers') or {})
+            headers[COORDINATION_HEADER] = \
+                transaction.transaction_ids[hostname]
+            kwargs['headers'] = headers
+        return send(method, url, **kwargs)
+
+    session.request = request
+    session.f5_transaction_hook = True
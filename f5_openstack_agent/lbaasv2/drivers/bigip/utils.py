@@ -14,12 +14,12 @@
 # limitations under the License.
 #
 from time import time
-import uuid
 
 from distutils.version import LooseVersion
-from eventlet import greenthread
 from oslo_log import log as logging
 
+from f5_openstack_agent.lbaasv2.drivers.bigip import metrics
+
 LOG = logging.getLogger(__name__)
 OBJ_PREFIX = 'uuid_'
 
@@ -46,81 +46,99 @@ def strip_domain_address(ip_address):
         return ip_address.split('%')[0]
 
 
-def serialized(method_name):
-    """Outer wrapper in order to specify method name."""
+def index_member_states(monitor_states):
+    """Return the monitor states of pool members by (address, port).
+
+    Each value is the list of states reported for that address and port,
+    in the order they were given, so that looking up the state of a
+    member does not require a scan over all of the states.
+
+    Example:
+        [{'addr': '10.0.0.1%2', 'port': '80', 'state': 'UP'}] ==>
+        {('10.0.0.1', 80): [{'addr': '10.0.0.1%2', ...}]}
+    """
+    index = {}
+    for state in monitor_states:
+        key = (strip_domain_address(state['addr']), int(state['port']))
+        index.setdefault(key, []).append(state)
+    return index
+
+
+def serialized(method_name, coalesce=False):
+    """Outer wrapper in order to specify method name.
+
+    Methods which do nothing but a full service pass for the service
+    definition they are given should set coalesce. Queued calls of such
+    methods for the same loadbalancer are then merged into one call with
+    the newest service definition.
+    """
     def real_serialized(method):
         """Decorator to serialize calls to configure via iControl."""
         def wrapper(*args, **kwargs):
             """Necessary wrapper."""
             # args[0] must be an instance of iControlDriver
             service_queue = args[0].service_queue
-            my_request_id = uuid.uuid4()
 
             service = None
+            service_index = None
             if len(args) > 0:
                 last_arg = args[-1]
                 if isinstance(last_arg, dict) and ('loadbalancer' in last_arg):
                     service = last_arg
+                    service_index = len(args) - 1
             if 'service' in kwargs:
                 service = kwargs['service']
+                service_index = 'service'
 
-            # Consolidate create_member requests for the same pool.
-            #
-            # NOTE: The following block of code alters the state of
-            # a queue that other greenthreads are waiting behind.
-            # This code assumes it will not be preempted by another
-            # greenthread while running. It does not do I/O or call any
-            # other monkey-patched code which might cause a context switch.
-            # To avoid race conditions, DO NOT add logging to this code
-            # block.
-
-            req = (my_request_id, method_name, service)
-            service_queue.append(req)
-            reqs_ahead_of_us = request_index(service_queue, my_request_id)
-            while reqs_ahead_of_us != 0:
-                if reqs_ahead_of_us == 1:
-                    # it is almost our turn. get ready
-                    waitsecs = .01
-                else:
-                    waitsecs = reqs_ahead_of_us * .5
-                if waitsecs > .01:
-                    LOG.debug('%s request %s is blocking'
-                              ' for %.2f secs - queue depth: %d'
-                              % (str(method_name), my_request_id,
-                                 waitsecs, len(service_queue)))
-                greenthread.sleep(waitsecs)
-                reqs_ahead_of_us = request_index(service_queue, my_request_id)
+            # Requests for the same loadbalancer are serialized; the
+            # queue wakes us up when it is our turn.
+            request = service_queue.enqueue(method_name, service, coalesce)
+            result = None
+            error = None
             try:
+                if not request.started:
+                    LOG.debug('%s request %s is blocking'
+                              ' - queue depth: %d'
+                              % (str(method_name), request.request_id,
+                                 len(service_queue)))
+                result = request.wait()
+                if request.leader:
+                    LOG.debug('%s request %s completed by %s request %s'
+                              % (str(method_name), request.request_id,
+                                 request.leader.method_name,
+                                 request.leader.request_id))
+                    return result
+
+                if request.followers:
+                    # Run once with the newest service definition.
+                    LOG.debug('%s request %s merged %d queued requests'
+                              % (str(method_name), request.request_id,
+                                 len(request.followers)))
+                    if service_index == 'service':
+                        kwargs['service'] = request.service
+                    else:
+                        args = args[:service_index] + (request.service,)
                 LOG.debug('%s request %s is running with queue depth: %d'
-                          % (str(method_name), my_request_id,
+                          % (str(method_name), request.request_id,
                              len(service_queue)))
                 start_time = time()
                 result = method(*args, **kwargs)
+                elapsed = time() - start_time
+                metrics.REQUEST_SECONDS.observe(elapsed, method=method_name)
                 LOG.debug('%s request %s took %.5f secs'
-                          % (str(method_name), my_request_id,
-                             time() - start_time))
-            except Exception:
+                          % (str(method_name), request.request_id, elapsed))
+            except Exception as exc:
+                error = exc
                 LOG.error('%s request %s FAILED'
-                          % (str(method_name), my_request_id))
+                          % (str(method_name), request.request_id))
                 raise
             finally:
-                service_queue.pop(0)
+                service_queue.complete(request, result, error)
             return result
         return wrapper
     return real_serialized
 
 
-def request_index(request_queue, request_id):
-    """Get index of request in request queue.
-
-    If we are not in the queue return the length of the list.
-    """
-    for request in request_queue:
-        if request[0] == request_id:
-            return request_queue.index(request)
-    return len(request_queue)
-
-
 def get_filter(bigip, key, op, value):
     if LooseVersion(bigip.tmos_version) < LooseVersion('11.6.0'):
         return '$filter=%s+%s+%s' % (key, op, value)
@@ -0,0 +1,597 @@
+# coding=utf-8
+"""In-process model of the iControl® REST API of BIG-IP® devices."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import collections
+import contextlib
+import copy
+import httplib
+import json
+import urllib
+import urlparse
+
+import eventlet
+import requests
+from requests import adapters
+from requests import structures
+
+TRANSACTION_HEADER = 'X-F5-REST-Coordination-Id'
+
+# Collections modeled by FakeBigIP, as paths below /mgmt/tm/. A URI
+# segment following one of these is the name of an object.
+COLLECTIONS = frozenset([
+    'cm/device',
+    'cm/device-group',
+    'cm/traffic-group',
+    'ltm/monitor/http',
+    'ltm/monitor/https',
+    'ltm/monitor/ping',
+    'ltm/monitor/tcp',
+    'ltm/node',
+    'ltm/persistence/universal',
+    'ltm/pool',
+    'ltm/profile/client-ssl',
+    'ltm/rule',
+    'ltm/snat',
+    'ltm/snat-translation',
+    'ltm/snatpool',
+    'ltm/virtual',
+    'ltm/virtual-address',
+    'net/arp',
+    'net/fdb/tunnel',
+    'net/interface',
+    'net/route',
+    'net/route-domain',
+    'net/self',
+    'net/tunnels/gre',
+    'net/tunnels/ppp',
+    'net/tunnels/tunnel',
+    'net/tunnels/vxlan',
+    'net/vlan',
+    'sys/db',
+    'sys/folder',
+])
+
+# Subcollections of the objects of a collection.
+SUBCOLLECTIONS = {
+    'ltm/pool': ('members',),
+}
+
+# Resources which run a command when posted to.
+COMMANDS = frozenset(['cm/sync', 'sys/config', 'util/bash'])
+
+# Resources without a name, which are only read or modified; sys is
+# read by the SDK for the TMOS version of the device.
+UNNAMED = frozenset(['cm/sync-status', 'sys', 'sys/global-settings'])
+
+# Collections of partitioned objects. Objects of the others are
+# unpartitioned, e.g. folders, or are all in /Common.
+PARTITIONED = COLLECTIONS - frozenset([
+    'cm/device', 'cm/device-group', 'cm/traffic-group', 'net/interface',
+    'sys/db', 'sys/folder'])
+
+
+class RestError(Exception):
+    """Error response of the fake REST API."""
+
+    def __init__(self, status, message):
+        super(RestError, self).__init__(message)
+        self.status = status
+
+
+def _kind(path, suffix):
+    # tm:ltm:pool:members:membersstate for ltm/pool/members
+    segments = path.split('/')
+    return 'tm:%s:%s%s' % (':'.join(segments), segments[-1], suffix)
+
+
+def _segment_path(segment):
+    # ~Project_1~pool1 ==> /Project_1/pool1, pool1 ==> /Common/pool1
+    if segment.startswith('~'):
+        return '/' + segment[1:].replace('~', '/')
+    return '/Common/' + segment
+
+
+def _path_segment(full_path):
+    return urllib.quote(full_path.replace('/', '~'), safe='~:')
+
+
+class FakeBigIP(object):
+    u"""Configuration objects of one BIG-IP®, served over a fake REST API.
+
+    Objects are kept as the JSON dicts the device would return, by
+    collection and full path. Creating an object in a partition which
+    does not exist, creating an object twice and deleting a folder which
+    is not empty fail as they do on a device. A few objects are managed
+    by the device: virtual addresses are created for the destinations of
+    virtual servers, nodes for the addresses of pool members and FDB
+    tunnels for tunnels.
+
+    Collections are filtered by partition and their items reduced to
+    the properties in $select, without kind or selfLink, so that the SDK
+    returns them as dicts as it does for a device. Requests carrying a
+    transaction header are queued and applied together when the
+    transaction is committed, or not at all if one of them fails.
+
+    A device given a device_group is In Sync in that sync-failover
+    group, otherwise it is Standalone.
+
+    Each request takes latency seconds, or write_latency seconds for
+    requests other than GET, slept with eventlet so that requests to
+    several devices overlap.
+    """
+
+    def __init__(self, hostname, latency=0.0, write_latency=None,
+                 version='11.6.0', mac_prefix='fa:16:3e:00:00',
+                 vtep_address='201.0.0.1/16', device_group=None):
+        self.hostname = hostname
+        self.latency = latency
+        self.write_latency = latency if write_latency is None \
+            else write_latency
+        self.version = version
+        self.mac_prefix = mac_prefix
+        self.vtep_address = vtep_address
+        self.device_group = device_group
+        # (method, collection path) -> requests
+        self.requests = collections.Counter()
+        # URIs requested which the fake does not model
+        self.unmodeled = collections.Counter()
+        self.adapter = FakeBigIPAdapter(self)
+        self.reset()
+
+    def reset(self):
+        """Drop all configuration but that of a freshly licensed device."""
+        # collection path -> {full path: object}
+        self.objects = collections.defaultdict(collections.OrderedDict)
+        # transaction id -> [(method, path, body)]
+        self.transactions = {}
+        self._next_transaction_id = 1
+        self._generation = 0
+        device_name = self.hostname.split('.')[0]
+        for name in ('/', 'Common'):
+            self._put('sys/folder', {'name': name, 'subPath': '/'})
+        self._put('sys/db', {'name': 'provision.extramb', 'value': '500'})
+        self._put('sys/db', {'name': 'iptunnel.configsync',
+                             'value': 'disable'})
+        self._put('cm/device', {
+            'name': device_name, 'partition': 'Common',
+            'selfDevice': 'true', 'version': self.version,
+            'chassisId': 'fake-%s' % device_name,
+            'managementIp': self.hostname})
+        if self.device_group:
+            self._put('cm/device-group', {
+                'name': self.device_group, 'partition': 'Common',
+                'type': 'sync-failover', 'autoSync': 'enabled'})
+        for name in ('traffic-group-1', 'traffic-group-local-only'):
+            self._put('cm/traffic-group', {'name': name,
+                                           'partition': 'Common'})
+        for index, name in enumerate(('1.1', '1.2', 'mgmt')):
+            self._put('net/interface', {
+                'name': name,
+                'macAddress': '%s:%02x' % (self.mac_prefix, index + 1)})
+        self._put('net/route-domain', {'name': '0', 'partition': 'Common',
+                                       'id': 0, 'vlans': []})
+        for name in ('vxlan', 'gre'):
+            self._put('net/tunnels/%s' % name,
+                      {'name': name, 'partition': 'Common'})
+        # The VTEP of the agent, on an untagged VLAN
+        self._put('net/vlan', {'name': 'external', 'partition': 'Common',
+                               'interfaces': [{'name': '1.1',
+                                               'untagged': True}]})
+        self._put('net/self', {'name': 'vtep', 'partition': 'Common',
+                               'address': self.vtep_address,
+                               'vlan': '/Common/external',
+                               'trafficGroup': 'traffic-group-local-only'})
+
+    def add(self, collection, model):
+        """Add an object to the configuration, e.g. a pre-existing VLAN."""
+        self._put(collection, dict(model))
+
+    def find(self, collection, partition=None):
+        """Return the objects of a collection, optionally of a partition."""
+        return [obj for obj in self.objects[collection].values()
+                if partition is None or obj.get('partition') == partition]
+
+    def count_objects(self, partition=None):
+        """Return the number of objects in a partition, or all partitions."""
+        return sum(len(self.find(collection, partition))
+                   for collection in self.objects)
+
+    def handle(self, method, url, headers=None, body=None):
+        """Answer a REST request with (HTTP status, JSON body)."""
+        path, query = self._parse(url)
+        self.requests[(method, self._collection_of(path))] += 1
+        eventlet.sleep(self.latency if method == 'GET'
+                       else self.write_latency)
+        transaction_id = (headers or {}).get(TRANSACTION_HEADER)
+        try:
+            if transaction_id and method != 'GET':
+                return 200, self._enqueue(transaction_id, method, path, body)
+            if path.startswith('transaction'):
+                return 200, self._transaction(method, path, body)
+            return 200, self._apply(method, path, query, body)
+        except RestError as err:
+            return err.status, {'code': err.status, 'message': str(err),
+                                'errorStack': []}
+
+    def _parse(self, url):
+        parts = urlparse.urlsplit(url)
+        path = parts.path
+        if not path.startswith('/mgmt/tm/'):
+            raise RestError(404, 'Public URI path not registered: %s' % path)
+        query = dict((key, values[-1]) for key, values in
+                     urlparse.parse_qs(parts.query).items())
+        return path[len('/mgmt/tm/'):].strip('/'), query
+
+    def _collection_of(self, path):
+        segments = []
+        for segment in path.split('/'):
+            if segment.startswith('~') or segment.isdigit():
+                continue
+            segments.append(segment)
+        return '/'.join(segments)
+
+    def _resolve(self, path):
+        # Split path into (collection, full path of the object or None,
+        # subcollection or None, full path of the child or None).
+        segments = [urllib.unquote(segment) for segment in path.split('/')]
+        for end in range(len(segments), 0, -1):
+            collection = '/'.join(segments[:end])
+            if collection in COLLECTIONS or collection in COMMANDS or \
+                    collection in UNNAMED:
+                break
+        else:
+            self.unmodeled[path] += 1
+            raise RestError(404, 'Not modeled by the fake BIG-IP: %s' % path)
+        rest = segments[end:]
+        if not rest:
+            return collection, None, None, None
+        full_path = self._object_path(collection, rest[0])
+        if len(rest) == 1:
+            return collection, full_path, None, None
+        subcollection = rest[1]
+        if subcollection == 'stats' or \
+                subcollection not in SUBCOLLECTIONS.get(collection, ()):
+            self.unmodeled[path] += 1
+            raise RestError(404, 'Not modeled by the fake BIG-IP: %s' % path)
+        child = _segment_path(rest[2]) if len(rest) > 2 else None
+        return collection, full_path, subcollection, child
+
+    def _object_path(self, collection, segment):
+        if collection == 'sys/folder':
+            return '/' + segment.strip('~')
+        if collection not in PARTITIONED and not segment.startswith('~'):
+            return segment
+        return _segment_path(segment)
+
+    def _apply(self, method, path, query, body):
+        collection, full_path, subcollection, child = self._resolve(path)
+        if collection in COMMANDS:
+            if method != 'POST':
+                raise RestError(405, 'Method not allowed')
+            result = dict(body or {})
+            result['kind'] = _kind(collection, ':runstate')
+            return result
+        if collection in UNNAMED:
+            return self._unnamed(collection)
+        if subcollection:
+            parent = self._get(collection, full_path)
+            collection = '%s/%s/%s' % (collection,
+                                       _path_segment(parent['fullPath']),
+                                       subcollection)
+            full_path = child
+        if full_path is None:
+            if method == 'GET':
+                return self._list(collection, query)
+            if method == 'POST':
+                return self._create(collection, body or {})
+            raise RestError(405, 'Method not allowed')
+        if method == 'GET':
+            return self._get(collection, full_path)
+        if method in ('PATCH', 'PUT'):
+            return self._modify(collection, full_path, body or {})
+        if method == 'DELETE':
+            self._delete(collection, full_path)
+            return {}
+        raise RestError(405, 'Method not allowed')
+
+    def _unnamed(self, collection):
+        if collection == 'cm/sync-status':
+            status = 'In Sync' if self.device_group else 'Standalone'
+            return {'kind': 'tm:cm:sync-status:sync-statusstats',
+                    'selfLink': self._self_link(collection),
+                    'entries': {
+                        'https://localhost/mgmt/tm/cm/sync-status/0': {
+                            'nestedStats': {'entries': {
+                                'status': {'description': status}}}}}}
+        return {'kind': _kind(collection, 'state'),
+                'selfLink': self._self_link(collection),
+                'hostname': self.hostname}
+
+    def _self_link(self, collection, full_path=None):
+        path = collection
+        if full_path:
+            path += '/' + _path_segment(full_path)
+        return 'https://localhost/mgmt/tm/%s?ver=%s' % (path, self.version)
+
+    def _kind_of(self, collection):
+        return _kind(self._collection_of(collection), 'state')
+
+    def _full_path(self, collection, model):
+        partition = (model.get('partition') or '').strip('/')
+        if collection == 'sys/folder' or self._collection_of(collection) \
+                not in PARTITIONED and not partition:
+            if collection == 'sys/folder':
+                return '/' + model['name'].strip('/') \
+                    if model['name'] != '/' else '/'
+            return model['name']
+        partition = partition or 'Common'
+        if model.get('subPath'):
+            return '/%s/%s/%s' % (partition, model['subPath'], model['name'])
+        return '/%s/%s' % (partition, model['name'])
+
+    def _put(self, collection, model):
+        full_path = self._full_path(collection, model)
+        obj = dict(model)
+        if self._collection_of(collection) in PARTITIONED or \
+                obj.get('partition'):
+            obj['partition'] = (obj.get('partition') or 'Common').strip('/')
+        obj['fullPath'] = full_path
+        obj['kind'] = self._kind_of(collection)
+        obj['selfLink'] = self._self_link(collection, full_path)
+        self._generation += 1
+        obj['generation'] = self._generation
+        self.objects[collection][full_path] = obj
+        return obj
+
+    def _get(self, collection, full_path):
+        obj = self.objects[collection].get(full_path)
+        if obj is None:
+            raise RestError(404, 'The requested object (%s) was not found.'
+                            % full_path)
+        return obj
+
+    def _list(self, collection, query):
+        items = self.objects[collection].values()
+        condition = query.get('$filter', '').split()
+        if condition[:2] == ['partition', 'eq'] and len(condition) == 3:
+            items = [obj for obj in items
+                     if obj.get('partition') == condition[2]]
+        if query.get('expandSubcollections') == 'true':
+            items = [self._expand(collection, obj) for obj in items]
+        select = query.get('$select')
+        if select:
+            keys = set(select.split(','))
+            items = [dict((key, value) for key, value in obj.items()
+                          if key in keys) for obj in items]
+        return {'kind': _kind(self._collection_of(collection),
+                              'collectionstate'),
+                'selfLink': self._self_link(collection),
+                'items': list(items)}
+
+    def _expand(self, collection, obj):
+        obj = dict(obj)
+        for subcollection in SUBCOLLECTIONS.get(collection, ()):
+            path = '%s/%s/%s' % (collection, _path_segment(obj['fullPath']),
+                                 subcollection)
+            obj['%sReference' % subcollection] = {
+                'link': self._self_link(path),
+                'isSubcollection': True,
+                'items': self.objects[path].values()}
+        return obj
+
+    def _create(self, collection, body):
+        if 'name' not in body:
+            raise RestError(400, 'The name is required')
+        full_path = self._full_path(collection, body)
+        if full_path in self.objects[collection]:
+            raise RestError(409, '01020066:3: The requested object (%s) '
+                            'already exists.' % full_path)
+        partition = (body.get('partition') or '').strip('/')
+        if partition and '/' + partition not in self.objects['sys/folder']:
+            raise RestError(400, '01070523:3: The requested folder (/%s) '
+                            'was not found.' % partition)
+        base = self._collection_of(collection)
+        if base == 'ltm/pool/members':
+            self._assure_node(partition or 'Common', body['name'])
+        obj = self._put(collection, body)
+        if base == 'ltm/virtual':
+            self._assure_virtual_address(obj)
+        elif base == 'net/tunnels/tunnel':
+            self._put('net/fdb/tunnel', {'name': obj['name'],
+                                         'partition': obj['partition'],
+                                         'records': []})
+        return obj
+
+    def _assure_node(self, partition, member_name):
+        address = member_name.rsplit(':', 1)[0]
+        if '/%s/%s' % (partition, address) not in self.objects['ltm/node']:
+            self._put('ltm/node', {'name': address, 'partition': partition,
+                                   'address': address})
+
+    def _assure_virtual_address(self, virtual):
+        destination = virtual.get('destination')
+        if not destination:
+            return
+        address_path = destination.rsplit(':', 1)[0]
+        if not address_path.startswith('/'):
+            address_path = '/%s/%s' % (virtual['partition'], address_path)
+        if address_path not in self.objects['ltm/virtual-address']:
+            partition, name = address_path[1:].split('/', 1)
+            self._put('ltm/virtual-address', {
+                'name': name, 'partition': partition, 'address': name,
+                'autoDelete': 'true'})
+
+    def _modify(self, collection, full_path, body):
+        obj = self._get(collection, full_path)
+        for key, value in body.items():
+            if key not in ('name', 'partition', 'fullPath', 'kind',
+                           'selfLink', 'generation'):
+                obj[key] = value
+        self._generation += 1
+        obj['generation'] = self._generation
+        return obj
+
+    def _delete(self, collection, full_path):
+        obj = self._get(collection, full_path)
+        base = self._collection_of(collection)
+        if base == 'sys/folder':
+            partition = full_path.strip('/')
+            for path, objects in self.objects.items():
+                if path != 'sys/folder' and any(
+                        item.get('partition') == partition
+                        for item in objects.values()):
+                    raise RestError(400, '01070711:3: Cannot delete folder '
+                                    '%s, it is not empty.' % full_path)
+        elif base == 'ltm/pool':
+            for virtual in self.objects['ltm/virtual'].values():
+                if virtual.get('pool') == full_path:
+                    raise RestError(400, '01070265:3: The Pool (%s) cannot '
+                                    'be deleted because it is in use by a '
+                                    'Virtual Server (%s).'
+                                    % (full_path, virtual['fullPath']))
+            self.objects.pop('%s/%s/members' % (
+                collection, _path_segment(full_path)), None)
+        elif base == 'ltm/node':
+            for path, members in self.objects.items():
+                if path.endswith('/members') and any(
+                        member['fullPath'].rsplit(':', 1)[0] == full_path
+                        for member in members.values()):
+                    raise RestError(400, '01070110:3: Node address (%s) is '
+                                    'referenced by a member of pool.'
+                                    % full_path)
+        del self.objects[collection][full_path]
+        if base == 'ltm/virtual':
+            self._release_virtual_address(obj)
+        elif base == 'net/tunnels/tunnel':
+            self.objects['net/fdb/tunnel'].pop(full_path, None)
+
+    def _release_virtual_address(self, virtual):
+        destination = virtual.get('destination', '')
+        address_path = destination.rsplit(':', 1)[0]
+        address = self.objects['ltm/virtual-address'].get(address_path)
+        if address is None or address.get('autoDelete') == 'false':
+            return
+        for other in self.objects['ltm/virtual'].values():
+            if other.get('destination', '').rsplit(':', 1)[0] == \
+                    address_path:
+                return
+        del self.objects['ltm/virtual-address'][address_path]
+
+    def _enqueue(self, transaction_id, method, path, body):
+        commands = self.transactions.get(transaction_id)
+        if commands is None:
+            raise RestError(404, 'Transaction %s not found' % transaction_id)
+        commands.append((method, path, body))
+        return {'method': method,
+                'uri': 'https://localhost/mgmt/tm/%s' % path,
+                'body': body,
+                'evalOrder': len(commands),
+                'commandId': len(commands),
+                'kind': 'tm:transaction:commandsstate',
+                'selfLink': 'https://localhost/mgmt/tm/transaction/%s/'
+                            'commands/%d?ver=%s' % (transaction_id,
+                                                    len(commands),
+                                                    self.version)}
+
+    def _transaction(self, method, path, body):
+        segments = path.split('/')
+        if len(segments) == 1 and method == 'POST':
+            transaction_id = str(self._next_transaction_id)
+            self._next_transaction_id += 1
+            self.transactions[transaction_id] = []
+            return self._transaction_state(transaction_id, 'STARTED')
+        transaction_id = segments[1] if len(segments) > 1 else None
+        if transaction_id not in self.transactions:
+            raise RestError(404, 'Transaction %s not found' % transaction_id)
+        if method == 'DELETE':
+            del self.transactions[transaction_id]
+            return {}
+        if method == 'PATCH' and (body or {}).get('state') == 'VALIDATING':
+            self._commit(self.transactions.pop(transaction_id))
+            return self._transaction_state(transaction_id, 'COMPLETED')
+        if method == 'GET':
+            return self._transaction_state(transaction_id, 'STARTED')
+        raise RestError(405, 'Method not allowed')
+
+    def _transaction_state(self, transaction_id, state):
+        return {'transId': int(transaction_id), 'state': state,
+                'kind': 'tm:transactionstate',
+                'selfLink': 'https://localhost/mgmt/tm/transaction/%s?ver=%s'
+                            % (transaction_id, self.version)}
+
+    def _commit(self, commands):
+        saved = copy.deepcopy(self.objects)
+        try:
+            for method, path, body in commands:
+                self._apply(method, path, {}, body)
+        except RestError as err:
+            self.objects = saved
+            raise RestError(400, 'Transaction failed: %s' % err)
+
+
+class FakeBigIPAdapter(adapters.BaseAdapter):
+    """Transport adapter sending the requests of a session to a FakeBigIP."""
+
+    def __init__(self, device):
+        super(FakeBigIPAdapter, self).__init__()
+        self.device = device
+
+    def send(self, request, **kwargs):
+        body = None
+        if request.body:
+            body = json.loads(request.body)
+        status, payload = self.device.handle(request.method, request.url,
+                                             request.headers, body)
+        response = requests.Response()
+        response.status_code = status
+        response.reason = httplib.responses.get(status, '')
+        response.headers = structures.CaseInsensitiveDict(
+            {'Content-Type': 'application/json'})
+        response._content = json.dumps(payload)
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+@contextlib.contextmanager
+def serve(devices):
+    """Send the requests of all sessions for the devices' hostnames to them.
+
+    Usable around anything which opens iControl® REST sessions, e.g. the
+    SDK's ManagementRoot:
+
+        with serve([FakeBigIP('bigip1')]):
+            bigip = ManagementRoot('bigip1', 'admin', 'admin')
+    """
+    by_hostname = dict((device.hostname, device) for device in devices)
+    get_adapter = requests.Session.get_adapter
+
+    def get_fake_adapter(session, url):
+        device = by_hostname.get(urlparse.urlsplit(url).hostname)
+        if device:
+            return device.adapter
+        return get_adapter(session, url)
+
+    requests.Session.get_adapter = get_fake_adapter
+    try:
+        yield by_hostname
+    finally:
+        requests.Session.get_adapter = get_adapter
@@ -0,0 +1,326 @@
+# coding=utf-8
+"""In-memory stand-in for the LBaaSv2 plugin the agent talks to over RPC."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import collections
+import copy
+import socket
+import struct
+import time
+import uuid
+
+import eventlet
+
+ACTIVE = 'ACTIVE'
+ERROR = 'ERROR'
+PENDING_CREATE = 'PENDING_CREATE'
+PENDING_UPDATE = 'PENDING_UPDATE'
+PENDING_DELETE = 'PENDING_DELETE'
+PENDING_STATUSES = (PENDING_CREATE, PENDING_UPDATE, PENDING_DELETE)
+
+# Object type of status updates -> list of the service holding them
+SERVICE_LISTS = {'listener': 'listeners',
+                 'pool': 'pools',
+                 'member': 'members',
+                 'health_monitor': 'healthmonitors'}
+
+# Offset in its subnet of the first address handed out for agent ports,
+# above the addresses of the generated services.
+FIRST_PORT_ADDRESS = 200 * 256
+
+
+def _address_to_int(address):
+    return struct.unpack('!I', socket.inet_aton(address))[0]
+
+
+def _int_to_address(value):
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+class FakeLbaasPlugin(object):
+    """Loadbalancers and ports, as the plugin would keep them in Neutron.
+
+    Loadbalancers are kept as the service definitions the plugin would
+    send with each request; the benchmark changes them the way the
+    Neutron API would, e.g. add_object() adds a listener as
+    PENDING_CREATE. The agent reports back with update_statuses(),
+    which sets the statuses and drops destroyed objects.
+
+    Each call answered takes latency seconds.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        # loadbalancer id -> service
+        self.services = collections.OrderedDict()
+        # subnet id -> subnet, of all services
+        self.subnets = {}
+        # port id -> port
+        self.ports = {}
+        # subnet id -> offset of the next address handed out
+        self._next_address = {}
+        # RPC method -> calls
+        self.calls = collections.Counter()
+
+    def _answer(self, method):
+        self.calls[method] += 1
+        if self.latency:
+            eventlet.sleep(self.latency)
+
+    def add_service(self, service):
+        """Add a loadbalancer, with its pending objects."""
+        service = copy.deepcopy(service)
+        self.services[service['loadbalancer']['id']] = service
+        self.subnets.update(service['subnets'])
+
+    def get_service(self, lb_id):
+        """Return a copy of the service of a loadbalancer, as sent."""
+        return copy.deepcopy(self.services[lb_id])
+
+    def add_object(self, lb_id, service_list, obj):
+        """Add a pending object to the service of a loadbalancer."""
+        service = self.services[lb_id]
+        service[service_list].append(copy.deepcopy(obj))
+        self._reference(service, service_list, obj, add=True)
+        service['loadbalancer']['provisioning_status'] = PENDING_UPDATE
+
+    def _reference(self, service, service_list, obj, add):
+        # Keep the references of the loadbalancer to its listeners and
+        # of pools to their members and health monitor.
+        if service_list == 'listeners':
+            references = service['loadbalancer']['listeners']
+        elif service_list == 'members':
+            references = self._find(service, 'pools',
+                                    obj['pool_id'])['members']
+        elif service_list == 'healthmonitors':
+            pool = self._find(service, 'pools', obj['pool_id'])
+            pool['healthmonitor_id'] = obj['id'] if add else None
+            return
+        else:
+            return
+        if add:
+            references.append({'id': obj['id']})
+        else:
+            references[:] = [reference for reference in references
+                             if reference['id'] != obj['id']]
+
+    def update_object(self, lb_id, service_list, obj_id, **changes):
+        """Change an object and mark it PENDING_UPDATE.
+
+        :returns: copy of the object before the change.
+        """
+        service = self.services[lb_id]
+        obj = self._find(service, service_list, obj_id)
+        old = copy.deepcopy(obj)
+        obj.update(changes)
+        obj['provisioning_status'] = PENDING_UPDATE
+        service['loadbalancer']['provisioning_status'] = PENDING_UPDATE
+        return old
+
+    def delete_object(self, lb_id, service_list, obj_id):
+        """Mark an object PENDING_DELETE."""
+        service = self.services[lb_id]
+        if service_list == 'loadbalancer':
+            service['loadbalancer']['provisioning_status'] = PENDING_DELETE
+            return
+        self._find(service, service_list, obj_id)['provisioning_status'] = \
+            PENDING_DELETE
+        service['loadbalancer']['provisioning_status'] = PENDING_UPDATE
+
+    def _find(self, service, service_list, obj_id):
+        for obj in service[service_list]:
+            if obj['id'] == obj_id:
+                return obj
+        raise KeyError(obj_id)
+
+    def _has_status(self, lb_id, statuses):
+        service = self.services.get(lb_id)
+        if service is None:
+            return False
+        if service['loadbalancer']['provisioning_status'] in statuses:
+            return True
+        return any(obj['provisioning_status'] in statuses
+                   for service_list in SERVICE_LISTS.values()
+                   for obj in service[service_list])
+
+    def is_pending(self, lb_id):
+        """Whether the agent did not report on a change yet."""
+        return self._has_status(lb_id, PENDING_STATUSES)
+
+    def has_errors(self, lb_id):
+        """Whether the agent reported an object in ERROR."""
+        return self._has_status(lb_id, (ERROR,))
+
+    def wait(self, lb_ids, timeout=60.0, interval=0.01):
+        """Wait for the statuses of the loadbalancers to settle.
+
+        :returns: ids of the loadbalancers still pending at the timeout.
+        """
+        deadline = time.time() + timeout
+        pending = [lb_id for lb_id in lb_ids if self.is_pending(lb_id)]
+        while pending and time.time() < deadline:
+            eventlet.sleep(interval)
+            pending = [lb_id for lb_id in pending if self.is_pending(lb_id)]
+        return pending
+
+    # Calls of the agent.
+
+    def get_service_by_loadbalancer_id(self, context, loadbalancer_id=None,
+                                       host=None):
+        self._answer('get_service_by_loadbalancer_id')
+        service = self.services.get(loadbalancer_id)
+        return copy.deepcopy(service) if service else {}
+
+    def get_services_by_loadbalancer_ids(self, context, loadbalancer_ids=None,
+                                         host=None):
+        self._answer('get_services_by_loadbalancer_ids')
+        return [copy.deepcopy(self.services[lb_id])
+                for lb_id in loadbalancer_ids or []
+                if lb_id in self.services]
+
+    def _loadbalancers(self, condition):
+        return [{'lb_id': lb_id,
+                 'tenant_id': service['loadbalancer']['tenant_id']}
+                for lb_id, service in self.services.items()
+                if condition(lb_id, service)]
+
+    def get_all_loadbalancers(self, context, env=None, group=None,
+                              host=None):
+        self._answer('get_all_loadbalancers')
+        return self._loadbalancers(lambda lb_id, service: True)
+
+    def get_active_loadbalancers(self, context, env=None, group=None,
+                                 host=None):
+        self._answer('get_active_loadbalancers')
+        return self._loadbalancers(
+            lambda lb_id, service:
+                service['loadbalancer']['provisioning_status'] == ACTIVE)
+
+    def get_pending_loadbalancers(self, context, env=None, group=None,
+                                  host=None):
+        self._answer('get_pending_loadbalancers')
+        return self._loadbalancers(
+            lambda lb_id, service: self.is_pending(lb_id))
+
+    def update_statuses(self, context, loadbalancer_id=None, statuses=None):
+        self._answer('update_statuses')
+        service = self.services.get(loadbalancer_id)
+        if service is None:
+            return
+        for status in statuses or []:
+            if status['type'] == 'loadbalancer':
+                if status.get('destroyed'):
+                    del self.services[loadbalancer_id]
+                    return
+                objects = [service['loadbalancer']]
+            else:
+                objects = service[SERVICE_LISTS[status['type']]]
+            for obj in list(objects):
+                if obj['id'] != status['id']:
+                    continue
+                if status.get('destroyed'):
+                    objects.remove(obj)
+                    self._reference(service, SERVICE_LISTS[status['type']],
+                                    obj, add=False)
+                else:
+                    obj['provisioning_status'] = \
+                        status['provisioning_status']
+                    obj['operating_status'] = status['operating_status']
+
+    def _new_port(self, subnet_id, mac_address, name, ip_address):
+        subnet = self.subnets[subnet_id]
+        if not ip_address:
+            network_address = _address_to_int(subnet['cidr'].split('/')[0])
+            offset = self._next_address.get(subnet_id, FIRST_PORT_ADDRESS)
+            self._next_address[subnet_id] = offset + 1
+            ip_address = _int_to_address(network_address + offset)
+        port = {'admin_state_up': True,
+                'allowed_address_pairs': [],
+                'device_owner': 'network:f5lbaasv2',
+                'fixed_ips': [{'ip_address': ip_address,
+                               'subnet_id': subnet_id}],
+                'id': str(uuid.uuid4()),
+                'mac_address': mac_address or 'fa:16:3e:ff:%02x:%02x' % (
+                    len(self.ports) // 256 % 256, len(self.ports) % 256),
+                'name': name,
+                'network_id': subnet['network_id'],
+                'status': ACTIVE,
+                'tenant_id': subnet['tenant_id']}
+        self.ports[port['id']] = port
+        return copy.deepcopy(port)
+
+    def create_port_on_subnet(self, context, subnet_id=None,
+                              mac_address=None, name=None,
+                              fixed_address_count=1, host=None):
+        self._answer('create_port_on_subnet')
+        return self._new_port(subnet_id, mac_address, name, None)
+
+    def create_port_on_subnet_with_specific_ip(self, context, subnet_id=None,
+                                               mac_address=None, name=None,
+                                               ip_address=None, host=None):
+        self._answer('create_port_on_subnet_with_specific_ip')
+        return self._new_port(subnet_id, mac_address, name, ip_address)
+
+    def get_port_by_name(self, context, port_name=None):
+        self._answer('get_port_by_name')
+        return [copy.deepcopy(port) for port in self.ports.values()
+                if port['name'] == port_name]
+
+    def get_ports_on_network(self, context, network_id=None):
+        self._answer('get_ports_on_network')
+        return [copy.deepcopy(port) for port in self.ports.values()
+                if port['network_id'] == network_id]
+
+    def get_ports_for_mac_addresses(self, context, mac_addresses=None):
+        self._answer('get_ports_for_mac_addresses')
+        return []
+
+    def delete_port_by_name(self, context, port_name=None):
+        self._answer('delete_port_by_name')
+        for port_id, port in self.ports.items():
+            if port['name'] == port_name:
+                del self.ports[port_id]
+
+    def delete_port(self, context, port_id=None, mac_address=None):
+        self._answer('delete_port')
+        for candidate_id, port in self.ports.items():
+            if candidate_id == port_id or \
+                    (mac_address and port['mac_address'] == mac_address):
+                del self.ports[candidate_id]
+
+    def add_allowed_address(self, context, port_id=None, ip_address=None):
+        self._answer('add_allowed_address')
+        return True
+
+    def remove_allowed_address(self, context, port_id=None, ip_address=None):
+        self._answer('remove_allowed_address')
+        return True
+
+
+class FakeRPCClient(object):
+    """RPC client delivering calls and casts straight to a plugin."""
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+
+    def prepare(self, **options):
+        return self
+
+    def call(self, context, method, **kwargs):
+        return getattr(self.plugin, method)(context, **kwargs)
+
+    def cast(self, context, method, **kwargs):
+        getattr(self.plugin, method)(context, **kwargs)
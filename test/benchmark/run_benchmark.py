@@ -0,0 +1,348 @@
+# coding=utf-8
+#
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Benchmark the agent against simulated BIG-IP devices.
+
+Runs an LbaasAgentManager with the iControlDriver against FakeBigIP
+devices and a FakeLbaasPlugin, provisions generated loadbalancers the
+way the Neutron server would and reports the throughput of each phase:
+
+    create  loadbalancers, then their listeners, pools, members and
+            health monitors, one request at a time per loadbalancer
+    update  listener descriptions and member weights
+    resync  all loadbalancers after the devices lost their config
+    delete  health monitors, members, pools, listeners, loadbalancers
+
+    PYTHONPATH=. python test/benchmark/run_benchmark.py \\
+        --loadbalancers 20 --listeners 2 --members 5 --tenants 4 \\
+        --latency 0.01
+
+Needs the agent's dependencies, Neutron and neutron-lbaas among them,
+but no BIG-IP, message queue or database.
+"""
+import argparse
+import collections
+import json
+import sys
+import time
+
+import eventlet
+import mock
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from neutron.agent.common import config
+# Registers the core options of Neutron, host among them.
+from neutron.common import config as common_config  # noqa
+
+from f5_openstack_agent.lbaasv2.drivers.bigip import agent_manager
+from f5_openstack_agent.lbaasv2.drivers.bigip import icontrol_driver
+from f5_openstack_agent.lbaasv2.drivers.bigip import plugin_rpc
+
+from fake_bigip import FakeBigIP
+from fake_bigip import serve
+from fake_plugin import FakeLbaasPlugin
+from fake_plugin import FakeRPCClient
+from service_generator import ServiceGenerator
+
+LOG = logging.getLogger(__name__)
+
+# Order in which the objects of a loadbalancer are deleted.
+DELETE_ORDER = (('healthmonitors', 'delete_health_monitor'),
+                ('members', 'delete_member'),
+                ('pools', 'delete_pool'),
+                ('listeners', 'delete_listener'))
+
+
+class BenchmarkAgentManager(agent_manager.LbaasAgentManager):
+    """Agent manager talking to a FakeLbaasPlugin instead of RPC."""
+
+    plugin = None
+
+    def _setup_rpc(self):
+        with mock.patch.object(plugin_rpc.rpc, 'get_client',
+                               return_value=FakeRPCClient(self.plugin)):
+            self.plugin_rpc = plugin_rpc.LBaaSv2PluginRPC(
+                None, self.context, self.conf.environment_prefix,
+                self.conf.environment_group_number, self.agent_host)
+        self.lbdriver.set_plugin_rpc(self.plugin_rpc)
+        # Tunnel and L2 population notifications go nowhere.
+        self.lbdriver.set_tunnel_rpc(mock.MagicMock())
+        self.lbdriver.set_l2pop_rpc(mock.MagicMock())
+
+
+def configure(args, hostnames):
+    conf = cfg.CONF
+    conf.register_opts(agent_manager.OPTS)
+    conf.register_opts(icontrol_driver.OPTS)
+    config.register_agent_state_opts_helper(conf)
+    config.register_root_helper(conf)
+    conf(args=[], project='neutron')
+    overrides = {
+        'debug': args.debug,
+        'host': 'benchmark',
+        'icontrol_hostname': ','.join(hostnames),
+        'f5_ha_type': 'standalone' if len(hostnames) == 1 else 'scalen',
+        'f5_global_routed_mode': False,
+        'advertised_tunnel_types': ['vxlan'],
+        'f5_vtep_folder': 'Common',
+        'f5_vtep_selfip_name': 'vtep',
+        'f5_use_transactions': args.transactions,
+        'l2_population': True,
+        'environment_prefix': 'Project',
+        'max_concurrent_loadbalancers': args.concurrency,
+        'rest_slow_call_threshold': 0,
+    }
+    for name, value in overrides.items():
+        conf.set_override(name, value)
+    logging.setup(conf, 'f5-benchmark')
+    return conf
+
+
+class Benchmark(object):
+    def __init__(self, manager, plugin, devices, services, timeout):
+        self.manager = manager
+        self.plugin = plugin
+        self.devices = devices
+        self.services = services
+        self.timeout = timeout
+        self.context = manager.context
+        self.results = []
+        self._operations = 0
+        self._errors = collections.Counter()
+
+    def _send(self, lb_id, method, *objects):
+        # Wait for the previous request to settle, as Neutron refuses
+        # changes to a pending loadbalancer, then send the next one.
+        if self.plugin.wait([lb_id], self.timeout):
+            self._errors['timeout'] += 1
+            return
+        service = self.plugin.get_service(lb_id)
+        self._operations += 1
+        try:
+            getattr(self.manager, method)(self.context,
+                                          *(objects + (service,)))
+        except Exception as exc:
+            LOG.error("%s of %s failed: %s" % (method, lb_id, exc))
+            self._errors[method] += 1
+
+    def _new(self, lb_id, service_list, obj):
+        self.plugin.add_object(lb_id, service_list, obj)
+        return self.plugin.get_service(lb_id)[service_list][-1]
+
+    def _requests(self):
+        return sum(sum(device.requests.values()) for device in self.devices)
+
+    def _phase(self, name, run, lb_ids):
+        self._operations = 0
+        self._errors = collections.Counter()
+        requests = self._requests()
+        start_time = time.time()
+        run(lb_ids)
+        pending = self.plugin.wait(lb_ids, self.timeout)
+        seconds = time.time() - start_time
+        requests = self._requests() - requests
+        if pending:
+            self._errors['pending'] += len(pending)
+        for lb_id in lb_ids:
+            if self.plugin.has_errors(lb_id):
+                self._errors['error_status'] += 1
+        result = collections.OrderedDict([
+            ('phase', name),
+            ('loadbalancers', len(lb_ids)),
+            ('operations', self._operations),
+            ('seconds', round(seconds, 3)),
+            ('loadbalancers_per_second', round(len(lb_ids) / seconds, 2)),
+            ('operations_per_second',
+             round(self._operations / seconds, 2)),
+            ('rest_requests', requests),
+            ('rest_requests_per_operation',
+             round(float(requests) / max(self._operations, 1), 1)),
+            ('errors', dict(self._errors))])
+        self.results.append(result)
+        return result
+
+    def _each(self, run_one):
+        def run(lb_ids):
+            pool = eventlet.GreenPool(len(lb_ids) or 1)
+            for lb_id in lb_ids:
+                pool.spawn_n(run_one, lb_id)
+            pool.waitall()
+        return run
+
+    def create(self, lb_id):
+        full = self.services[lb_id]
+        skeleton = dict(full, listeners=[], pools=[], members=[],
+                        healthmonitors=[])
+        skeleton['loadbalancer'] = dict(full['loadbalancer'], listeners=[])
+        self.plugin.add_service(skeleton)
+        self._send(lb_id, 'create_loadbalancer',
+                   self.plugin.get_service(lb_id)['loadbalancer'])
+        for listener, pool, monitor in zip(full['listeners'], full['pools'],
+                                           full['healthmonitors']):
+            self._send(lb_id, 'create_listener',
+                       self._new(lb_id, 'listeners', listener))
+            self._send(lb_id, 'create_pool', self._new(
+                lb_id, 'pools', dict(pool, members=[],
+                                     healthmonitor_id=None)))
+            for member in full['members']:
+                if member['pool_id'] == pool['id']:
+                    self._send(lb_id, 'create_member',
+                               self._new(lb_id, 'members', member))
+            self._send(lb_id, 'create_health_monitor',
+                       self._new(lb_id, 'healthmonitors', monitor))
+
+    def update(self, lb_id):
+        service = self.plugin.get_service(lb_id)
+        for listener in service['listeners']:
+            old = self.plugin.update_object(
+                lb_id, 'listeners', listener['id'],
+                description='updated by the benchmark')
+            self._send(lb_id, 'update_listener', old, self._current(
+                lb_id, 'listeners', listener['id']))
+        for member in service['members']:
+            old = self.plugin.update_object(
+                lb_id, 'members', member['id'], weight=member['weight'] + 1)
+            self._send(lb_id, 'update_member', old, self._current(
+                lb_id, 'members', member['id']))
+
+    def _current(self, lb_id, service_list, obj_id):
+        for obj in self.plugin.get_service(lb_id)[service_list]:
+            if obj['id'] == obj_id:
+                return obj
+
+    def resync(self, lb_ids):
+        for device in self.devices:
+            device.reset()
+        self.manager.lbdriver.flush_cache()
+        self.manager.needs_service_check = True
+        self._operations = 1
+        if self.manager.sync_state():
+            self._errors['sync_state'] += 1
+        for lb_id in lb_ids:
+            service = self.services[lb_id]
+            partition = 'Project_' + service['loadbalancer']['tenant_id']
+            listener_names = set('Project_' + listener['id']
+                                 for listener in service['listeners'])
+            for device in self.devices:
+                names = set(virtual['name'] for virtual in
+                            device.find('ltm/virtual', partition))
+                if not listener_names.issubset(names):
+                    self._errors['not_restored'] += 1
+
+    def delete(self, lb_id):
+        service = self.plugin.get_service(lb_id)
+        for service_list, method in DELETE_ORDER:
+            for obj in service[service_list]:
+                self.plugin.delete_object(lb_id, service_list, obj['id'])
+                self._send(lb_id, method, self._current(
+                    lb_id, service_list, obj['id']))
+        self.plugin.delete_object(lb_id, 'loadbalancer', lb_id)
+        self._send(lb_id, 'delete_loadbalancer',
+                   self.plugin.get_service(lb_id)['loadbalancer'])
+
+    def run(self, phases):
+        lb_ids = list(self.services)
+        for name in phases:
+            if name == 'resync':
+                result = self._phase(name, self.resync, lb_ids)
+            else:
+                result = self._phase(name, self._each(getattr(self, name)),
+                                     lb_ids)
+            print_result(result)
+        return self.results
+
+
+def print_result(result):
+    print('%-7s %4d LBs %6d ops %8.3f secs %8.2f LB/s %8.2f ops/s '
+          '%7d REST requests %6.1f per op  errors: %s' % (
+              result['phase'], result['loadbalancers'], result['operations'],
+              result['seconds'], result['loadbalancers_per_second'],
+              result['operations_per_second'], result['rest_requests'],
+              result['rest_requests_per_operation'],
+              result['errors'] or 'none'))
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the agent against simulated BIG-IP devices.')
+    parser.add_argument('--loadbalancers', type=int, default=10)
+    parser.add_argument('--listeners', type=int, default=1,
+                        help='listeners, each with a pool, per loadbalancer')
+    parser.add_argument('--members', type=int, default=2,
+                        help='members per pool')
+    parser.add_argument('--tenants', type=int, default=2)
+    parser.add_argument('--devices', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds taken by each REST request')
+    parser.add_argument('--write-latency', type=float, default=None,
+                        help='seconds taken by each REST request but GET, '
+                             'defaults to --latency')
+    parser.add_argument('--rpc-latency', type=float, default=0.0,
+                        help='seconds taken by each call to the plugin')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='max_concurrent_loadbalancers of the driver')
+    parser.add_argument('--transactions', action='store_true',
+                        help='set f5_use_transactions')
+    parser.add_argument('--phases', default='create,update,resync,delete')
+    parser.add_argument('--timeout', type=float, default=120.0,
+                        help='seconds to wait for a loadbalancer to settle')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='file to write the results to')
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args(argv)
+    eventlet.monkey_patch()
+
+    hostnames = ['bigip%d' % (index + 1) for index in range(args.devices)]
+    device_group = 'benchmark-group' if args.devices > 1 else None
+    devices = [FakeBigIP(hostname, latency=args.latency,
+                         write_latency=args.write_latency,
+                         vtep_address='201.0.0.%d/16' % (index + 1),
+                         device_group=device_group)
+               for index, hostname in enumerate(hostnames)]
+    generator = ServiceGenerator(tenants=args.tenants,
+                                 listeners=args.listeners,
+                                 members=args.members, seed=args.seed)
+    services = collections.OrderedDict(
+        (service['loadbalancer']['id'], service)
+        for service in generator.services(args.loadbalancers))
+
+    conf = configure(args, hostnames)
+    plugin = FakeLbaasPlugin(latency=args.rpc_latency)
+    BenchmarkAgentManager.plugin = plugin
+    with serve(devices):
+        manager = BenchmarkAgentManager(conf)
+        benchmark = Benchmark(manager, plugin, devices, services,
+                              args.timeout)
+        results = benchmark.run(args.phases.split(','))
+
+    unmodeled = collections.Counter()
+    for device in devices:
+        unmodeled.update(device.unmodeled)
+    if unmodeled:
+        print('REST requests not modeled by the fake devices:')
+        for path, count in unmodeled.most_common():
+            print('  %6d %s' % (count, path))
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'parameters': vars(args), 'results': results,
+                       'plugin_calls': dict(plugin.calls),
+                       'unmodeled': dict(unmodeled)}, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
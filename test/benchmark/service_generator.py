@@ -0,0 +1,242 @@
+# coding=utf-8
+"""Generate LBaaSv2 service definitions for the offline benchmark."""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import random
+import uuid
+
+PENDING_CREATE = 'PENDING_CREATE'
+
+# Segmentation id of the VXLAN network of the first tenant.
+FIRST_SEGMENTATION_ID = 1000
+
+# VTEPs of the compute nodes the members are on.
+COMPUTE_VTEPS = ['201.0.1.%d' % host for host in range(10, 14)]
+
+
+class ServiceGenerator(object):
+    """Service definitions as sent by the LBaaSv2 plugin to the agent.
+
+    Each of the tenants has one VXLAN network with one subnet,
+    10.<tenant + 1>.0.0/16. Each loadbalancer has a VIP on the subnet of
+    its tenant and listeners HTTP listeners, each with a pool of members
+    members and an HTTP health monitor. Members of the pools of one
+    loadbalancer share their backend addresses, as the instances behind
+    the different ports of a service would.
+
+    Ids are drawn from a random generator with a fixed seed, so that
+    runs with the same parameters provision the same objects.
+    """
+
+    def __init__(self, tenants=1, listeners=1, members=1, seed=0):
+        self.tenants = tenants
+        self.listeners = listeners
+        self.members = members
+        self._random = random.Random(seed)
+        self._networks = [self._network(index) for index in range(tenants)]
+        self._lb_count = 0
+
+    def _uuid(self):
+        return str(uuid.UUID(int=self._random.getrandbits(128), version=4))
+
+    def _mac_address(self):
+        return 'fa:16:3e:%02x:%02x:%02x' % tuple(
+            self._random.randint(0, 255) for _ in range(3))
+
+    def _network(self, index):
+        tenant_id = self._uuid().replace('-', '')
+        network_id = self._uuid()
+        subnet_id = self._uuid()
+        network = {
+            'admin_state_up': True,
+            'id': network_id,
+            'mtu': 0,
+            'name': 'benchmark-network-%d' % index,
+            'provider:network_type': 'vxlan',
+            'provider:physical_network': None,
+            'provider:segmentation_id': FIRST_SEGMENTATION_ID + index,
+            'router:external': False,
+            'shared': False,
+            'status': 'ACTIVE',
+            'subnets': [subnet_id],
+            'tenant_id': tenant_id,
+            'vlan_transparent': None
+        }
+        prefix = '10.%d' % (index + 1)
+        subnet = {
+            'allocation_pools': [{'start': prefix + '.0.2',
+                                  'end': prefix + '.255.254'}],
+            'cidr': prefix + '.0.0/16',
+            'dns_nameservers': [],
+            'enable_dhcp': True,
+            'gateway_ip': prefix + '.0.1',
+            'host_routes': [],
+            'id': subnet_id,
+            'ip_version': 4,
+            'ipv6_address_mode': None,
+            'ipv6_ra_mode': None,
+            'name': 'benchmark-subnet-%d' % index,
+            'network_id': network_id,
+            'shared': False,
+            'subnetpool_id': None,
+            'tenant_id': tenant_id
+        }
+        return {'tenant_id': tenant_id, 'network': network, 'subnet': subnet,
+                'prefix': prefix, 'next_host': 10}
+
+    def _address(self, network):
+        host = network['next_host']
+        network['next_host'] += 1
+        return '%s.%d.%d' % (network['prefix'], host // 250, host % 250 + 2)
+
+    def _port(self, network, address, name, device_owner):
+        return {
+            'admin_state_up': True,
+            'allowed_address_pairs': [],
+            'binding:host_id': '',
+            'device_id': self._uuid(),
+            'device_owner': device_owner,
+            'fixed_ips': [{'ip_address': address,
+                           'subnet_id': network['subnet']['id']}],
+            'id': self._uuid(),
+            'mac_address': self._mac_address(),
+            'name': name,
+            'network_id': network['network']['id'],
+            'status': 'ACTIVE',
+            'tenant_id': network['tenant_id']
+        }
+
+    def services(self, count):
+        """Return count services, spread over the tenants in turn."""
+        return [self.service() for _ in range(count)]
+
+    def service(self):
+        """Return the service definition of a new loadbalancer.
+
+        All objects are PENDING_CREATE.
+        """
+        network = self._networks[self._lb_count % self.tenants]
+        self._lb_count += 1
+        tenant_id = network['tenant_id']
+        lb_id = self._uuid()
+        vip_address = self._address(network)
+        vip_port = self._port(network, vip_address,
+                              'loadbalancer-%s' % lb_id,
+                              'network:f5lbaasv2')
+        loadbalancer = {
+            'admin_state_up': True,
+            'description': '',
+            'gre_vteps': [],
+            'id': lb_id,
+            'listeners': [],
+            'name': 'benchmark-lb-%d' % self._lb_count,
+            'network_id': network['network']['id'],
+            'operating_status': 'OFFLINE',
+            'provider': 'f5networks',
+            'provisioning_status': PENDING_CREATE,
+            'tenant_id': tenant_id,
+            'vip_address': vip_address,
+            'vip_port': vip_port,
+            'vip_port_id': vip_port['id'],
+            'vip_subnet_id': network['subnet']['id'],
+            'vxlan_vteps': list(COMPUTE_VTEPS)
+        }
+        service = {'loadbalancer': loadbalancer,
+                   'listeners': [],
+                   'pools': [],
+                   'members': [],
+                   'healthmonitors': [],
+                   'networks': {network['network']['id']: network['network']},
+                   'subnets': {network['subnet']['id']: network['subnet']}}
+
+        backends = [self._address(network) for _ in range(self.members)]
+        for index in range(self.listeners):
+            listener_id = self._uuid()
+            pool_id = self._uuid()
+            monitor_id = self._uuid()
+            loadbalancer['listeners'].append({'id': listener_id})
+            service['listeners'].append({
+                'admin_state_up': True,
+                'connection_limit': -1,
+                'default_pool_id': pool_id,
+                'default_tls_container_id': None,
+                'description': '',
+                'id': listener_id,
+                'loadbalancer_id': lb_id,
+                'name': 'listener-%d' % index,
+                'operating_status': 'OFFLINE',
+                'protocol': 'HTTP',
+                'protocol_port': 80 + index,
+                'provisioning_status': PENDING_CREATE,
+                'sni_containers': [],
+                'tenant_id': tenant_id
+            })
+            pool = {
+                'admin_state_up': True,
+                'description': '',
+                'healthmonitor_id': monitor_id,
+                'id': pool_id,
+                'lb_algorithm': 'ROUND_ROBIN',
+                'listener_id': listener_id,
+                'listeners': [{'id': listener_id}],
+                'loadbalancer_id': lb_id,
+                'members': [],
+                'name': 'pool-%d' % index,
+                'operating_status': 'OFFLINE',
+                'protocol': 'HTTP',
+                'provisioning_status': PENDING_CREATE,
+                'session_persistence': None,
+                'tenant_id': tenant_id
+            }
+            service['pools'].append(pool)
+            for address in backends:
+                member_id = self._uuid()
+                pool['members'].append({'id': member_id})
+                service['members'].append({
+                    'address': address,
+                    'admin_state_up': True,
+                    'gre_vteps': [],
+                    'id': member_id,
+                    'name': '',
+                    'network_id': network['network']['id'],
+                    'operating_status': 'OFFLINE',
+                    'pool_id': pool_id,
+                    'port': self._port(network, address,
+                                       'member-%s' % member_id,
+                                       'compute:nova'),
+                    'protocol_port': 8080 + index,
+                    'provisioning_status': PENDING_CREATE,
+                    'subnet_id': network['subnet']['id'],
+                    'tenant_id': tenant_id,
+                    'vxlan_vteps': list(COMPUTE_VTEPS),
+                    'weight': 1
+                })
+            service['healthmonitors'].append({
+                'admin_state_up': True,
+                'delay': 5,
+                'expected_codes': '200',
+                'http_method': 'GET',
+                'id': monitor_id,
+                'max_retries': 3,
+                'name': '',
+                'pool_id': pool_id,
+                'provisioning_status': PENDING_CREATE,
+                'timeout': 2,
+                'type': 'HTTP',
+                'url_path': '/',
+                'tenant_id': tenant_id
+            })
+        return service
@@ -0,0 +1,165 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import time
+
+from f5.bigip import ManagementRoot
+import pytest
+from requests import HTTPError
+
+from f5_openstack_agent.lbaasv2.drivers.bigip import device_fanout
+from f5_openstack_agent.lbaasv2.drivers.bigip import exceptions as f5ex
+from f5_openstack_agent.lbaasv2.drivers.bigip import network_helper
+from f5_openstack_agent.lbaasv2.drivers.bigip import resource_helper
+from f5_openstack_agent.lbaasv2.drivers.bigip import state_store
+from f5_openstack_agent.lbaasv2.drivers.bigip import system_helper
+from f5_openstack_agent.lbaasv2.drivers.bigip import transaction
+
+from fake_bigip import FakeBigIP
+from fake_bigip import serve
+
+
+@pytest.fixture
+def device():
+    return FakeBigIP('bigip1')
+
+
+@pytest.fixture
+def bigip(device):
+    with serve([device]):
+        yield ManagementRoot('bigip1', 'admin', 'admin')
+
+
+@pytest.fixture
+def partition(bigip):
+    system_helper.SystemHelper().create_folder(
+        bigip, {'name': 'Project_t', 'subPath': '/'})
+    return 'Project_t'
+
+
+class TestFakeBigIP(object):
+    def test_seed(self, bigip):
+        helper = system_helper.SystemHelper()
+        assert bigip.tmos_version == '11.6.0'
+        assert helper.get_version(bigip) == '11.6.0'
+        assert helper.get_provision_extramb(bigip) == '500'
+        assert helper.get_folders(bigip) == ['/', 'Common']
+        assert network_helper.NetworkHelper().get_selfip_addr(
+            bigip, 'vtep', partition='Common') == '201.0.0.1/16'
+
+    def test_managed_objects(self, bigip, device, partition):
+        pool = bigip.tm.ltm.pools.pool.create(name='pool1',
+                                              partition=partition)
+        pool.members_s.members.create(name='10.0.0.1:80',
+                                      partition=partition)
+        virtual = bigip.tm.ltm.virtuals.virtual.create(
+            name='vs1', partition=partition,
+            destination='/Project_t/10.1.0.5:80', pool='/Project_t/pool1')
+        assert [node['fullPath'] for node in device.find('ltm/node')] == \
+            ['/Project_t/10.0.0.1']
+        assert [address.fullPath for address in
+                bigip.tm.ltm.virtual_address_s.get_collection()] == \
+            ['/Project_t/10.1.0.5']
+
+        with pytest.raises(HTTPError) as err:
+            pool.delete()
+        assert err.value.response.status_code == 400
+        virtual.delete()
+        assert device.find('ltm/virtual-address') == []
+        pool.delete()
+        assert not bigip.tm.ltm.pools.pool.exists(name='pool1',
+                                                  partition=partition)
+
+    def test_write_errors(self, bigip, device, partition):
+        pools = bigip.tm.ltm.pools.pool
+        pools.create(name='pool1', partition=partition)
+        with pytest.raises(HTTPError) as err:
+            pools.create(name='pool1', partition=partition)
+        assert err.value.response.status_code == 409
+        with pytest.raises(HTTPError) as err:
+            pools.create(name='pool1', partition='Project_missing')
+        assert err.value.response.status_code == 400
+        with pytest.raises(HTTPError) as err:
+            bigip.tm.sys.folders.folder.load(name=partition).delete()
+        assert err.value.response.status_code == 400
+
+    def test_filter_and_select(self, bigip, partition):
+        helper = network_helper.NetworkHelper()
+        helper.create_route_domain(bigip, partition)
+        assert sorted(helper.get_route_domain_ids(bigip, partition='')) == \
+            [0, 1]
+        assert helper.get_route_domain_names(bigip, partition) == \
+            [partition]
+        pools = resource_helper.BigIPResourceHelper(
+            resource_helper.ResourceType.pool)
+        bigip.tm.ltm.pools.pool.create(name='pool1', partition=partition)
+        bigip.tm.ltm.pools.pool.create(name='pool2', partition='Common')
+        assert [pool.name for pool in pools.get_resources(
+            bigip, partition)] == ['pool1']
+        assert bigip.tm.ltm.pools.get_collection(
+            requests_params={'params': '$select=fullPath'}) == \
+            [{'fullPath': '/Project_t/pool1'}, {'fullPath': '/Common/pool2'}]
+        assert system_helper.SystemHelper().get_tenant_folder_count(
+            bigip) == 1
+
+    def test_transaction(self, bigip, device, partition):
+        pools = bigip.tm.ltm.pools.pool
+        with transaction.BigipTransaction([bigip]):
+            pools.create(name='pool1', partition=partition)
+            assert device.find('ltm/pool') == []
+        assert len(device.find('ltm/pool')) == 1
+
+        with pytest.raises(f5ex.TransactionCommitException):
+            with transaction.BigipTransaction([bigip]):
+                pools.create(name='pool2', partition=partition)
+                pools.create(name='pool1', partition=partition)
+        assert len(device.find('ltm/pool')) == 1
+        assert device.transactions == {}
+
+    def test_reset(self, bigip, device, partition):
+        bigip.tm.ltm.pools.pool.create(name='pool1', partition=partition)
+        assert state_store.get_deployed_paths(bigip) == \
+            set(['/', '/Common', '/Project_t', '/Project_t/pool1'])
+        device.reset()
+        assert state_store.get_deployed_paths(bigip) == set(['/', '/Common'])
+        assert not system_helper.SystemHelper().folder_exists(bigip,
+                                                              partition)
+        assert device.count_objects(partition) == 0
+
+    def test_unmodeled(self, bigip, device):
+        with pytest.raises(HTTPError):
+            bigip.tm.ltm.pools.pool.load(name='pool1', partition='Common')
+        assert device.unmodeled == {}
+        status, body = device.handle(
+            'GET', 'https://bigip1/mgmt/tm/gtm/pool/~Common~pool1')
+        assert status == 404
+        assert device.unmodeled == {'gtm/pool/~Common~pool1': 1}
+        assert device.requests[('GET', 'ltm/pool')] == 1
+
+
+class TestLatency(object):
+    def test_devices_overlap(self):
+        devices = [FakeBigIP('bigip%d' % index, latency=0.1)
+                   for index in range(1, 4)]
+        with serve(devices):
+            bigips = [ManagementRoot(device.hostname, 'admin', 'admin')
+                      for device in devices]
+            fanout = device_fanout.DeviceFanout()
+            start_time = time.time()
+            fanout.run(bigips,
+                       lambda bigip: bigip.tm.ltm.pools.get_collection())
+            elapsed = time.time() - start_time
+        assert 0.1 <= elapsed < 0.25
@@ -0,0 +1,88 @@
+# coding=utf-8
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from fake_plugin import FakeLbaasPlugin
+from fake_plugin import FakeRPCClient
+from service_generator import ServiceGenerator
+
+
+class TestServiceGenerator(object):
+    def test_services(self):
+        services = ServiceGenerator(tenants=2, listeners=3, members=4,
+                                    seed=1).services(3)
+        service = services[0]
+        assert len(service['listeners']) == 3
+        assert len(service['members']) == 12
+        assert [len(pool['members']) for pool in service['pools']] == \
+            [4, 4, 4]
+        assert services[2]['loadbalancer']['tenant_id'] == \
+            service['loadbalancer']['tenant_id'] != \
+            services[1]['loadbalancer']['tenant_id']
+        again = ServiceGenerator(tenants=2, listeners=3, members=4,
+                                 seed=1).services(3)
+        assert again == services
+
+
+class TestFakeLbaasPlugin(object):
+    def test_statuses(self):
+        full = ServiceGenerator().service()
+        lb_id = full['loadbalancer']['id']
+        plugin = FakeLbaasPlugin()
+        plugin.add_service(dict(full, listeners=[], pools=[], members=[],
+                                healthmonitors=[]))
+        plugin.add_object(lb_id, 'listeners', full['listeners'][0])
+        assert plugin.is_pending(lb_id)
+        assert plugin.get_pending_loadbalancers(None) == [
+            {'lb_id': lb_id, 'tenant_id': full['loadbalancer']['tenant_id']}]
+
+        rpc = FakeRPCClient(plugin).prepare(topic='f5')
+        rpc.cast(None, 'update_statuses', loadbalancer_id=lb_id, statuses=[
+            {'type': 'listener', 'id': full['listeners'][0]['id'],
+             'provisioning_status': 'ACTIVE', 'operating_status': 'ONLINE'},
+            {'type': 'loadbalancer', 'id': lb_id,
+             'provisioning_status': 'ACTIVE', 'operating_status': 'ONLINE'}])
+        assert plugin.wait([lb_id], timeout=0) == []
+        assert len(plugin.get_active_loadbalancers(None)) == 1
+
+        plugin.delete_object(lb_id, 'listeners', full['listeners'][0]['id'])
+        plugin.update_statuses(None, lb_id, [
+            {'type': 'listener', 'id': full['listeners'][0]['id'],
+             'destroyed': True},
+            {'type': 'loadbalancer', 'id': lb_id,
+             'provisioning_status': 'ACTIVE', 'operating_status': 'ONLINE'}])
+        service = plugin.get_service(lb_id)
+        assert service['listeners'] == []
+        assert service['loadbalancer']['listeners'] == []
+
+        plugin.update_statuses(None, lb_id, [
+            {'type': 'loadbalancer', 'id': lb_id, 'destroyed': True}])
+        assert plugin.get_all_loadbalancers(None) == []
+        assert plugin.calls['update_statuses'] == 3
+
+    def test_ports(self):
+        service = ServiceGenerator().service()
+        subnet_id = service['loadbalancer']['vip_subnet_id']
+        plugin = FakeLbaasPlugin()
+        plugin.add_service(service)
+        port = plugin.create_port_on_subnet(None, subnet_id=subnet_id,
+                                            name='snat-1')
+        assert port['fixed_ips'][0]['ip_address'] == '10.1.200.0'
+        port = plugin.create_port_on_subnet(None, subnet_id=subnet_id,
+                                            name='snat-2')
+        assert port['fixed_ips'][0]['ip_address'] == '10.1.200.1'
+        assert len(plugin.get_port_by_name(None, port_name='snat-2')) == 1
+        plugin.delete_port_by_name(None, port_name='snat-2')
+        assert plugin.get_port_by_name(None, port_name='snat-2') == []